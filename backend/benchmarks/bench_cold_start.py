@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Cold-start and per-worker memory comparison for the search index.
+
+Starts N worker processes for each loading path and keeps them alive together,
+so proportional set size (PSS) shows how much of the index is actually shared:
+
+    rebuild - today's path: np.load + IndexFlatIP.add in every worker
+    mmap    - prebuilt index from data/build_index.py, memory-mapped read-only
+
+Usage:
+    python benchmarks/bench_cold_start.py --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+
+
+def read_memory_kb(pid: int) -> dict:
+    """Read RSS and PSS (kB) for a process from /proc."""
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                memory[key.lower() + '_kb'] = int(value.split()[0])
+    return memory
+
+
+def run_child(mode: str, embeddings_path: str, metadata_path: str, index_path: str):
+    """Load the search service once, report timing, then idle until the parent closes stdin."""
+    sys.path.insert(0, BACKEND_SRC)
+    from services.vector_search import VectorSearchService
+    
+    start = time.perf_counter()
+    service = VectorSearchService(embeddings_path, metadata_path,
+                                  index_path=index_path if mode == 'mmap' else None)
+    load_s = time.perf_counter() - start
+    
+    print(json.dumps({'load_s': load_s, 'ntotal': service.index.ntotal}), flush=True)
+    sys.stdin.read()
+
+
+def run_mode(mode: str, args) -> dict:
+    """Start all workers for one mode and collect their timings and memory."""
+    command = [sys.executable, os.path.abspath(__file__), '--child', mode,
+               '--embeddings', args.embeddings, '--metadata', args.metadata, '--index', args.index]
+    children = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                for _ in range(args.workers)]
+    try:
+        reports = [json.loads(child.stdout.readline()) for child in children]
+        memory = [read_memory_kb(child.pid) for child in children]
+    finally:
+        for child in children:
+            child.stdin.close()
+            child.wait()
+    
+    load_times = sorted(r['load_s'] for r in reports)
+    return {
+        'mode': mode,
+        'workers': args.workers,
+        'load_s_median': load_times[len(load_times) // 2],
+        'load_s_max': load_times[-1],
+        'rss_kb_per_worker': sum(m['rss_kb'] for m in memory) // len(memory),
+        'pss_kb_per_worker': sum(m['pss_kb'] for m in memory) // len(memory),
+        'pss_kb_total': sum(m['pss_kb'] for m in memory),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--embeddings', default=os.path.join(DATA_DIR, "quran_embeddings.npy"))
+    parser.add_argument('--metadata', default=os.path.join(DATA_DIR, "quran_bilingual_metadata.json"))
+    parser.add_argument('--index', default=os.path.join(DATA_DIR, "quran_embeddings.index"))
+    parser.add_argument('--child', choices=['rebuild', 'mmap'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(args.child, args.embeddings, args.metadata, args.index)
+        return
+    
+    if not os.path.exists(args.index):
+        print(f"Error: {args.index} not found (run data/build_index.py first)")
+        return
+    
+    results = [run_mode(mode, args) for mode in ('rebuild', 'mmap')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
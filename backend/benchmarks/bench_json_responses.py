@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Serialization cost of search responses for large k.
+
+Encodes a success response with k verse results (as /api/search returns them)
+with each encoder and reports the median time per response and its size:
+
+    jsonify    - Flask's jsonify (sorted keys, ASCII-escaped Arabic; the old path)
+    json       - json.dumps without ASCII escaping
+    fragments  - utils/fastjson.py without orjson: pre-encoded verse fragments spliced in
+    orjson     - utils/fastjson.py with orjson (if installed)
+
+The first encode of each verse builds its fragment; fragments_cold_us is that
+one-off cost for the k verses.
+
+Usage:
+    python benchmarks/bench_json_responses.py --k 10 50 200 1000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+BACKEND_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+sys.path.insert(0, BACKEND_SRC)
+
+from flask import Flask
+from services.verse_store import load_verses
+from utils import fastjson
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def payload(results: list) -> dict:
+    """The success response envelope built by utils/responses.py."""
+    return {'success': True, 'message': 'Search completed successfully', 'data': {'results': results}}
+
+
+def time_encoder(encode, results: list, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode(payload(results))
+        timings.append(time.perf_counter() - start)
+    return {'median_us': round(statistics.median(timings) * 1e6, 1), 'bytes': len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--metadata', default=os.path.join(DATA_DIR, "quran_bilingual_metadata.json"),
+                        help="Bilingual JSON metadata or columnar store (.bin)")
+    parser.add_argument('--k', type=int, nargs='+', default=[10, 50, 200, 1000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    
+    verses = load_verses(args.metadata)
+    app = Flask(__name__)
+    # The fragments path is what fastjson.dumps runs when orjson is not installed
+    fastjson.ORJSON_AVAILABLE = False
+    
+    rng = random.Random(0)
+    report = {'verses': len(verses), 'orjson_installed': orjson is not None, 'k': {}}
+    for k in args.k:
+        rows = [rng.randrange(len(verses)) for _ in range(k)]
+        results = []
+        for row in rows:
+            verse = verses[row]
+            verse['score'] = rng.random()
+            results.append(verse)
+        plain = [dict(verse) for verse in results]
+        
+        start = time.perf_counter()
+        fastjson.dumps(payload(results))
+        cold_us = round((time.perf_counter() - start) * 1e6, 1)
+        
+        encoders = {
+            'json': lambda obj: json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+            'fragments': fastjson.dumps,
+        }
+        with app.app_context():
+            encoders['jsonify'] = lambda obj: app.json.response(obj).get_data()
+            row = {name: time_encoder(encode, plain if name in ('jsonify', 'json') else results, args.repeat)
+                   for name, encode in sorted(encoders.items())}
+        if orjson is not None:
+            fastjson.ORJSON_AVAILABLE = True
+            row['orjson'] = time_encoder(fastjson.dumps, results, args.repeat)
+            fastjson.ORJSON_AVAILABLE = False
+        row['fragments_cold_us'] = cold_us
+        baseline = row['jsonify']['median_us']
+        for name, timing in row.items():
+            if isinstance(timing, dict):
+                timing['speedup'] = round(baseline / timing['median_us'], 2) if timing['median_us'] else None
+        report['k'][k] = row
+    
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Local language detection in front of the translation model.
+
+Runs the multilingual samples from test_therapy_search.py (plus a few short
+and mixed-script ones) through detect_language and TranslationMiddleware with
+a simulated model call, and reports accuracy, detection latency and the model
+round trips skipped for English input.
+
+Usage:
+    python benchmarks/bench_language_detection.py --model-latency-ms 800
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, BACKEND_SRC)
+sys.path.insert(0, REPO_ROOT)
+
+from middleware.language import detect_language, is_english
+from middleware.translation import TranslationMiddleware
+from test_therapy_search import TEST_ISSUES
+
+# Short, single-word and mixed-script issues, which are the hard cases for detection
+EXTRA_ISSUES = [
+    ("anxiety", "en"),
+    ("stress at work", "en"),
+    ("My mother passed away last week and I can't stop crying", "en"),
+    ("Ich fühle mich einsam", "de"),
+    ("Estou triste e preciso de ajuda", "pt"),
+    ("Kendimi yalnız hissediyorum", "tr"),
+    ("Мне грустно", "ru"),
+    ("I feel anxious, الحمد لله", "mixed"),
+]
+
+
+class SimulatedModel:
+    """Stands in for the GenAI service: sleeps for the model latency and echoes the prompt."""
+    
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+        self.calls = 0
+    
+    def generate(self, prompt: str) -> str:
+        self.calls += 1
+        time.sleep(self.latency_s)
+        return prompt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-latency-ms', type=float, default=800, help="Simulated translation round trip")
+    parser.add_argument('--repeat', type=int, default=200, help="Detection timing repetitions per sample")
+    args = parser.parse_args()
+    
+    samples = TEST_ISSUES + EXTRA_ISSUES
+    rows = []
+    for text, expected in samples:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            detected, confidence = detect_language(text)
+        detect_us = (time.perf_counter() - start) / args.repeat * 1e6
+        english = is_english(text)
+        rows.append({
+            'text': text,
+            'expected': expected,
+            'detected': detected,
+            'confidence': confidence,
+            'skips_model': english,
+            'correct': english == (expected == 'en'),
+            'detect_us': round(detect_us, 1),
+        })
+    
+    results = {'samples': rows, 'accuracy': sum(row['correct'] for row in rows) / len(rows)}
+    for detect in (False, True):
+        os.environ['TRANSLATION_DETECT_LANGUAGE'] = 'true' if detect else 'false'
+        model = SimulatedModel(args.model_latency_ms / 1000)
+        middleware = TranslationMiddleware(model, lambda text: text)
+        start = time.perf_counter()
+        for text, _ in samples:
+            middleware.process(text)
+        results['with_detection' if detect else 'without_detection'] = {
+            'model_calls': model.calls,
+            'total_s': round(time.perf_counter() - start, 3),
+            'counters': middleware.stats(),
+        }
+    
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Cross-lingual index against translate-then-search for non-English queries.
+
+Each sample is an English issue with its Arabic, French and Spanish
+translations. For every non-English query the two paths are timed:
+
+    translate  - TranslationMiddleware with a simulated model call (it returns
+                 the sample's English text after --translation-latency-ms), then
+                 the English index, as /api/search did before
+    multilingual - the query searched directly in the multilingual index
+
+and their top-k verses are compared: overlap@k is the share of the translate
+path's top k that the multilingual path also returns, top1 whether both rank
+the same verse first. The English queries searched in the multilingual index
+give the same agreement for English, as a reference.
+
+Needs data/quran_embeddings_multilingual.npy from data/build_multilingual_index.py.
+
+Usage:
+    python benchmarks/bench_multilingual_search.py --k 10 --translation-latency-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+sys.path.insert(0, BACKEND_SRC)
+
+from middleware.translation import TranslationMiddleware
+from services.vector_search import VectorSearchService
+from services.multilingual_index import MultilingualIndex
+
+# English issue -> translations, in the register users write in
+SAMPLES = [
+    ("I feel anxious about my future", {
+        'ar': "أشعر بالقلق حول مستقبلي", 'fr': "Je suis anxieux pour mon avenir",
+        'es': "Me siento ansioso por mi futuro"}),
+    ("I'm struggling with loneliness", {
+        'ar': "أعاني من الوحدة", 'fr': "Je souffre de la solitude", 'es': "Estoy luchando contra la soledad"}),
+    ("I feel lost and need direction", {
+        'ar': "أشعر بالضياع وأحتاج إلى توجيه", 'fr': "Je me sens perdu et j'ai besoin de direction",
+        'es': "Me siento perdido y necesito dirección"}),
+    ("My mother passed away and I can't stop grieving", {
+        'ar': "توفيت أمي ولا أستطيع التوقف عن الحزن", 'fr': "Ma mère est décédée et je n'arrête pas de pleurer",
+        'es': "Mi madre falleció y no puedo dejar de llorar"}),
+    ("I feel guilty about my sins and want forgiveness", {
+        'ar': "أشعر بالذنب بسبب معاصيّ وأريد المغفرة", 'fr': "Je me sens coupable de mes péchés et je veux le pardon",
+        'es': "Me siento culpable por mis pecados y quiero el perdón"}),
+    ("I am angry at my family", {
+        'ar': "أنا غاضب من عائلتي", 'fr': "Je suis en colère contre ma famille", 'es': "Estoy enojado con mi familia"}),
+    ("I am afraid of death", {
+        'ar': "أنا خائف من الموت", 'fr': "J'ai peur de la mort", 'es': "Tengo miedo a la muerte"}),
+    ("I lost my job and worry about money", {
+        'ar': "فقدت عملي وأنا قلق بشأن المال", 'fr': "J'ai perdu mon travail et je m'inquiète pour l'argent",
+        'es': "Perdí mi trabajo y me preocupa el dinero"}),
+]
+
+
+class SimulatedTranslator:
+    """Stands in for the GenAI service: sleeps for the model latency and returns the reference English text."""
+    
+    def __init__(self, latency_s: float, references: dict):
+        self.latency_s = latency_s
+        self.references = references
+    
+    def generate(self, prompt: str) -> str:
+        time.sleep(self.latency_s)
+        return self.references[prompt]
+
+
+def ids(results: list) -> list:
+    return [result['id'] for result in results]
+
+
+def agreement(reference: list, candidate: list) -> dict:
+    return {'overlap': len(set(reference) & set(candidate)) / len(reference) if reference else 0.0,
+            'top1': bool(reference and candidate and reference[0] == candidate[0])}
+
+
+def summarize(rows: list) -> dict:
+    return {
+        'queries': len(rows),
+        'translate_ms': round(statistics.mean(row['translate_ms'] for row in rows), 2),
+        'multilingual_ms': round(statistics.mean(row['multilingual_ms'] for row in rows), 2),
+        'overlap_at_k': round(statistics.mean(row['overlap'] for row in rows), 3),
+        'top1_agreement': round(statistics.mean(row['top1'] for row in rows), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--embeddings', default=os.path.join(DATA_DIR, "quran_embeddings.npy"))
+    parser.add_argument('--metadata', default=os.path.join(DATA_DIR, "quran_bilingual_metadata.json"),
+                        help="Bilingual JSON metadata or columnar store (.bin)")
+    parser.add_argument('--multilingual', default=os.path.join(DATA_DIR, "quran_embeddings_multilingual.npy"))
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--translation-latency-ms', type=float, default=800, help="Simulated translation round trip")
+    args = parser.parse_args()
+    
+    search = VectorSearchService(args.embeddings, args.metadata,
+                                 multilingual=MultilingualIndex(args.multilingual))
+    search.load_model()
+    # Exclude model loading and first-call overhead from the timings
+    search.warmup(runs=1)
+    references = {text: english for english, translations in SAMPLES for text in translations.values()}
+    translation = TranslationMiddleware(SimulatedTranslator(args.translation_latency_ms / 1000, references),
+                                        lambda text: text)
+    
+    by_language = {}
+    for english, translations in SAMPLES:
+        for language, text in [('en', english)] + sorted(translations.items()):
+            start = time.perf_counter()
+            translated = translation.process(text)
+            reference = search.search(translated, args.k, index='english')
+            translate_ms = (time.perf_counter() - start) * 1000
+            
+            start = time.perf_counter()
+            candidate = search.search(text, args.k, index='multilingual')
+            multilingual_ms = (time.perf_counter() - start) * 1000
+            
+            row = {'text': text, 'routed_to': search.route(text), 'translate_ms': translate_ms,
+                   'multilingual_ms': multilingual_ms, **agreement(ids(reference), ids(candidate))}
+            by_language.setdefault(language, []).append(row)
+    
+    non_english = [row for language, rows in by_language.items() if language != 'en' for row in rows]
+    report = {
+        'k': args.k,
+        'translation_latency_ms': args.translation_latency_ms,
+        'multilingual_model': search.multilingual.model_name,
+        'languages': {language: summarize(rows) for language, rows in sorted(by_language.items())},
+        'non_english': summarize(non_english),
+        'misrouted': [row['text'] for language, rows in by_language.items() for row in rows
+                      if row['routed_to'] != ('english' if language == 'en' else 'multilingual')],
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Load time and memory of the verse metadata: JSON list of dicts vs columnar store.
+
+Each loader runs in its own process and reports load time and memory growth
+(private RssAnon vs shared page-cache RssFile), plus the time to materialize the
+rows of a typical top-k result:
+
+    json  - json.load of quran_bilingual_metadata.json (today's path)
+    store - memory-mapped quran_bilingual_metadata.bin (services/verse_store.py)
+
+Usage:
+    python benchmarks/bench_verse_store.py
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+BACKEND_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+
+
+def read_rss_kb() -> dict:
+    """Private (anonymous) and file-backed resident memory (kB) of this process."""
+    memory = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('RssAnon', 'RssFile'):
+                memory[key] = int(value.split()[0])
+    return memory
+
+
+def growth(before: dict, after: dict) -> dict:
+    return {key: after[key] - before[key] for key in before}
+
+
+def run_child(mode: str, path: str, k: int, lookups: int):
+    """Load the metadata once and report timings and memory growth as JSON."""
+    sys.path.insert(0, BACKEND_SRC)
+    from services.verse_store import VerseStore
+    
+    rss_before = read_rss_kb()
+    start = time.perf_counter()
+    if mode == 'json':
+        with open(path, encoding='utf-8') as f:
+            verses = json.load(f)
+    else:
+        verses = VerseStore.open(path)
+    load_s = time.perf_counter() - start
+    rss_after_load = read_rss_kb()
+    
+    # Materialize top-k style result rows, as the search service does per request
+    rng = random.Random(0)
+    rows = [rng.randrange(len(verses)) for _ in range(lookups * k)]
+    start = time.perf_counter()
+    for i in range(0, len(rows), k):
+        results = [dict(verses[row], score=1.0) for row in rows[i:i + k]]
+    lookup_us = (time.perf_counter() - start) / lookups * 1e6
+    
+    print(json.dumps({
+        'mode': mode,
+        'file_kb': os.path.getsize(path) // 1024,
+        'load_ms': load_s * 1000,
+        'rss_growth_kb': growth(rss_before, rss_after_load),
+        'rss_growth_after_lookups_kb': growth(rss_before, read_rss_kb()),
+        f'top{k}_materialize_us': lookup_us,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--json', default=os.path.join(DATA_DIR, "quran_bilingual_metadata.json"))
+    parser.add_argument('--store', default=os.path.join(DATA_DIR, "quran_bilingual_metadata.bin"))
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lookups', type=int, default=1000)
+    parser.add_argument('--child', choices=['json', 'store'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(args.child, args.json if args.child == 'json' else args.store, args.k, args.lookups)
+        return
+    
+    if not os.path.exists(args.store):
+        print(f"Error: {args.store} not found (run data/create_bilingual_metadata.py first)")
+        return
+    
+    results = []
+    for mode in ('json', 'store'):
+        command = [sys.executable, os.path.abspath(__file__), '--child', mode, '--json', args.json,
+                   '--store', args.store, '--k', str(args.k), '--lookups', str(args.lookups)]
+        results.append(json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the therapy-search pipeline with a local fake LLM.
+
+Builds the real app with create_app(), but injects a fake model function whose
+latency follows a configurable distribution, so the translation, guardrails,
+cache, encoder and FAISS stages run for real without a Gemini key. Issues from
+a corpus are replayed either open-loop at a target rate (--rps; latency is
+measured from the scheduled send time, so a backed-up server is not hidden by
+coordinated omission) or closed-loop with a fixed number of clients
+(--concurrency). Prints latency percentiles, a latency histogram, throughput,
+error rates and the service counters from /api/stats as JSON.
+
+Latency distributions (milliseconds):
+    fixed:800            always 800
+    uniform:200,1200     uniform between 200 and 1200
+    normal:800,200       mean 800, standard deviation 200 (clamped at 0)
+    lognormal:800,0.5    median 800, sigma 0.5 (long right tail, like real LLM latency)
+
+Settings read by create_app still apply, e.g. THERAPY_CACHE_SIZE=1000 enables the
+semantic cache, so repeated issues no longer reach the fake model.
+
+Usage:
+    python benchmarks/load_test.py --rps 20 --duration 30 --latency lognormal:800,0.5
+    python benchmarks/load_test.py --concurrency 16 --requests 500 --endpoint therapy-search/stream
+    python benchmarks/load_test.py --serve --port 5001 --latency fixed:500   # fake-LLM server for external tools
+    python benchmarks/load_test.py --serve --asgi --port 5001                 # the same, with the async routes (asgi.py)
+    python benchmarks/load_test.py --url http://localhost:5001 --rps 50      # load a running server over HTTP
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_SRC = os.path.join(BACKEND_DIR, "src")
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_SRC)
+sys.path.insert(0, BACKEND_DIR)  # config.py
+sys.path.insert(0, REPO_ROOT)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+HISTOGRAM_BOUNDS_MS = [5, 10, 25, 50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000, 30000]
+
+THERAPY_SENTENCES = [
+    "Trust that every hardship is followed by ease, and be patient with yourself.",
+    "You are not alone; turn to God in prayer and let your heart find rest.",
+    "Forgive yourself as God forgives, and take the next small step with hope.",
+    "Lean on those who love you, and remember that sorrow does not last forever.",
+    "Seek guidance with an open heart, and the right path will become clear.",
+]
+
+
+def parse_latency(spec: str):
+    """Turn a distribution spec (see module docstring) into a function returning seconds."""
+    kind, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',') if value]
+    if kind == 'fixed':
+        return lambda: values[0] / 1000
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == 'normal':
+        return lambda: max(random.gauss(values[0], values[1]), 0.0) / 1000
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+class FakeLLM:
+    """
+    Stands in for Gemini: sleeps for a sampled latency and answers each prompt type plausibly.
+
+    Replies are deterministic per prompt, so repeated issues behave like repeated
+    Gemini calls. error_rate of the calls fail with a transient 503.
+    """
+
+    def __init__(self, latency, error_rate: float = 0.0, tokens_per_second: float = 50.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _reply(self, prompt: str) -> str:
+        digest = int(hashlib.md5(prompt.encode('utf-8')).hexdigest(), 16)
+        sentence = THERAPY_SENTENCES[digest % len(THERAPY_SENTENCES)]
+        if '"issue_en"' in prompt:
+            return json.dumps({'language': 'xx', 'issue_en': 'I feel lost', 'response': sentence})
+        if 'psychological therapist' in prompt:
+            return sentence
+        return "I feel lost and need direction"
+
+    def _start_call(self):
+        with self._lock:
+            self.calls += 1
+        if random.random() < self.error_rate:
+            time.sleep(self.latency() / 2)
+            raise Exception("503 Service Unavailable (fake LLM)")
+
+    def generate(self, prompt: str) -> str:
+        self._start_call()
+        time.sleep(self.latency())
+        return self._reply(prompt)
+
+    def generate_stream(self, prompt: str):
+        """Time to first token is the sampled latency; the rest streams at tokens_per_second."""
+        self._start_call()
+        time.sleep(self.latency())
+        for word in self._reply(prompt).split(' '):
+            yield word + ' '
+            time.sleep(1 / self.tokens_per_second)
+
+    async def _start_call_async(self):
+        with self._lock:
+            self.calls += 1
+        if random.random() < self.error_rate:
+            await asyncio.sleep(self.latency() / 2)
+            raise Exception("503 Service Unavailable (fake LLM)")
+
+    async def generate_async(self, prompt: str) -> str:
+        """generate() for the async routes: waits without holding a thread."""
+        await self._start_call_async()
+        await asyncio.sleep(self.latency())
+        return self._reply(prompt)
+
+    async def generate_stream_async(self, prompt: str):
+        await self._start_call_async()
+        await asyncio.sleep(self.latency())
+        for word in self._reply(prompt).split(' '):
+            yield word + ' '
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+
+def load_corpus(path: str) -> list:
+    """Issues from a JSON list or a text file with one issue per line; defaults to the multilingual test issues."""
+    if not path:
+        from test_therapy_search import TEST_ISSUES
+        return [issue for issue, _ in TEST_ISSUES]
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return [item['issue'] if isinstance(item, dict) else item for item in json.load(f)]
+        return [line.strip() for line in f if line.strip()]
+
+
+class InProcessClient:
+    """Sends requests through the Flask test client (one per thread)."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def post(self, path: str, payload: dict):
+        """Returns (status, seconds to first byte, seconds to last byte) from the call start."""
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        start = time.perf_counter()
+        response = self._local.client.post(path, json=payload, buffered=False)
+        first_byte = None
+        for _ in response.response:
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+        response.close()
+        end = time.perf_counter() - start
+        return response.status_code, first_byte if first_byte is not None else end, end
+
+
+class HTTPClient:
+    """Sends requests to a running server with urllib."""
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def post(self, path: str, payload: dict):
+        request = urllib.request.Request(self.base_url + path, data=json.dumps(payload).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status = response.status
+                first_byte = None
+                while response.read(1024):
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - start
+        except urllib.error.HTTPError as e:
+            status, first_byte = e.code, None
+            e.read()
+        end = time.perf_counter() - start
+        return status, first_byte if first_byte is not None else end, end
+
+
+def summarize(latencies_ms: list) -> dict:
+    """Percentiles and histogram of latencies in milliseconds."""
+    if not latencies_ms:
+        return {}
+    ordered = sorted(latencies_ms)
+
+    def percentile(q):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))], 1)
+
+    histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for value in ordered:
+        histogram[next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if value <= bound),
+                       len(HISTOGRAM_BOUNDS_MS))] += 1
+    labels = [f"<={bound}" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}"]
+    return {
+        'mean': round(sum(ordered) / len(ordered), 1),
+        'p50': percentile(50),
+        'p90': percentile(90),
+        'p95': percentile(95),
+        'p99': percentile(99),
+        'max': round(ordered[-1], 1),
+        'histogram': {label: count for label, count in zip(labels, histogram) if count}
+    }
+
+
+def run_load(client, corpus: list, args) -> dict:
+    """Replay the corpus open-loop (--rps) or closed-loop (--concurrency) and collect one record per request."""
+    path = '/api/' + args.endpoint
+    records = []
+    records_lock = threading.Lock()
+    total = args.requests or None
+    stop_at = time.perf_counter() + args.duration if args.duration else None
+    counter = iter(range(10 ** 12))
+
+    def one_request(index: int, scheduled: float):
+        issue = corpus[index % len(corpus)]
+        payload = {'text': issue, 'k': args.k} if args.endpoint.startswith('search') else {'issue': issue, 'k': args.k}
+        try:
+            status, first_byte, end = client.post(path, payload)
+        except Exception as e:
+            status, first_byte, end = f"exception:{type(e).__name__}", None, None
+        # Open-loop: count the time spent waiting for a free client thread too
+        queued = time.perf_counter() - scheduled - (end or 0.0)
+        with records_lock:
+            records.append({'status': status, 'latency_s': None if end is None else end + max(queued, 0.0),
+                            'first_byte_s': None if first_byte is None else first_byte + max(queued, 0.0)})
+
+    def more(index: int) -> bool:
+        return (total is None or index < total) and (stop_at is None or time.perf_counter() < stop_at)
+
+    start = time.perf_counter()
+    if args.rps:
+        with ThreadPoolExecutor(max_workers=args.max_workers) as pool:
+            index = 0
+            while more(index):
+                scheduled = start + index / args.rps
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(one_request, index, scheduled)
+                index += 1
+    else:
+        def client_loop():
+            while True:
+                index = next(counter)
+                if not more(index):
+                    return
+                one_request(index, time.perf_counter())
+
+        threads = [threading.Thread(target=client_loop) for _ in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for record in records:
+        statuses[str(record['status'])] = statuses.get(str(record['status']), 0) + 1
+    ok = [record for record in records if record['status'] == 200]
+    return {
+        'requests': len(records),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(records) / elapsed, 2) if elapsed else 0.0,
+        'success_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'status_counts': statuses,
+        'error_rate': round(1 - len(ok) / len(records), 4) if records else 0.0,
+        'latency_ms': summarize([record['latency_s'] * 1000 for record in ok]),
+        'first_byte_ms': summarize([record['first_byte_s'] * 1000 for record in ok]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoint', default='therapy-search',
+                        choices=['therapy-search', 'therapy-search/stream', 'search'], help="Endpoint under /api")
+    parser.add_argument('--corpus', help="Issues file (.json list or one issue per line)")
+    parser.add_argument('--rps', type=float, help="Open-loop target request rate")
+    parser.add_argument('--concurrency', type=int, default=8, help="Closed-loop clients (when --rps is not set)")
+    parser.add_argument('--max-workers', type=int, default=256, help="Client threads for open-loop mode")
+    parser.add_argument('--duration', type=float, help="Seconds to run")
+    parser.add_argument('--requests', type=int, help="Requests to send (default 200 without --duration)")
+    parser.add_argument('--k', type=int, default=5, help="Verses per request")
+    parser.add_argument('--latency', default='lognormal:800,0.5', help="Fake LLM latency distribution")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of fake LLM calls failing with a 503")
+    parser.add_argument('--tokens-per-second', type=float, default=50.0, help="Fake LLM streaming speed")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for latencies and errors")
+    parser.add_argument('--url', help="Load a running server over HTTP instead of an in-process app")
+    parser.add_argument('--timeout', type=float, default=120.0, help="HTTP client timeout in seconds (--url)")
+    parser.add_argument('--serve', action='store_true', help="Serve the app with the fake LLM instead of loading it")
+    parser.add_argument('--port', type=int, default=5001, help="Port for --serve")
+    parser.add_argument('--asgi', action='store_true',
+                        help="With --serve: serve asgi.py with uvicorn, so the therapy routes are async")
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        args.requests = 200
+    random.seed(args.seed)
+
+    llm = None
+    if args.url:
+        client = HTTPClient(args.url, args.timeout)
+    else:
+        from app import create_app
+        from services import services
+
+        llm = FakeLLM(parse_latency(args.latency), args.error_rate, args.tokens_per_second)
+        if args.serve and args.asgi:
+            import uvicorn
+            from asgi import create_asgi_app
+
+            app = create_asgi_app(model_function=llm.generate, stream_function=llm.generate_stream,
+                                  async_model_function=llm.generate_async,
+                                  async_stream_function=llm.generate_stream_async)
+        else:
+            app = create_app(model_function=llm.generate, stream_function=llm.generate_stream)
+        if services.search is None:
+            sys.exit("Search service failed to initialize (are the data files in data/?)")
+        if args.serve and args.asgi:
+            uvicorn.run(app, host='127.0.0.1', port=args.port)
+            return
+        if args.serve:
+            app.run(host='127.0.0.1', port=args.port, threaded=True)
+            return
+        client = InProcessClient(app)
+
+    corpus = load_corpus(args.corpus)
+    # The routes print AI responses; keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_load(client, corpus, args)
+    results = {
+        'config': {key: value for key, value in vars(args).items() if value is not None and key not in ('serve', 'port', 'asgi')},
+        'corpus_size': len(corpus),
+        **report
+    }
+    if llm is not None:
+        results['fake_llm_calls'] = llm.calls
+        results['service_stats'] = services.stats()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
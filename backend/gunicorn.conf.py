@@ -0,0 +1,37 @@
+"""
+Gunicorn settings for the backend.
+
+The app is created once in the master (preload_app), so with STARTUP_MODE=preload
+the encoder weights are loaded before fork and shared copy-on-write. Each worker
+then runs its warmup encodes before it starts accepting requests.
+
+With ASYNC_ROUTES=true the workers are uvicorn workers serving asgi.py, where the
+therapy-search routes are async and only the other routes use threads.
+
+Usage:
+    cd backend && gunicorn -c gunicorn.conf.py
+"""
+import os
+
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+wsgi_app = "app:create_app()"
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+if os.getenv('ASYNC_ROUTES', 'false').lower() == 'true':
+    wsgi_app = "asgi:create_asgi_app()"
+    worker_class = os.getenv('ASGI_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+preload_app = True
+
+# Load weights in the master; warmup encodes run per worker (torch thread pools are not fork-safe)
+os.environ.setdefault('STARTUP_MODE', 'preload')
+
+
+def post_worker_init(worker):
+    """Warm up the encoder in each worker before it serves traffic, and install the bundle reload signal."""
+    from services import services
+    
+    if os.getenv('STARTUP_MODE') != 'lazy':
+        services.warmup()
+    # Workers reset their signal handlers on start; HUP to a worker (not the master) reloads its data bundle
+    services.install_reload_signal(os.getenv('BUNDLE_RELOAD_SIGNAL', 'SIGHUP'))
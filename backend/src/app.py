@@ -5,31 +5,79 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-def create_app():
+def create_app(startup_mode=None, model_function=None, stream_function=None, async_model_function=None,
+               async_stream_function=None):
+    """
+    Create the Flask app and initialize services.
+    
+    Args:
+        startup_mode: 'lazy', 'preload' or 'warm' (see services.STARTUP_MODES); defaults to STARTUP_MODE env var
+        model_function: Optional prompt -> response callable used instead of Gemini (e.g. a fake model for load tests)
+        stream_function: Optional prompt -> chunks callable used with model_function
+        async_model_function: Optional coroutine function for the async routes (asgi.py) used with model_function;
+            by default they run model_function in a thread pool
+        async_stream_function: Optional async generator function used with async_model_function
+    """
     app = Flask(__name__)
     app.config.from_object(Config)
 
     # Initialize search service
     try:
         from services import services
+        from services.bundle import current_version
         
         # Use the correct paths for embeddings and bilingual metadata
         embeddings_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "quran_embeddings.npy")
         metadata_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "quran_bilingual_metadata.json")
+        # Columnar verse store written by data/create_bilingual_metadata.py; memory-mapped, falls back to the JSON
+        verse_store_path = os.getenv('VERSE_STORE_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "quran_bilingual_metadata.bin"))
+        if os.path.exists(verse_store_path):
+            metadata_path = verse_store_path
+        # Prebuilt index written by data/build_index.py; memory-mapped so workers share one copy
+        index_path = os.getenv('FAISS_INDEX_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "quran_embeddings.index"))
         
-        success = services.initialize_search_service(embeddings_path, metadata_path)
+        # Opt-in micro-batching of concurrent single-query searches (size <= 1 disables it)
+        search_options = {
+            'micro_batch_size': int(os.getenv('SEARCH_MICROBATCH_MAX_SIZE', '0')),
+            'micro_batch_wait_ms': float(os.getenv('SEARCH_MICROBATCH_MAX_WAIT_MS', '5')),
+            # Query-time parameters for HNSW / IVF indexes built by data/build_index.py
+            'ef_search': int(os.getenv('FAISS_EF_SEARCH', '0')) or None,
+            'nprobe': int(os.getenv('FAISS_NPROBE', '0')) or None,
+            # Exact rescoring of k * factor candidates from a quantized index (0 disables it)
+            'rescore_factor': int(os.getenv('FAISS_RESCORE_FACTOR', '0')),
+            # BM25 index for quoted phrases and the lexical / hybrid search modes
+            'lexical_index': os.getenv('SEARCH_LEXICAL_INDEX', 'true').lower() == 'true',
+        }
+        
+        # Versioned data bundle written by data/build_bundle.py; replaces the paths above when one is active
+        # and can be switched without a restart (SIGHUP or POST /api/admin/reload)
+        bundle_root = os.getenv('BUNDLE_ROOT', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "bundles"))
+        if current_version(bundle_root):
+            success = services.initialize_search_bundle(bundle_root, os.getenv('BUNDLE_VERIFY', 'true').lower() == 'true',
+                                                        **search_options)
+        else:
+            success = services.initialize_search_service(embeddings_path, metadata_path, index_path, **search_options)
         if success:
             app.logger.info("Search service initialized successfully")
+            # Reuses therapy responses for paraphrased issues (THERAPY_CACHE_*)
+            services.initialize_response_cache()
         else:
             app.logger.error("Failed to initialize search service")
         
-        # Initialize GenAI service with Gemini
+        # Initialize GenAI service with Gemini, unless a model function was injected
         try:
-            from services.gemini import create_gemini_function
-            gemini_function = create_gemini_function(api_key=os.getenv('GEMINI_API_KEY'), model_name="gemini-2.5-flash")
-            genai_success = services.initialize_genai_service(gemini_function)
+            if async_model_function is None:
+                async_model_function, async_stream_function = model_function, stream_function
+            if model_function is None:
+                from services.gemini import GeminiService
+                gemini = GeminiService(api_key=os.getenv('GEMINI_API_KEY'), model_name="gemini-2.5-flash",
+                                       request_timeout=float(os.getenv('GENAI_TIMEOUT', '30')) or None)
+                model_function, stream_function = gemini.generate_response, gemini.generate_stream
+                async_model_function, async_stream_function = gemini.generate_response_async, gemini.generate_stream_async
+            genai_success = services.initialize_genai_service(model_function, stream_function)
             if genai_success:
                 app.logger.info("GenAI service initialized successfully")
+                services.initialize_async_genai_service(async_model_function, async_stream_function)
                 
                 # Initialize simple translation middleware
                 from middleware import TranslationMiddleware, GuardrailsMiddleware
@@ -47,6 +95,9 @@ def create_app():
         except Exception as genai_error:
             app.logger.warning(f"GenAI service initialization failed: {genai_error}")
         
+        # Load (and optionally warm up) the encoder before serving, so workers start warm
+        services.prepare_models(startup_mode or os.getenv('STARTUP_MODE', 'lazy').lower())
+        
     except Exception as e:
         app.logger.error(f"Failed to initialize services: {e}")
 
@@ -57,4 +108,6 @@ def create_app():
 
 if __name__ == "__main__":
     app = create_app()
+    from services import services
+    services.install_reload_signal(os.getenv('BUNDLE_RELOAD_SIGNAL', 'SIGHUP'))
     app.run(debug=True)
\ No newline at end of file
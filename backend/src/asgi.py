@@ -0,0 +1,49 @@
+"""
+ASGI entry point: the async therapy routes (routes/api_async.py) in front of the Flask app.
+
+The two therapy-search endpoints are served by coroutines, so a request waiting
+on Gemini does not hold a thread; every other route is the Flask app, run in a
+thread pool by the WSGI adapter.
+
+Usage:
+    cd backend/src && uvicorn asgi:create_asgi_app --factory --port 5000 --workers 2
+    cd backend && ASYNC_ROUTES=true gunicorn -c gunicorn.conf.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from app import create_app
+from routes.api_async import create_routes
+
+
+def wrap_wsgi(flask_app):
+    """
+    ASGI adapter for the Flask app, preferring a2wsgi.
+    
+    WSGI_THREADS: threads running Flask requests (default 10, a2wsgi only)
+    """
+    try:
+        from a2wsgi import WSGIMiddleware
+    except ImportError:
+        # Starlette's adapter runs each request in anyio's default thread pool
+        from starlette.middleware.wsgi import WSGIMiddleware
+        return WSGIMiddleware(flask_app)
+    return WSGIMiddleware(flask_app, workers=int(os.getenv('WSGI_THREADS', '10')))
+
+
+def create_asgi_app(startup_mode=None, model_function=None, stream_function=None, async_model_function=None,
+                    async_stream_function=None) -> Starlette:
+    """Create the Flask app (see create_app, which takes the same arguments) and serve it behind the async routes."""
+    flask_app = create_app(startup_mode, model_function, stream_function, async_model_function, async_stream_function)
+    return Starlette(routes=create_routes() + [Mount('/', app=wrap_wsgi(flask_app))])
+
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    uvicorn.run(create_asgi_app(), host='0.0.0.0', port=int(os.getenv('PORT', '5000')))
@@ -1,41 +1,87 @@
 """Simple guardrails middleware using Guardrails AI framework."""
 import logging
 import os
-from typing import Tuple
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .wordlist import WordlistMatcher, load_wordlist, normalize_text
 
 logger = logging.getLogger(__name__)
 
 try:
     from guardrails import Guard
-    from guardrails.hub import ProfanityFree, NSFWText
     GUARDRAILS_AVAILABLE = True
 except ImportError as e:
     GUARDRAILS_AVAILABLE = False
     logger.warning(f"Guardrails AI not available: {e}")
 
+# When the model-backed validators are loaded: 'background' (thread started at init),
+# 'lazy' (on the first validation) or 'eager' (during init, blocking startup)
+LOAD_MODES = ('background', 'lazy', 'eager')
+
+# Tiers that can decide a validation, cheapest first
+TIERS = ('length', 'cache', 'wordlist', 'validators')
+
 
 class GuardrailsMiddleware:
-    """Simple guardrails middleware to validate user input."""
+    """
+    Simple guardrails middleware to validate user input.
+    
+    Before the Guardrails AI validators run, inputs go through cheap local
+    tiers: a length check, a bounded cache of earlier verdicts keyed by
+    normalized text, and a wordlist prefilter for obvious profanity.
+    """
     
     def __init__(self):
         """Initialize guardrails middleware."""
         self.enabled = self._is_enabled() and GUARDRAILS_AVAILABLE
         self.guard = None
+        self.load_mode = os.getenv('GUARDRAILS_LOAD', 'background').lower()
+        if self.load_mode not in LOAD_MODES:
+            logger.warning(f"Unknown GUARDRAILS_LOAD '{self.load_mode}', using 'background'")
+            self.load_mode = 'background'
+        self.load_timeout = float(os.getenv('GUARDRAILS_LOAD_TIMEOUT', '60'))
+        self.cache_size = int(os.getenv('GUARDRAILS_CACHE_SIZE', '4096'))
+        self.wordlist = WordlistMatcher(load_wordlist(os.getenv('GUARDRAILS_WORDLIST_PATH')))
+        self._verdicts = OrderedDict()
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._counters = {tier: {'decided': 0, 'rejected': 0} for tier in TIERS}
+        self._validator_s = 0.0
+        self._rejected_loading = 0
         
         if self.enabled:
-            try:
-                self.guard = self._create_guard()
-                logger.info("Guardrails middleware initialized successfully")
-            except Exception as e:
-                logger.warning(f"Failed to create guardrails: {e}")
-                self.enabled = False
+            if self.load_mode == 'eager':
+                self._load_guard()
+            elif self.load_mode == 'background':
+                threading.Thread(target=self._load_guard, name='guardrails-load', daemon=True).start()
+    
+    @property
+    def ready(self) -> bool:
+        """Whether validators are loaded (or load on first use) and requests can be validated."""
+        return self.state in ('disabled', 'lazy', 'ready')
+    
+    @property
+    def state(self) -> str:
+        """'disabled', 'lazy' (loads on first validation), 'loading' or 'ready'."""
+        if not self.enabled:
+            return 'disabled'
+        if self._loaded.is_set():
+            return 'ready'
+        return 'lazy' if self.load_mode == 'lazy' else 'loading'
     
     def _is_enabled(self) -> bool:
         """Check if guardrails is enabled via environment variable."""
         return os.getenv('GUARDRAILS_ENABLED', 'true').lower() == 'true'
     
-    def _create_guard(self) -> Guard:
+    def _create_guard(self) -> "Guard":
         """Create a simple guard with basic validators."""
+        # The hub validators load their models on import, so they are imported here rather than at startup
+        from guardrails.hub import ProfanityFree, NSFWText
+        
         guard = Guard()
         
         # Add profanity detection  
@@ -46,6 +92,29 @@ class GuardrailsMiddleware:
         
         return guard
     
+    def _load_guard(self):
+        """Create the guard once; if that fails, disable guardrails as before."""
+        with self._load_lock:
+            if self._loaded.is_set():
+                return
+            start = time.perf_counter()
+            try:
+                self.guard = self._create_guard()
+                logger.info(f"Guardrails middleware initialized in {time.perf_counter() - start:.1f}s")
+            except Exception as e:
+                logger.warning(f"Failed to create guardrails: {e}")
+                self.enabled = False
+            self._loaded.set()
+    
+    def _get_guard(self) -> Optional["Guard"]:
+        """The guard, loading it now (lazy mode) or waiting for the background load."""
+        if not self._loaded.is_set():
+            if self.load_mode == 'lazy':
+                self._load_guard()
+            elif not self._loaded.wait(self.load_timeout):
+                logger.warning(f"Guardrails validators still loading after {self.load_timeout:g}s")
+        return self.guard
+    
     def _is_meaningful_content(self, text: str) -> Tuple[bool, str]:
         """Check if content appears to be meaningful (length-based only)."""
         text_stripped = text.strip()
@@ -57,6 +126,63 @@ class GuardrailsMiddleware:
         # Accept anything that's reasonably long
         return True, "Input appears to be meaningful content"
     
+    def _record(self, tier: str, verdict: Tuple[bool, str], seconds: float = 0.0) -> Tuple[bool, str]:
+        with self._lock:
+            self._counters[tier]['decided'] += 1
+            if not verdict[0]:
+                self._counters[tier]['rejected'] += 1
+            self._validator_s += seconds
+        return verdict
+    
+    def _cached_verdict(self, key: str) -> Optional[Tuple[bool, str]]:
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+            return verdict
+    
+    def _cache_verdict(self, key: str, verdict: Tuple[bool, str]):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._verdicts[key] = verdict
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+    
+    def _local_verdict(self, text: str, key: str) -> Tuple[Optional[Tuple[bool, str]], Optional[str]]:
+        """Verdict of the cheap tiers and the tier that decided it, or (None, None) if none did."""
+        is_meaningful, reason = self._is_meaningful_content(text)
+        if not is_meaningful:
+            return (False, reason), 'length'
+        
+        verdict = self._cached_verdict(key)
+        if verdict is not None:
+            return verdict, 'cache'
+        
+        if self.wordlist.find(text) is not None:
+            verdict = (False, "Content contains profanity")
+            self._cache_verdict(key, verdict)
+            return verdict, 'wordlist'
+        return None, None
+    
+    def precheck(self, text: str) -> Tuple[bool, str]:
+        """
+        Run the cheap local checks of validate(), without the Guardrails AI validators.
+        
+        Returns:
+            Tuple of (is_valid: bool, reason: str)
+        """
+        if not self.enabled:
+            return True, "Guardrails disabled"
+        
+        verdict, tier = self._local_verdict(text, normalize_text(text))
+        if verdict is None or verdict[0]:
+            # Accepted inputs still go through validate(), which counts them
+            return True, "Input passed local checks"
+        logger.warning(f"Input validation failed ({tier}): {verdict[1]}")
+        return self._record(tier, verdict)
+    
     def validate(self, text: str) -> Tuple[bool, str]:
         """
         Validate user input for appropriateness and relevance.
@@ -67,17 +193,26 @@ class GuardrailsMiddleware:
         if not self.enabled:
             return True, "Guardrails disabled"
         
-        # First check if it's meaningful content
-        is_meaningful, reason = self._is_meaningful_content(text)
-        if not is_meaningful:
-            return False, reason
+        # First the cheap local tiers: length, earlier verdicts and the wordlist
+        key = normalize_text(text)
+        verdict, tier = self._local_verdict(text, key)
+        if verdict is not None:
+            return self._record(tier, verdict)
         
         # Then check with Guardrails AI
-        if self.guard:
+        guard = self._get_guard()
+        if guard is None and self.enabled:
+            # Still loading after GUARDRAILS_LOAD_TIMEOUT: fail closed rather than skip the validators
+            with self._lock:
+                self._rejected_loading += 1
+            logger.warning("Input rejected: guardrails validators are still loading")
+            return False, "Safety checks are still starting up, please try again shortly"
+        if guard:
+            start = time.perf_counter()
             try:
-                self.guard.validate(text)
+                guard.validate(text)
                 logger.info(f"Input validation passed: '{text[:50]}...'")
-                return True, "Input validation passed"
+                verdict = (True, "Input validation passed")
             except Exception as e:
                 error_msg = str(e).lower()
                 if 'toxic' in error_msg:
@@ -88,6 +223,30 @@ class GuardrailsMiddleware:
                     reason = "Content violates safety guidelines"
                 
                 logger.warning(f"Input validation failed: {reason}")
-                return False, reason
+                verdict = (False, reason)
+            self._cache_verdict(key, verdict)
+            return self._record('validators', verdict, time.perf_counter() - start)
         
+        # Only reached when the validators could not be created, which disables guardrails
         return True, "Input accepted (basic validation)"
+
+    def stats(self) -> dict:
+        """Return per-tier decision counts and hit rates, and the validators' mean latency."""
+        with self._lock:
+            counters = {tier: dict(counts) for tier, counts in self._counters.items()}
+            validator_s = self._validator_s
+            cached = len(self._verdicts)
+            rejected_loading = self._rejected_loading
+        total = sum(counts['decided'] for counts in counters.values())
+        for counts in counters.values():
+            counts['hit_rate'] = round(counts['decided'] / total, 3) if total else 0.0
+        validated = counters['validators']['decided']
+        return {
+            'state': self.state,
+            'decisions': total,
+            'tiers': counters,
+            'validators_avg_ms': round(validator_s / validated * 1000, 1) if validated else None,
+            'cached_verdicts': cached,
+            'rejected_while_loading': rejected_loading,
+            'wordlist_size': self.wordlist.size
+        }
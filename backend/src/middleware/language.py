@@ -0,0 +1,152 @@
+"""Local language identification, so English input can skip the translation model."""
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Tuple
+
+# Unicode script (first word of the character name) -> language reported for text in that script
+SCRIPT_LANGUAGES = {
+    'ARABIC': 'ar',
+    'HEBREW': 'he',
+    'CYRILLIC': 'ru',
+    'GREEK': 'el',
+    'DEVANAGARI': 'hi',
+    'BENGALI': 'bn',
+    'THAI': 'th',
+    'HANGUL': 'ko',
+    'HIRAGANA': 'ja',
+    'KATAKANA': 'ja',
+    'CJK': 'zh',
+}
+
+# Frequent function words of the Latin-script languages users write in
+STOPWORDS = {
+    'en': set("i i'm me my am is are was be been feel feeling the a an and or but of to in on at for with "
+              "about from this that it not no do don't can can't have has had will would what how why when "
+              "who you your he she they we our myself so very because all just need".split()),
+    'fr': set("je j'ai me mon ma mes suis est sont le la les un une des et ou mais de du au aux pour avec "
+              "dans sur pas ne que qui quoi comment pourquoi tu vous il elle ils nous très c'est moi besoin "
+              "sens".split()),
+    'es': set("yo me mi mis soy estoy es son el la los las un una unos y o pero de del al para por con en "
+              "sobre no que qué cómo tú usted él ella ellos nosotros muy tengo siento necesito".split()),
+    'de': set("ich mich mein meine bin ist sind der die das ein eine und oder aber von zu im auf für mit "
+              "über nicht kein was wie warum du sie er wir sehr habe fühle brauche".split()),
+    'it': set("io mi mio mia sono è il lo gli un una e ma di da per con su non che come perché lei lui noi "
+              "molto ho sento bisogno".split()),
+    'pt': set("eu meu minha sou estou é são o os um uma e ou mas do da para por com em não que como você "
+              "ele ela nós muito tenho sinto preciso".split()),
+    'nl': set("ik mijn ben is zijn de het een en of maar van te op voor met over niet geen wat hoe waarom "
+              "jij je hij zij wij heel heb voel".split()),
+    'tr': set("ben beni benim bir ve veya ama için ile bu şu değil ne nasıl neden sen biz çok hissediyorum "
+              "ihtiyacım var".split()),
+    'id': set("saya aku merasa dan atau tetapi dari ke di untuk dengan tentang tidak apa bagaimana mengapa "
+              "kamu dia mereka kami sangat butuh ini itu".split()),
+}
+
+# Distinctive character trigrams of each language ('_' marks a word boundary)
+TRIGRAMS = {
+    lang: {trigram.replace('_', ' ') for trigram in profile.split()}
+    for lang, profile in {
+        'en': "_th the he_ ing ng_ _an and nd_ _of of_ _to to_ _wh hat ght ugh ous _yo you ly_ ith _sh ck_ "
+              "eel _fe out _ab bou ed_ er_ _my my_ ear ry_ ver ful ess _lo ely _wa",
+        'fr': "_le les es_ _de de_ ent nt_ _qu que ue_ ion ais ait _je je_ eur our ous _pa pas ett lle oi_ "
+              "ois eux aux _me ons ez_ _j' rdu _ce",
+        'es': "_de de_ que _qu ue_ os_ _lo los _la las as_ ión ado ada ndo nte _es est ien mos _mi mi_ _co "
+              "con por ara ero ito ía_ ño",
+        'de': "ich ch_ sch _ei ein der die und _un nd_ _ge gen en_ cht ung ber _zu zu_ eit ens ße _ni",
+        'it': "_di di_ che _ch he_ _il il_ ell lla zio ion one ne_ are ato olt lto _pe per ono _so gli",
+        'pt': "_de de_ que ão_ ção nto _co com os_ _um uma ado ada nho _me eu_ ção _nã",
+        'nl': "_de de_ het _he en_ _ee een ij_ ijn aar _va van oor _ik ik_ sch cht ijk oe_",
+        'tr': "ler lar yor iyo _bi bir ım_ im_ ğ ış ın_ _ve",
+        'id': "ang ng_ nya _me men kan an_ _di aka ber _ya yan ada sa_",
+    }.items()
+}
+
+# English needs this much function-word evidence: languages without a stopword list (Tagalog, Polish,
+# Hausa, ...) share short words with English ('at', 'i', 'a'), and English input skips translation
+MIN_ENGLISH_HITS = 2
+MIN_ENGLISH_HIT_SHARE = 0.2
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def _script(char: str) -> str:
+    """Script of a letter, e.g. 'LATIN' or 'ARABIC' (first word of its Unicode name)."""
+    return unicodedata.name(char, 'UNKNOWN').split(' ', 1)[0]
+
+
+def script_counts(text: str) -> Counter:
+    """Number of letters of each Unicode script in text."""
+    return Counter(_script(char) for char in text if char.isalpha())
+
+
+def _latin_scores(words: list) -> Dict[str, Tuple[int, float]]:
+    """(stopword hits, share of known trigrams) per Latin-script language."""
+    trigrams = [padded[i:i + 3] for word in words for padded in [f' {word} '] for i in range(len(padded) - 2)]
+    scores = {}
+    for lang in STOPWORDS:
+        hits = sum(word in STOPWORDS[lang] for word in words)
+        trigram_share = sum(trigram in TRIGRAMS[lang] for trigram in trigrams) / max(len(trigrams), 1)
+        scores[lang] = (hits, trigram_share)
+    return scores
+
+
+def detect_language(text: str) -> Tuple[str, float]:
+    """
+    Identify the language of text without a model call.
+    
+    Non-Latin text is identified by its dominant Unicode script. Latin text is
+    scored by function-word hits, then by character trigrams; letters outside
+    ASCII (é, ñ, ü, ...) rule out English. English also needs at least
+    MIN_ENGLISH_HITS function words making up MIN_ENGLISH_HIT_SHARE of the
+    words; with less evidence the language is 'unknown', so it gets translated.
+    
+    Args:
+        text: Text to identify
+    
+    Returns:
+        (ISO 639-1 code or 'unknown', confidence between 0 and 1)
+    """
+    scripts = script_counts(text)
+    letters = sum(scripts.values())
+    if not letters:
+        return 'unknown', 0.0
+    
+    script, count = scripts.most_common(1)[0]
+    if script != 'LATIN':
+        return SCRIPT_LANGUAGES.get(script, 'unknown'), count / letters
+    
+    words = WORD_PATTERN.findall(text.lower().replace('’', "'"))
+    scores = _latin_scores(words)
+    if any(not char.isascii() and _script(char) == 'LATIN' for char in text if char.isalpha()):
+        scores.pop('en')
+    
+    lang, (hits, trigram_share) = max(scores.items(), key=lambda item: item[1])
+    if not hits and not trigram_share:
+        return 'unknown', 0.0
+    if lang == 'en' and (hits < MIN_ENGLISH_HITS or hits / len(words) < MIN_ENGLISH_HIT_SHARE):
+        return 'unknown', 0.0
+    
+    # Confidence: margin over the runner-up, on function words when there are any
+    runner_up = max((score for other, score in scores.items() if other != lang), default=(0, 0.0))
+    if hits:
+        confidence = (hits - runner_up[0]) / hits if hits > runner_up[0] else 0.5 * (trigram_share > runner_up[1])
+    else:
+        confidence = (trigram_share - runner_up[1]) / trigram_share
+    return lang, round(confidence, 3)
+
+
+def is_english(text: str, min_confidence: float = 0.3, min_latin_share: float = 0.9) -> bool:
+    """
+    Whether text is confidently English; uncertain and mixed-script text is treated as non-English.
+    
+    Args:
+        text: Text to check
+        min_confidence: Minimum detect_language confidence
+        min_latin_share: Minimum share of Latin letters (e.g. English with an Arabic phrase needs translating)
+    """
+    scripts = script_counts(text)
+    if not scripts or scripts['LATIN'] / sum(scripts.values()) < min_latin_share:
+        return False
+    lang, confidence = detect_language(text)
+    return lang == 'en' and confidence >= min_confidence
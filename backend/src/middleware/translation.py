@@ -1,6 +1,9 @@
 """Simple translation middleware."""
 import logging
 import os
+import threading
+
+from .language import is_english
 
 logger = logging.getLogger(__name__)
 
@@ -8,26 +11,74 @@ logger = logging.getLogger(__name__)
 class TranslationMiddleware:
     """Simple translation middleware that translates non-English text to English."""
     
-    def __init__(self, ai_service=None, prompt_function=None):
-        """Initialize with optional AI service for translation."""
+    def __init__(self, ai_service=None, prompt_function=None, async_ai_service=None):
+        """Initialize with optional AI service for translation (and an AsyncGenAIService for process_async)."""
         self.ai_service = ai_service
+        self.async_ai_service = async_ai_service
         self.prompt_function = prompt_function
         self.enabled = bool(ai_service and prompt_function and self._is_enabled())
+        # Identify English input locally and skip the model round trip for it
+        self.detect_language = os.getenv('TRANSLATION_DETECT_LANGUAGE', 'true').lower() == 'true'
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'skipped_english': 0, 'translated': 0, 'failed': 0}
     
     def _is_enabled(self):
         """Check if translation is enabled via environment variable."""
         return os.getenv('TRANSLATION_ENABLED', 'true').lower() == 'true'
     
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+    
+    def needs_translation(self, text: str) -> bool:
+        """Whether process() would call the model for text (enabled and not detected as English)."""
+        return self.enabled and not (self.detect_language and is_english(text))
+    
     def process(self, text: str) -> str:
         """Process text - translate if enabled, otherwise return as-is."""
         if not self.enabled:
             return text
         
+        self._count('requests')
+        if not self.needs_translation(text):
+            self._count('skipped_english')
+            return text
+        
         try:
             prompt = self.prompt_function(text)
             translated = self.ai_service.generate(prompt)
+            self._count('translated')
             logger.info(f"Translated: '{text}' -> '{translated}'")
             return translated
         except Exception as e:
+            self._count('failed')
             logger.warning(f"Translation failed: {e}, using original text")
             return text
+    
+    async def process_async(self, text: str) -> str:
+        """process() with the model call awaited on async_ai_service, which must be set."""
+        if not self.enabled:
+            return text
+        
+        self._count('requests')
+        if not self.needs_translation(text):
+            self._count('skipped_english')
+            return text
+        
+        try:
+            prompt = self.prompt_function(text)
+            translated = await self.async_ai_service.generate(prompt)
+            self._count('translated')
+            logger.info(f"Translated: '{text}' -> '{translated}'")
+            return translated
+        except Exception as e:
+            self._count('failed')
+            logger.warning(f"Translation failed: {e}, using original text")
+            return text
+    
+    def stats(self) -> dict:
+        """Return translation counters, including model calls skipped for English input."""
+        with self._lock:
+            counters = dict(self._counters)
+        counters['skip_rate'] = counters['skipped_english'] / counters['requests'] if counters['requests'] else 0.0
+        return counters
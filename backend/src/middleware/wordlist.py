@@ -0,0 +1,88 @@
+"""Multi-pattern wordlist matching (Aho-Corasick), used as the guardrails prefilter."""
+from collections import deque
+from typing import Iterable, Optional
+
+from utils.cache import normalize_text
+
+# Unambiguous profanity and explicit terms rejected without running the model-backed validators.
+# A trailing '*' also matches longer words with that prefix ("fuck*" matches "fucking").
+DEFAULT_WORDS = [
+    'fuck*', 'motherfuck*', 'shit', 'shitty', 'bullshit', 'bitch*', 'cunt*', 'asshole*', 'bastard*',
+    'porn*', 'xxx', 'wank*', 'slut*', 'whore*', 'blowjob*', 'handjob*', 'dickhead*',
+]
+
+# Common character substitutions used to dodge word filters
+LEET_TABLE = str.maketrans({'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's'})
+
+
+class WordlistMatcher:
+    """
+    Finds listed words in text in one pass over it, however many words are listed.
+    
+    Words match whole words only (letters around a match make it a non-match,
+    so "class" does not match "ass"); a word ending in '*' matches as a prefix.
+    Text is normalized and undoes common leetspeak substitutions first.
+    """
+    
+    def __init__(self, words: Iterable[str]):
+        # Trie as parallel lists: goto transitions, failure links, and output words per node
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self.size = 0
+        for word in words:
+            word = normalize_text(word)
+            if word:
+                self._add(word.rstrip('*'), word.endswith('*'))
+        self._build_links()
+    
+    def _add(self, word: str, prefix: bool):
+        node = 0
+        for char in word:
+            if char not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = len(self._goto) - 1
+            node = self._goto[node][char]
+        self._output[node].append((word, prefix))
+        self.size += 1
+    
+    def _build_links(self):
+        """Breadth-first failure links; each node also inherits the outputs of its failure node."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+    
+    def find(self, text: str) -> Optional[str]:
+        """Return the first listed word found in text, or None."""
+        text = normalize_text(text).translate(LEET_TABLE)
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for word, prefix in self._output[node]:
+                start = end - len(word) + 1
+                if start > 0 and text[start - 1].isalpha():
+                    continue
+                if not prefix and end + 1 < len(text) and text[end + 1].isalpha():
+                    continue
+                return word
+        return None
+
+
+def load_wordlist(path: Optional[str] = None) -> list:
+    """DEFAULT_WORDS plus the words in path (one per line, '#' starts a comment)."""
+    words = list(DEFAULT_WORDS)
+    if path:
+        with open(path, encoding='utf-8') as f:
+            words.extend(line.split('#', 1)[0].strip() for line in f)
+    return [word for word in words if word]
@@ -43,3 +43,29 @@ JUST REPLY WITH THE SENTENCE
 
 Here is the user issue:
 {user_issue}"""
+
+
+def fused_therapy_prompt(user_issue: str) -> str:
+    """
+    Create a single prompt that translates the issue and writes the therapy sentence.
+    
+    Replaces translation_prompt followed by therapy_prompt with one model call;
+    the reply is a JSON object parsed by services.therapy_pipeline.
+    
+    Args:
+        user_issue: The user's problem or issue, in any language
+        
+    Returns:
+        Complete prompt for the AI model
+    """
+    return f"""You are a psychological therapist. You will receive a user issue that may be written in any language.
+First, understand the issue and say it in English as a native English speaker would (if it is already in English, keep it exactly as it is).
+Then respond to the issue with a single, concise sentence that resolves the issue and provides comfort. Your should help user feel better, feel piece, and cure his pain. The sentence should be the English translation of a verse from the Quran that addresses the user's issue.
+
+You must reply with a JSON object only, with exactly these keys:
+{{"language": "<ISO 639-1 code of the issue's language>", "issue_en": "<the issue in English>", "response": "<the single English sentence>"}}
+You must not say anything before or after the JSON object.
+Do not wrap it in a code block.
+
+Here is the user issue:
+{user_issue}"""
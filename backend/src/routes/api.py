@@ -1,81 +1,341 @@
-from flask import Blueprint, request, jsonify
-from utils.responses import success_response, validation_error, internal_error, service_error
+from flask import Blueprint, Response, g, request, jsonify
+from utils.responses import (APIError, success_response, validation_error, internal_error, service_error,
+                             not_found_error, unauthorized_error, sse_event)
+from utils import metrics
+import hmac
 import sys
 import os
+import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
+@bp.before_request
+def start_request_metrics():
+    """Count the request as in flight and start collecting its stage timings."""
+    g.metrics_start = time.perf_counter()
+    g.metrics_token = metrics.start_request()
+    metrics.REQUESTS_IN_FLIGHT.inc(endpoint=request.endpoint)
+
+def _observe_request(status: int) -> float:
+    elapsed = time.perf_counter() - g.metrics_start
+    metrics.REQUEST_LATENCY.observe(elapsed, endpoint=request.endpoint, method=request.method, status=status)
+    if status >= 400:
+        metrics.REQUEST_ERRORS.inc(endpoint=request.endpoint, status=status)
+    return elapsed
+
+@bp.after_request
+def finish_request_metrics(response):
+    """Record the request latency and return its stage timings in a Server-Timing header."""
+    if 'metrics_token' in g:
+        timings = metrics.finish_request(g.pop('metrics_token'))
+        elapsed = _observe_request(response.status_code)
+        # Streamed responses only include the stages finished before the first byte
+        response.headers['Server-Timing'] = metrics.server_timing(timings, elapsed)
+    return response
+
+@bp.teardown_request
+def end_request_metrics(error=None):
+    """Finish the metrics of a request that raised before a response was made."""
+    if 'metrics_start' not in g:
+        return
+    metrics.REQUESTS_IN_FLIGHT.dec(endpoint=request.endpoint)
+    if 'metrics_token' in g:
+        metrics.finish_request(g.pop('metrics_token'))
+        _observe_request(500)
+
 @bp.route('/health')
 def health():
-    return success_response({"status": "healthy"}, "Service is running")
+    """Readiness probe: 503 until the index, encoder, GenAI and guardrails are ready."""
+    from services import services
+    
+    readiness = services.readiness()
+    if not readiness['ready']:
+        return service_error('Service is not ready', readiness)
+    
+    return success_response({"status": "healthy", **readiness}, "Service is running")
+
+@bp.route('/stats')
+def stats():
+    """Cache and service counters."""
+    from services import services
+    
+    return success_response(services.stats(), "Service statistics")
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus metrics: request and stage latency histograms, in-flight requests, errors and cache counters."""
+    from services import services
+    
+    return Response(metrics.render_metrics(services.stats()), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+@bp.route('/admin/reload', methods=['POST'])
+def reload_bundle():
+    """
+    Switch this worker to another data bundle version without a restart: {"version": "..."}.
+    
+    Without a version the one named in the bundle root's CURRENT file is loaded.
+    Needs "Authorization: Bearer <ADMIN_TOKEN>"; the endpoint does not exist when
+    ADMIN_TOKEN is unset.
+    """
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token:
+        return not_found_error('Not found')
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {admin_token}'.encode('utf-8')):
+        return unauthorized_error('Invalid admin token')
+    
+    try:
+        from services import services
+        from services.bundle import BundleError
+        
+        version = (request.get_json(silent=True) or {}).get('version')
+        try:
+            reloaded = services.reload_search_service(version)
+        except BundleError as e:
+            return validation_error(str(e), {'version': version})
+        
+        return success_response(reloaded, 'Data bundle loaded')
+    
+    except Exception as e:
+        return internal_error(f'Data bundle reload failed: {str(e)}')
 
 @bp.route('/search', methods=['POST'])
 def search_verses():
     """Search for Quran verses using vector similarity."""    
     try:
         from services import services
+        from services.search_service import check_k
         
-        if services.search is None:
+        # One service for the whole request, even if a data bundle reload replaces it meanwhile
+        search = services.search
+        if search is None:
             return service_error('Search service not initialized')
 
         data = request.get_json()
         if not data or 'text' not in data:
             return validation_error('Query text is required')
+        
+        k = data.get('k', 5)
+        k_error = check_k(k)
+        if k_error:
+            return validation_error(k_error, {'k': k})
 
-        results = services.search.search(data['text'], data.get('k', 5))
+        # semantic (default), lexical (BM25) or hybrid (both, rank-fused); quoted phrases are matched exactly
+        mode = data.get('mode', 'semantic')
+        # auto (default): non-English queries go to the multilingual index when it is loaded
+        index = data.get('index', 'auto')
+        try:
+            index = search.route(data['text'], index)
+            results = search.search(data['text'], k, mode=mode, index=index)
+        except ValueError as e:
+            return validation_error(str(e), {'mode': mode, 'index': index})
         
-        return success_response({'results': results}, 'Search completed successfully')
+        return success_response({'results': results, 'index': index}, 'Search completed successfully')
     
     except Exception as e:
         return internal_error(f'Search failed: {str(e)}')
 
+@bp.route('/search/batch', methods=['POST'])
+def search_verses_batch():
+    """Search for many texts at once with one batched encode and one FAISS search."""
+    try:
+        from services import services
+        from services.search_service import check_k
+        
+        search = services.search
+        if search is None:
+            return service_error('Search service not initialized')
+
+        data = request.get_json()
+        if not data or not isinstance(data.get('queries'), list) or not data['queries']:
+            return validation_error('A non-empty list of queries is required')
+
+        max_queries = int(os.getenv('SEARCH_BATCH_MAX_QUERIES', '64'))
+        if len(data['queries']) > max_queries:
+            return validation_error(f'At most {max_queries} queries are allowed per batch')
+
+        # Each query is either a string or {"text": ..., "k": ...}; k falls back to the batch-level k
+        default_k = data.get('k', 5)
+        texts, ks = [], []
+        for position, query in enumerate(data['queries']):
+            if isinstance(query, str):
+                query = {'text': query}
+            if not isinstance(query, dict) or not isinstance(query.get('text'), str):
+                return validation_error('Each query must be a string or an object with text', {'position': position})
+            query_k = query.get('k', default_k)
+            k_error = check_k(query_k)
+            if k_error:
+                return validation_error(k_error, {'position': position})
+            texts.append(query['text'])
+            ks.append(query_k)
+
+        results = search.search_batch(texts, ks)
+        
+        return success_response({'results': [
+            {'text': text, 'k': query_k, 'results': query_results}
+            for text, query_k, query_results in zip(texts, ks, results)
+        ]}, 'Batch search completed successfully')
+    
+    except Exception as e:
+        return internal_error(f'Batch search failed: {str(e)}')
+
+@bp.route('/verses/<int:surah>/<int:verse>')
+def get_verse(surah, verse):
+    """Fetch one verse by reference, e.g. /api/verses/2/255."""
+    from services import services
+    
+    search = services.search
+    if search is None:
+        return service_error('Search service not initialized')
+    
+    verse_id = f'{surah}:{verse}'
+    result = search.get_verse(verse_id)
+    if result is None:
+        return not_found_error(f'Verse {verse_id} not found', {'id': verse_id})
+    
+    return success_response({'verse': result}, 'Verse found')
+
+@bp.route('/verses/<int:surah>')
+def get_surah_verses(surah):
+    """Fetch a contiguous range of a surah's verses: /api/verses/18?from=1&to=10 (both optional, inclusive)."""
+    from services import services
+    
+    search = services.search
+    if search is None:
+        return service_error('Search service not initialized')
+    
+    start = request.args.get('from', type=int)
+    end = request.args.get('to', type=int)
+    if (start is not None and start < 1) or (end is not None and end < 1):
+        return validation_error('from and to must be positive verse numbers')
+    if start is not None and end is not None and start > end:
+        return validation_error('from must not be greater than to')
+    
+    verses = search.get_surah_verses(surah, start, end)
+    if verses is None:
+        return not_found_error(f'Surah {surah} not found', {'surah': surah})
+    
+    return success_response({'surah': surah, 'verses': verses}, 'Verses found')
+
+@bp.route('/verses', methods=['POST'])
+def get_verses_bulk():
+    """Fetch many verses by id in one request: {"ids": ["2:255", "18:10"]}."""
+    try:
+        from services import services
+        
+        search = services.search
+        if search is None:
+            return service_error('Search service not initialized')
+
+        data = request.get_json()
+        if not data or not isinstance(data.get('ids'), list) or not data['ids']:
+            return validation_error('A non-empty list of verse ids is required')
+        if not all(isinstance(verse_id, str) for verse_id in data['ids']):
+            return validation_error('Verse ids must be strings like "2:255"')
+
+        max_ids = int(os.getenv('VERSE_LOOKUP_MAX_IDS', '300'))
+        if len(data['ids']) > max_ids:
+            return validation_error(f'At most {max_ids} verse ids are allowed per request')
+
+        verses = search.get_verses(data['ids'])
+        
+        return success_response({
+            'verses': [verse for verse in verses if verse is not None],
+            'missing': [verse_id for verse_id, verse in zip(data['ids'], verses) if verse is None]
+        }, 'Verses found')
+    
+    except Exception as e:
+        return internal_error(f'Verse lookup failed: {str(e)}')
+
+def _run_guarded(services, user_issue: str, work):
+    """
+    Run work(cancelled) alongside guardrails validation, which gates its result.
+    
+    Returns:
+        (work result, None), or (None, error response) if validation or work fails
+    """
+    from services.resilience import UnavailableError
+    from services.therapy_pipeline import StageTimeoutError
+    from services.therapy_search import timed_validate
+    
+    guardrails = services.guardrails_middleware
+    try:
+        if guardrails and guardrails.enabled:
+            is_valid, validation_reason, result = services.therapy_pipeline.run_gated(
+                lambda: timed_validate(guardrails, user_issue), work)
+            if not is_valid:
+                return None, validation_error(validation_reason)
+            return result, None
+        return work(None), None
+    except StageTimeoutError as timeout_error:
+        return None, service_error('Therapy pipeline timed out', {'stage': timeout_error.stage})
+    except UnavailableError as unavailable_error:
+        return None, service_error(f'AI service unavailable: {str(unavailable_error)}')
+    except Exception as ai_error:
+        return None, internal_error(f'AI service failed: {str(ai_error)}')
+
 @bp.route('/therapy-search', methods=['POST'])
 def therapy_search():
     """Process user issue through therapy AI and search for relevant Quran verses."""
     try:
         from services import services
-        from prompts import therapy_prompt
+        from services.therapy_search import cached_results, cached_therapy_response, parse_therapy_request
         
-        if services.search is None:
+        search = services.search
+        if search is None:
             return service_error('Search service not initialized')
         
         if services.genai is None:
             return service_error('AI service not initialized')
 
-        data = request.get_json()
-        if not data or 'issue' not in data:
-            return validation_error('User issue is required')
-
-        user_issue = data['issue']
+        therapy_request, request_error = parse_therapy_request(request.get_json(silent=True))
+        if request_error:
+            return validation_error(request_error)
         
-        # Step 0: Validate input with guardrails
+        user_issue, k = therapy_request
+        response_cache = services.response_cache
+        
+        # Step 0: Cheap local input checks, before any model work starts
         if services.guardrails_middleware:
-            is_valid, validation_reason = services.guardrails_middleware.validate(user_issue)
+            is_valid, validation_reason = services.guardrails_middleware.precheck(user_issue)
             if not is_valid:
                 return validation_error(validation_reason)
         
-        # Step 1: Process through translation middleware (if available)
-        translated_issue = user_issue
-        if services.translation_middleware:
-            translated_issue = services.translation_middleware.process(user_issue)
+        def respond(cancelled):
+            """Steps 0.5-3: the response to a similar earlier issue, or a new AI therapy response."""
+            cached, issue_embedding = cached_therapy_response(search, response_cache, user_issue)
+            if cached is not None:
+                return cached['ai_response'], cached, issue_embedding
+            
+            # Translate (if needed) and get the AI therapy response, in two model calls
+            # or one fused call depending on THERAPY_PIPELINE_MODE
+            return services.therapy_pipeline.generate(user_issue, cancelled)['ai_response'], None, issue_embedding
         
-        # Step 2: Generate therapy prompt using processed issue
-        prompt = therapy_prompt(translated_issue)
+        # Guardrails validation gates the response; the cache lookup and generation run
+        # alongside it and are discarded if it fails
+        response, error = _run_guarded(services, user_issue, respond)
+        if error is not None:
+            return error
         
-        # Step 3: Get AI therapy response
-        try:
-            ai_response = services.genai.generate(prompt)
-            print(f"AI Therapy Response: {ai_response}")  # Log to terminal
-        except Exception as ai_error:
-            return internal_error(f'AI service failed: {str(ai_error)}')
+        ai_response, cached, issue_embedding = response
+        if cached is not None:
+            return success_response({
+                'ai_response': ai_response,
+                'search_query': ai_response,
+                'results': cached_results(search, cached, k)
+            }, 'Therapy guidance completed successfully')
         
         # Step 4: Search for relevant verses using AI response
         try:
-            search_results = services.search.search(ai_response, data.get('k', 5))
+            search_results = search.search(ai_response, k, index='english')
         except Exception as search_error:
             return internal_error(f'Search failed: {str(search_error)}')
         
+        if issue_embedding is not None:
+            response_cache.put(issue_embedding, {'ai_response': ai_response, 'results': search_results,
+                                                 'k': k, 'version': search.version})
+        
         return success_response({
             'ai_response': ai_response,
             'search_query': ai_response,
@@ -84,3 +344,99 @@ def therapy_search():
     
     except Exception as e:
         return internal_error(f'Therapy search failed: {str(e)}')
+
+@bp.route('/therapy-search/stream', methods=['POST'])
+def therapy_search_stream():
+    """
+    Streaming therapy search (server-sent events).
+    
+    Emits 'token' events ({"text": ...}) with the AI therapy response as it is
+    written, then a 'result' event with the same data as /api/therapy-search,
+    or an 'error' event if the stream fails part way. Errors before the first
+    token are returned as regular JSON error responses.
+    """
+    try:
+        from services import services
+        from services.therapy_search import cached_results, cached_therapy_response, parse_therapy_request
+        
+        search = services.search
+        if search is None:
+            return service_error('Search service not initialized')
+        
+        if services.genai is None:
+            return service_error('AI service not initialized')
+        
+        therapy_request, request_error = parse_therapy_request(request.get_json(silent=True))
+        if request_error:
+            return validation_error(request_error)
+        
+        user_issue, k = therapy_request
+        response_cache = services.response_cache
+        
+        if services.guardrails_middleware:
+            is_valid, validation_reason = services.guardrails_middleware.precheck(user_issue)
+            if not is_valid:
+                return validation_error(validation_reason)
+        
+        started = []
+        
+        def start_stream(cancelled):
+            """Cache lookup, translation and the first chunk of the AI therapy response."""
+            cached, issue_embedding = cached_therapy_response(search, response_cache, user_issue)
+            if cached is not None:
+                return cached['ai_response'], iter(()), cached, issue_embedding
+            
+            chunks = services.therapy_pipeline.generate_stream(user_issue, cancelled)
+            first_chunk = next(chunks, '')
+            started.append(chunks)
+            if cancelled is not None and cancelled.is_set():
+                close_started()
+            return first_chunk, chunks, None, issue_embedding
+        
+        def close_started():
+            """End the model call of a stream whose first chunk arrived after the issue was rejected."""
+            try:
+                # Taken by exactly one of the work thread and the request thread
+                started.pop().close()
+            except IndexError:
+                pass
+        
+        # Nothing is sent until guardrails validation passes; it runs alongside the first chunk
+        response, error = _run_guarded(services, user_issue, start_stream)
+        if error is not None:
+            close_started()
+            return error
+        
+        first_chunk, chunks, cached, issue_embedding = response
+        
+        def events():
+            parts = [first_chunk]
+            try:
+                if first_chunk:
+                    yield sse_event('token', {'text': first_chunk})
+                for chunk in chunks:
+                    parts.append(chunk)
+                    yield sse_event('token', {'text': chunk})
+                
+                ai_response = ''.join(parts).strip()
+                if cached is not None:
+                    results = cached_results(search, cached, k)
+                else:
+                    results = search.search(ai_response, k, index='english')
+                    if issue_embedding is not None:
+                        response_cache.put(issue_embedding, {'ai_response': ai_response, 'results': results,
+                                                             'k': k, 'version': search.version})
+                
+                yield sse_event('result', {
+                    'ai_response': ai_response,
+                    'search_query': ai_response,
+                    'results': results
+                })
+            except Exception as e:
+                yield sse_event('error', {'message': f'Therapy search failed: {str(e)}', 'type': APIError.INTERNAL_ERROR})
+        
+        return Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    except Exception as e:
+        return internal_error(f'Therapy search failed: {str(e)}')
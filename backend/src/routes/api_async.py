@@ -0,0 +1,310 @@
+"""
+Async variants of the LLM-bound routes, served by asgi.py.
+
+/api/therapy-search and /api/therapy-search/stream spend most of their time
+waiting on Gemini, sometimes for two calls. Here that wait is a coroutine on
+the event loop instead of a blocked worker thread, so one process can keep
+hundreds of such requests open. The CPU-bound stages (query encoding, the
+semantic cache lookup, FAISS searches) run on a thread pool of
+ASYNC_CPU_WORKERS threads so they never stall the loop. Requests and
+responses are the same as those of the Flask routes in routes/api.py.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from services.therapy_search import cached_results, cached_therapy_response, parse_therapy_request, timed_validate
+from utils import metrics
+from utils.fastjson import dumps
+from utils.responses import APIError, APISuccess, sse_event
+
+try:
+    from starlette.requests import Request
+    from starlette.responses import Response, StreamingResponse
+    from starlette.routing import Route
+    STARLETTE_AVAILABLE = True
+except ImportError:
+    STARLETTE_AVAILABLE = False
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def cpu_executor() -> ThreadPoolExecutor:
+    """
+    Threads for the CPU-bound stages of the async routes (recreated after fork).
+    
+    ASYNC_CPU_WORKERS: threads (default: the number of CPUs)
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor_pid != os.getpid():
+            workers = int(os.getenv('ASYNC_CPU_WORKERS', '0')) or os.cpu_count() or 1
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='async-cpu')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+async def run_cpu(function, *args, **kwargs):
+    """Run a blocking call on cpu_executor, in a copy of the request's context so its timings count."""
+    call = metrics.bind_context(functools.partial(function, *args, **kwargs))
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor(), call)
+
+
+def json_response(body) -> "Response":
+    """Starlette JSON response for an APIError or APISuccess."""
+    return Response(dumps(body.payload), status_code=getattr(body, 'status_code', 200),
+                    media_type='application/json')
+
+
+def validation_error(message: str, details: Optional[Dict[str, Any]] = None) -> "Response":
+    return json_response(APIError(message, APIError.VALIDATION_ERROR, 400, details))
+
+
+def internal_error(message: str = "Internal server error") -> "Response":
+    return json_response(APIError(message, APIError.INTERNAL_ERROR, 500))
+
+
+def service_error(message: str, details: Optional[Dict[str, Any]] = None) -> "Response":
+    return json_response(APIError(message, APIError.SERVICE_ERROR, 503, details))
+
+
+def success_response(data: Dict[str, Any], message: str = "Success") -> "Response":
+    return json_response(APISuccess(data, message))
+
+
+def instrumented(endpoint: str):
+    """
+    Wrap a handler with the request metrics of the Flask blueprint: in-flight
+    gauge, latency histogram, error counter and Server-Timing header.
+    
+    Args:
+        endpoint: Endpoint label, the same as the Flask route's so both are reported together
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: "Request") -> "Response":
+            start = time.perf_counter()
+            token = metrics.start_request()
+            metrics.REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+            finally:
+                metrics.REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+                timings = metrics.finish_request(token)
+                elapsed = time.perf_counter() - start
+                metrics.REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method, status=status)
+                if status >= 400:
+                    metrics.REQUEST_ERRORS.inc(endpoint=endpoint, status=status)
+            # Streamed responses only include the stages finished before the first byte
+            response.headers['Server-Timing'] = metrics.server_timing(timings, elapsed)
+            return response
+        return wrapper
+    return decorator
+
+
+async def _json(request: "Request") -> Optional[dict]:
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _first_chunk(chunks) -> str:
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return ''
+
+
+async def _run_guarded(services, user_issue: str, work):
+    """
+    Await work() alongside guardrails validation, which gates its result (see routes.api._run_guarded).
+    
+    Returns:
+        (work result, None), or (None, error response) if validation or work fails
+    """
+    from services.resilience import UnavailableError
+    from services.therapy_pipeline import StageTimeoutError
+    
+    guardrails = services.guardrails_middleware
+    try:
+        if guardrails and guardrails.enabled:
+            is_valid, validation_reason, result = await services.therapy_pipeline.run_gated_async(
+                lambda: timed_validate(guardrails, user_issue), work)
+            if not is_valid:
+                return None, validation_error(validation_reason)
+            return result, None
+        return await work(), None
+    except StageTimeoutError as timeout_error:
+        return None, service_error('Therapy pipeline timed out', {'stage': timeout_error.stage})
+    except UnavailableError as unavailable_error:
+        return None, service_error(f'AI service unavailable: {str(unavailable_error)}')
+    except Exception as ai_error:
+        return None, internal_error(f'AI service failed: {str(ai_error)}')
+
+
+async def _therapy_request(request: "Request"):
+    """Services, issue and k of a therapy request, or an error response."""
+    from services import services
+    
+    search = services.search
+    if search is None:
+        return None, service_error('Search service not initialized')
+    
+    if services.async_genai is None or services.therapy_pipeline is None:
+        return None, service_error('AI service not initialized')
+    
+    therapy_request, request_error = parse_therapy_request(await _json(request))
+    if request_error:
+        return None, validation_error(request_error)
+    user_issue, k = therapy_request
+    
+    if services.guardrails_middleware:
+        # Cheap local input checks, before any model work starts
+        is_valid, validation_reason = services.guardrails_middleware.precheck(user_issue)
+        if not is_valid:
+            return None, validation_error(validation_reason)
+    return (services, search, user_issue, k), None
+
+
+@instrumented('api.therapy_search')
+async def therapy_search(request: "Request") -> "Response":
+    """Process user issue through therapy AI and search for relevant Quran verses."""
+    try:
+        therapy_request, error = await _therapy_request(request)
+        if error is not None:
+            return error
+        services, search, user_issue, k = therapy_request
+        response_cache = services.response_cache
+        
+        async def respond():
+            """The response to a similar earlier issue, or a new AI therapy response."""
+            cached, issue_embedding = await run_cpu(cached_therapy_response, search, response_cache, user_issue)
+            if cached is not None:
+                return cached['ai_response'], cached, issue_embedding
+            
+            result = await services.therapy_pipeline.generate_async(user_issue)
+            return result['ai_response'], None, issue_embedding
+        
+        response, error = await _run_guarded(services, user_issue, respond)
+        if error is not None:
+            return error
+        
+        ai_response, cached, issue_embedding = response
+        if cached is not None:
+            return success_response({
+                'ai_response': ai_response,
+                'search_query': ai_response,
+                'results': await run_cpu(cached_results, search, cached, k)
+            }, 'Therapy guidance completed successfully')
+        
+        try:
+            search_results = await run_cpu(search.search, ai_response, k, index='english')
+        except Exception as search_error:
+            return internal_error(f'Search failed: {str(search_error)}')
+        
+        if issue_embedding is not None:
+            await run_cpu(response_cache.put, issue_embedding,
+                          {'ai_response': ai_response, 'results': search_results, 'k': k, 'version': search.version})
+        
+        return success_response({
+            'ai_response': ai_response,
+            'search_query': ai_response,
+            'results': search_results
+        }, 'Therapy guidance completed successfully')
+    
+    except Exception as e:
+        return internal_error(f'Therapy search failed: {str(e)}')
+
+
+@instrumented('api.therapy_search_stream')
+async def therapy_search_stream(request: "Request") -> "Response":
+    """Streaming therapy search (server-sent events), with the events of the Flask route."""
+    try:
+        therapy_request, error = await _therapy_request(request)
+        if error is not None:
+            return error
+        services, search, user_issue, k = therapy_request
+        response_cache = services.response_cache
+        
+        started = []
+        
+        async def start_stream():
+            """Cache lookup, translation and the first chunk of the AI therapy response."""
+            cached, issue_embedding = await run_cpu(cached_therapy_response, search, response_cache, user_issue)
+            if cached is not None:
+                return cached['ai_response'], None, cached, issue_embedding
+            
+            # A stream cancelled before its first chunk ends with the CancelledError
+            chunks = services.therapy_pipeline.generate_stream_async(user_issue)
+            first_chunk = await _first_chunk(chunks)
+            started.append(chunks)
+            return first_chunk, chunks, None, issue_embedding
+        
+        # Nothing is sent until guardrails validation passes; it runs alongside the first chunk
+        response, error = await _run_guarded(services, user_issue, start_stream)
+        if error is not None:
+            # The first chunk may have arrived before the issue was rejected: end the model call
+            for chunks in started:
+                await chunks.aclose()
+            return error
+        
+        first_chunk, chunks, cached, issue_embedding = response
+        
+        async def events():
+            parts = [first_chunk]
+            try:
+                if first_chunk:
+                    yield sse_event('token', {'text': first_chunk})
+                if chunks is not None:
+                    async for chunk in chunks:
+                        parts.append(chunk)
+                        yield sse_event('token', {'text': chunk})
+                
+                ai_response = ''.join(parts).strip()
+                if cached is not None:
+                    results = await run_cpu(cached_results, search, cached, k)
+                else:
+                    results = await run_cpu(search.search, ai_response, k, index='english')
+                    if issue_embedding is not None:
+                        await run_cpu(response_cache.put, issue_embedding,
+                                      {'ai_response': ai_response, 'results': results, 'k': k,
+                                       'version': search.version})
+                
+                yield sse_event('result', {
+                    'ai_response': ai_response,
+                    'search_query': ai_response,
+                    'results': results
+                })
+            except Exception as e:
+                yield sse_event('error', {'message': f'Therapy search failed: {str(e)}', 'type': APIError.INTERNAL_ERROR})
+        
+        return StreamingResponse(events(), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    except Exception as e:
+        return internal_error(f'Therapy search failed: {str(e)}')
+
+
+def create_routes() -> list:
+    """
+    Starlette routes of the async endpoints, to be mounted before the Flask app.
+    
+    Raises:
+        ImportError: If starlette is not installed
+    """
+    if not STARLETTE_AVAILABLE:
+        raise ImportError("The async routes need starlette. Install with: pip install starlette uvicorn")
+    return [
+        Route('/api/therapy-search', therapy_search, methods=['POST']),
+        Route('/api/therapy-search/stream', therapy_search_stream, methods=['POST']),
+    ]
@@ -3,11 +3,27 @@ Application service manager.
 """
 import os
 import logging
-from .vector_search import VectorSearchService
-from .genai import GenAIService
+import signal
+import threading
+import time
+from typing import Optional
+from .vector_search import VectorSearchService, DEFAULT_MODEL_NAME
+from .genai import GenAIService, create_genai_service
+from .genai_async import create_async_genai_service
+from .embedding_cache import create_embedding_cache
+from .response_cache import create_response_cache
+from .therapy_pipeline import create_therapy_pipeline
+from .multilingual_index import create_multilingual_index
+from .bundle import Bundle, BundleError, resolve_bundle
+from .encoders import create_encoder
 
 logger = logging.getLogger(__name__)
 
+# lazy: encoder loads on the first search (default)
+# preload: encoder weights load at startup, e.g. in the gunicorn master before fork
+# warm: preload plus warmup encodes, so the first request is served at full speed
+STARTUP_MODES = ('lazy', 'preload', 'warm')
+
 
 class AppServices:
     """Manages application services."""
@@ -15,32 +31,222 @@ class AppServices:
     def __init__(self):
         self._search_service = None
         self._genai_service = None
+        self._async_genai_service = None
         self._translation_middleware = None
         self._guardrails_middleware = None
+        self._response_cache = None
+        self._therapy_pipeline = None
+        self._startup_mode = 'lazy'
+        # Data bundle the search service was loaded from (see initialize_search_bundle)
+        self._bundle_root = None
+        self._bundle = None
+        self._bundle_verify = True
+        self._search_options = {}
+        self._reload_lock = threading.Lock()
+        self._reloads = {'succeeded': 0, 'failed': 0, 'last_seconds': None, 'last_error': None}
     
-    def initialize_search_service(self, embeddings_path: str, metadata_path: str) -> bool:
-        """Initialize the search service."""
+    def initialize_search_service(self, embeddings_path: str, metadata_path: str, index_path: Optional[str] = None,
+                                  **options) -> bool:
+        """
+        Initialize the search service, preferring a prebuilt index when one exists.
+        
+        The cross-lingual index (MULTILINGUAL_EMBEDDINGS_PATH) is attached when it
+        was built for the same verses.
+        
+        Args:
+            embeddings_path: Precomputed verse embeddings (.npy)
+            metadata_path: Bilingual verse metadata
+            index_path: Optional prebuilt FAISS index
+            **options: Extra VectorSearchService options (e.g. micro_batch_size)
+        """
+        self._search_options = options
         try:
-            self._search_service = VectorSearchService(embeddings_path, metadata_path)
+            encoder = create_encoder(DEFAULT_MODEL_NAME)
+            self._search_service = VectorSearchService(embeddings_path, metadata_path, index_path=index_path,
+                                                       encoder=encoder,
+                                                       embedding_cache=create_embedding_cache(encoder.name),
+                                                       **options)
+            self._search_service.multilingual = create_multilingual_index(len(self._search_service.verses))
             return True
         except Exception as e:
             logger.error(f"Failed to initialize search service: {e}")
             self._search_service = None
             return False
     
-    def initialize_genai_service(self, model_function) -> bool:
-        """Initialize the GenAI service with a model function."""
+    def initialize_search_bundle(self, bundle_root: str, verify: bool = True, **options) -> bool:
+        """
+        Initialize the search service from the active data bundle under bundle_root.
+        
+        Args:
+            bundle_root: Directory of bundles written by data/build_bundle.py
+            verify: Check file checksums against the bundle manifest before loading
+            **options: Extra VectorSearchService options (e.g. micro_batch_size)
+        """
+        self._bundle_root = bundle_root
+        self._bundle_verify = verify
+        self._search_options = options
+        try:
+            self._bundle = resolve_bundle(bundle_root, verify=verify)
+            self._search_service = self._create_search_service(self._bundle)
+            logger.info(f"Loaded data bundle {self._bundle.version} from {bundle_root}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to initialize search service from bundle: {e}")
+            self._search_service = None
+            return False
+    
+    def _create_search_service(self, bundle: Bundle, previous: Optional[VectorSearchService] = None):
+        """Build a search service for bundle, reusing the encoders and embedding caches of previous."""
+        model_name = bundle.model or DEFAULT_MODEL_NAME
+        if previous is not None and previous.model_name == model_name:
+            # Same model: keep the loaded weights and the warm embedding cache
+            encoder, embedding_cache = previous.encoder, previous.embedding_cache
+        else:
+            encoder = create_encoder(model_name)
+            embedding_cache = create_embedding_cache(encoder.name)
+        service = VectorSearchService(bundle.file('embeddings'), bundle.file('metadata'), model_name=model_name,
+                                      index_path=bundle.file('index'), encoder=encoder,
+                                      embedding_cache=embedding_cache, version=bundle.version,
+                                      **self._search_options)
+        if bundle.file('multilingual'):
+            service.multilingual = create_multilingual_index(
+                len(service.verses), bundle.file('multilingual'),
+                previous.multilingual if previous is not None else None)
+        return service
+    
+    def reload_search_service(self, version: Optional[str] = None) -> dict:
+        """
+        Switch the search service to another bundle version without a restart.
+        
+        Read-copy-update: the new service is built and warmed next to the old
+        one, then replaces it in a single assignment. Requests keep the service
+        they started with, so in-flight searches finish on the old version,
+        which is freed once the last of them drops it.
+        
+        Args:
+            version: Bundle version to load, defaults to the one named in CURRENT
+        
+        Returns:
+            The loaded bundle's description, with the previous version and the load time
+        
+        Raises:
+            BundleError: If the service was not loaded from a bundle, or the bundle fails verification
+        """
+        if self._bundle_root is None:
+            raise BundleError("The search service was not loaded from a data bundle")
+        
+        with self._reload_lock:
+            start = time.perf_counter()
+            previous = self._search_service
+            try:
+                bundle = resolve_bundle(self._bundle_root, version, verify=self._bundle_verify)
+                service = self._create_search_service(bundle, previous)
+                if self._startup_mode != 'lazy':
+                    service.load_model()
+                if previous is not None and previous.warmed_up:
+                    service.warmup()
+            except Exception as e:
+                self._reloads['failed'] += 1
+                self._reloads['last_error'] = str(e)
+                raise
+            
+            self._search_service, self._bundle = service, bundle
+            if previous is not None:
+                previous.close()
+            if self._response_cache is not None and (previous is None or previous.encoder is not service.encoder):
+                # Responses are matched by issue embedding, which another model cannot compare
+                self._response_cache.clear()
+                self._response_cache.namespace = service.encoder.name
+            
+            seconds = time.perf_counter() - start
+            self._reloads['succeeded'] += 1
+            self._reloads['last_seconds'] = round(seconds, 3)
+            self._reloads['last_error'] = None
+        
+        logger.info(f"Switched to data bundle {bundle.version} in {seconds:.2f}s")
+        return {**bundle.describe(), 'previous_version': previous.version if previous is not None else None,
+                'seconds': round(seconds, 3)}
+    
+    def install_reload_signal(self, signal_name: str = 'SIGHUP') -> bool:
+        """
+        Reload the active bundle whenever the process receives signal_name.
+        
+        Must be called from the main thread. Under gunicorn that is post_worker_init,
+        after the worker has reset its signal handlers.
+        
+        Returns:
+            False when the search service was not loaded from a bundle
+        """
+        if self._bundle_root is None:
+            return False
+        
+        def handle(signum, frame):
+            # Loading takes seconds, too long to spend inside a handler that interrupts a request
+            threading.Thread(target=self._reload_logged, name='bundle-reload', daemon=True).start()
+        
+        signal.signal(getattr(signal, signal_name), handle)
+        logger.info(f"{signal_name} reloads the active data bundle")
+        return True
+    
+    def _reload_logged(self):
+        try:
+            self.reload_search_service()
+        except Exception as e:
+            logger.error(f"Data bundle reload failed, still serving {self._bundle.version if self._bundle else None}: {e}")
+    
+    def initialize_response_cache(self):
+        """Initialize the therapy response cache (needs the search service's encoder)."""
+        if self._search_service is None:
+            return
+        self._response_cache = create_response_cache(self._search_service.encoder.name)
+        if self._response_cache is not None:
+            logger.info(f"Therapy response cache enabled ({len(self._response_cache)} entries loaded)")
+    
+    def initialize_genai_service(self, model_function, stream_function=None) -> bool:
+        """Initialize the GenAI service with a model function and, optionally, a streaming one."""
         try:
-            self._genai_service = GenAIService(model_function)
+            self._genai_service = create_genai_service(model_function, stream_function)
+            self._therapy_pipeline = create_therapy_pipeline(self._genai_service, self._translation_middleware)
             return True
         except Exception as e:
             logger.error(f"Failed to initialize GenAI service: {e}")
             self._genai_service = None
+            self._therapy_pipeline = None
             return False
     
+    def initialize_async_genai_service(self, model_function, stream_function=None) -> bool:
+        """
+        Initialize the GenAI service used by the async routes, after initialize_genai_service.
+        
+        It shares the sync service's circuit breaker and is used by the therapy
+        pipeline's and the translation middleware's async methods.
+        
+        Args:
+            model_function: Coroutine function taking a prompt and returning the response
+            stream_function: Optional async generator function yielding response chunks
+        """
+        if self._genai_service is None:
+            return False
+        try:
+            self._async_genai_service = create_async_genai_service(model_function, stream_function,
+                                                                   self._genai_service.circuit_breaker)
+        except Exception as e:
+            logger.error(f"Failed to initialize async GenAI service: {e}")
+            self._async_genai_service = None
+            return False
+        if self._therapy_pipeline is not None:
+            self._therapy_pipeline.async_genai = self._async_genai_service
+        if self._translation_middleware is not None:
+            self._translation_middleware.async_ai_service = self._async_genai_service
+        return True
+    
     def set_translation_middleware(self, middleware):
         """Set the translation middleware."""
         self._translation_middleware = middleware
+        if self._therapy_pipeline is not None:
+            self._therapy_pipeline.translation_middleware = middleware
+        if self._async_genai_service is not None:
+            middleware.async_ai_service = self._async_genai_service
         logger.info(f"Translation middleware set: {type(middleware).__name__}")
     
     def set_guardrails_middleware(self, middleware):
@@ -48,6 +254,77 @@ class AppServices:
         self._guardrails_middleware = middleware
         logger.info(f"Guardrails middleware set: {type(middleware).__name__}")
     
+    def prepare_models(self, startup_mode: str = 'lazy'):
+        """
+        Load models according to the startup mode.
+        
+        Args:
+            startup_mode: One of STARTUP_MODES
+        """
+        if startup_mode not in STARTUP_MODES:
+            logger.warning(f"Unknown startup mode '{startup_mode}', using 'lazy'")
+            startup_mode = 'lazy'
+        self._startup_mode = startup_mode
+        
+        if self._search_service is None or startup_mode == 'lazy':
+            return
+        
+        self._search_service.load_model()
+        if startup_mode == 'warm':
+            self._search_service.warmup()
+        logger.info(f"Models prepared (startup mode: {startup_mode})")
+    
+    def warmup(self):
+        """Run warmup encodes, e.g. in each worker after fork."""
+        if self._search_service is not None:
+            self._search_service.warmup()
+    
+    def readiness(self) -> dict:
+        """
+        Report per-component readiness.
+        
+        Returns:
+            Dict with overall 'ready' flag and a 'components' mapping
+        """
+        components = {}
+        if self._search_service is not None:
+            components.update(self._search_service.readiness())
+            # In lazy mode an unloaded encoder is expected, not a reason to stop routing traffic
+            for name in ('encoder', 'multilingual_encoder'):
+                if self._startup_mode == 'lazy' and name in components and not components[name]['ready']:
+                    components[name] = {'ready': True, 'state': 'lazy'}
+        else:
+            components['index'] = {'ready': False, 'state': 'not_initialized'}
+            components['encoder'] = {'ready': False, 'state': 'not_initialized'}
+        
+        components['genai'] = {'ready': self._genai_service is not None}
+        
+        guardrails = self._guardrails_middleware
+        if guardrails is None or not guardrails.enabled:
+            components['guardrails'] = {'ready': True, 'state': 'disabled'}
+        else:
+            components['guardrails'] = {'ready': guardrails.ready, 'state': guardrails.state}
+        
+        return {
+            'ready': all(component['ready'] for component in components.values()),
+            'startup_mode': self._startup_mode,
+            'components': components
+        }
+    
+    def stats(self) -> dict:
+        """Return counters from all services."""
+        return {
+            'search': self._search_service.stats() if self._search_service is not None else None,
+            'genai': self._genai_service.stats() if self._genai_service is not None else None,
+            'genai_async': self._async_genai_service.stats() if self._async_genai_service is not None else None,
+            'therapy_cache': self._response_cache.stats() if self._response_cache is not None else None,
+            'translation': self._translation_middleware.stats() if self._translation_middleware is not None else None,
+            'therapy_pipeline': self._therapy_pipeline.stats() if self._therapy_pipeline is not None else None,
+            'guardrails': self._guardrails_middleware.stats() if self._guardrails_middleware is not None else None,
+            'bundle': {**self._bundle.describe(), 'root': self._bundle_root,
+                       'reloads': dict(self._reloads)} if self._bundle is not None else None
+        }
+    
     @property
     def search(self):
         """Get the search service."""
@@ -58,6 +335,11 @@ class AppServices:
         """Get the GenAI service."""
         return self._genai_service
     
+    @property
+    def async_genai(self):
+        """Get the GenAI service of the async routes."""
+        return self._async_genai_service
+    
     @property
     def translation_middleware(self):
         """Get the translation middleware."""
@@ -67,6 +349,16 @@ class AppServices:
     def guardrails_middleware(self):
         """Get the guardrails middleware."""
         return self._guardrails_middleware
+    
+    @property
+    def therapy_pipeline(self):
+        """Get the therapy pipeline (translation and therapy prompting)."""
+        return self._therapy_pipeline
+    
+    @property
+    def response_cache(self):
+        """Get the therapy response cache."""
+        return self._response_cache
 
 
 # Global services instance
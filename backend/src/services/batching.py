@@ -0,0 +1,154 @@
+"""
+Dynamic micro-batching for concurrent single-query searches.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Queues single queries from many threads and runs them as one batch.
+    
+    The worker thread starts on first use and is restarted after fork, so a
+    batcher created in a preloaded gunicorn master works in every worker.
+    close() stops it once the queued queries have run.
+    """
+    
+    def __init__(self, batch_function: Callable[[List[str], List[int]], List[list]],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        """
+        Initialize the batcher.
+        
+        Args:
+            batch_function: Callable taking (queries, ks) and returning one result list per query
+            max_batch_size: Flush as soon as this many queries are waiting
+            max_wait_ms: Flush at the latest this long after the first query of a batch arrived
+        """
+        self.batch_function = batch_function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._worker = None
+        self._pid = None
+        self._closed = False
+        self._lock = threading.Lock()
+        # Batch sizes bucketed by powers of two: 1, 2, 4, ..., max_batch_size
+        self._buckets = [2 ** i for i in range(max(1, max_batch_size).bit_length())]
+        if self._buckets[-1] < max_batch_size:
+            self._buckets.append(max_batch_size)
+        self._histogram = [0] * len(self._buckets)
+        self.batches = 0
+        self.queries = 0
+    
+    def _ensure_worker(self):
+        """Start the worker thread (again, in a forked child) if it is not running in this process."""
+        if self._pid == os.getpid() or self._closed:
+            return
+        with self._lock:
+            if self._pid != os.getpid() and not self._closed:
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, args=(self._queue,),
+                                                name='search-microbatcher', daemon=True)
+                self._worker.start()
+                self._pid = os.getpid()
+    
+    def submit(self, query: str, k: int) -> Future:
+        """Queue a query; the returned future resolves to its own results."""
+        self._ensure_worker()
+        future = Future()
+        with self._lock:
+            if not self._closed:
+                self._queue.put((query, k, future))
+                return future
+        # Closed: run the query on the caller's thread
+        try:
+            future.set_result(self.batch_function([query], [k])[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def close(self):
+        """Stop the worker thread after the queries already queued; later queries run unbatched."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._queue is not None and self._pid == os.getpid():
+                self._queue.put(None)
+    
+    def search(self, query: str, k: int, timeout: float = None) -> list:
+        """Queue a query and wait for its results."""
+        return self.submit(query, k).result(timeout)
+    
+    def _collect(self, pending: queue.Queue) -> list:
+        """
+        Block for the first query, then gather more until the batch is full or the deadline passes.
+        
+        A None from close() ends the batch and is kept as its last item.
+        """
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self, pending: queue.Queue):
+        while True:
+            batch = self._collect(pending)
+            closed = batch[-1] is None
+            # Skip callers that gave up (cancelled) before the batch ran
+            batch = [item for item in batch if item is not None and item[2].set_running_or_notify_cancel()]
+            if batch:
+                self._run_batch(batch)
+            if closed:
+                return
+    
+    def _run_batch(self, batch: list):
+        self._record(len(batch))
+        try:
+            results = self.batch_function([item[0] for item in batch], [item[1] for item in batch])
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            logger.error(f"Micro-batch of {len(batch)} queries failed: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+    
+    def _record(self, size: int):
+        with self._lock:
+            self.batches += 1
+            self.queries += size
+            for i, bound in enumerate(self._buckets):
+                if size <= bound:
+                    self._histogram[i] += 1
+                    break
+    
+    def stats(self) -> dict:
+        """Return queue depth and the batch-size histogram (cumulative count per upper bound)."""
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, count in zip(self._buckets, self._histogram):
+                running += count
+                cumulative[str(bound)] = running
+            return {
+                'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': self.batches,
+                'queries': self.queries,
+                'mean_batch_size': self.queries / self.batches if self.batches else 0.0,
+                'batch_size_histogram': cumulative
+            }
@@ -0,0 +1,147 @@
+"""
+Versioned data bundles: the search artifacts of one data build, with checksums.
+
+data/build_bundle.py copies the outputs of the data scripts into
+<root>/<version>/ and writes manifest.json next to them:
+
+    {"version": "20261017-120000", "created": "2026-10-17T12:00:00Z",
+     "model": "multi-qa-mpnet-base-dot-v1",
+     "files": {"embeddings": {"path": "quran_embeddings.npy", "bytes": ..., "sha256": "..."}, ...}}
+
+<root>/CURRENT holds the name of the active version. A bundle directory is
+never modified after it is written, so a server can switch to a new one
+while requests still read the old one.
+"""
+import hashlib
+import json
+import os
+from typing import Optional
+
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'CURRENT'
+# Roles every bundle has; index, multilingual, multilingual_manifest and multilingual_index are optional
+REQUIRED_ROLES = ('embeddings', 'metadata')
+
+
+class BundleError(Exception):
+    """A bundle is missing, incomplete or does not match its manifest."""
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Bundle:
+    """A bundle directory and its manifest."""
+    
+    def __init__(self, path: str, manifest: dict):
+        self.path = path
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.model = manifest.get('model')
+    
+    def file(self, role: str) -> Optional[str]:
+        """Absolute path of the file with role, None if the bundle has none."""
+        entry = self.manifest['files'].get(role)
+        return os.path.join(self.path, entry['path']) if entry else None
+    
+    def describe(self) -> dict:
+        return {'version': self.version, 'model': self.model, 'created': self.manifest.get('created'),
+                'files': sorted(self.manifest['files'])}
+
+
+def check_entry(bundle: Bundle, role: str, entry, verify: bool):
+    """
+    Check that a manifest file entry is well formed and names a file inside the bundle directory.
+    
+    Raises:
+        BundleError: If the entry lacks a field or its path leaves the bundle directory
+    """
+    fields = ('path', 'bytes', 'sha256') if verify else ('path', 'bytes')
+    if not isinstance(entry, dict) or any(field not in entry for field in fields):
+        raise BundleError(f"Bundle {bundle.version}: malformed {role} entry (needs {', '.join(fields)})")
+    if (not isinstance(entry['path'], str) or not isinstance(entry['bytes'], int)
+            or (verify and not isinstance(entry['sha256'], str))):
+        raise BundleError(f"Bundle {bundle.version}: malformed {role} entry")
+    
+    file_path = entry['path']
+    # The manifest is data; it must not name files outside the bundle
+    if not file_path or os.path.isabs(file_path) or '..' in file_path.replace('\\', '/').split('/'):
+        raise BundleError(f"Bundle {bundle.version}: {role} path '{file_path}' is outside the bundle")
+    root = os.path.realpath(bundle.path)
+    if os.path.commonpath([root, os.path.realpath(os.path.join(root, file_path))]) != root:
+        raise BundleError(f"Bundle {bundle.version}: {role} path '{file_path}' is outside the bundle")
+
+
+def load_bundle(path: str, verify: bool = True) -> Bundle:
+    """
+    Read a bundle's manifest and check its files.
+    
+    Args:
+        path: Bundle directory
+        verify: Compare SHA-256 checksums, not only file sizes
+    
+    Raises:
+        BundleError: If the manifest is unreadable or malformed, or a file is missing or differs from it
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            bundle = Bundle(path, json.load(f))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise BundleError(f"Unreadable bundle manifest in {path}: {e}") from e
+    
+    files = bundle.manifest.get('files')
+    if not isinstance(files, dict):
+        raise BundleError(f"Bundle {bundle.version}: manifest has no files")
+    for role in REQUIRED_ROLES:
+        if role not in files:
+            raise BundleError(f"Bundle {bundle.version} has no {role} file")
+    for role, entry in files.items():
+        check_entry(bundle, role, entry, verify)
+        file_path = bundle.file(role)
+        if not os.path.isfile(file_path):
+            raise BundleError(f"Bundle {bundle.version} is missing {entry['path']}")
+        if os.path.getsize(file_path) != entry['bytes']:
+            raise BundleError(f"Bundle {bundle.version}: {entry['path']} has {os.path.getsize(file_path)} bytes, "
+                              f"expected {entry['bytes']}")
+        if verify and file_sha256(file_path) != entry['sha256']:
+            raise BundleError(f"Bundle {bundle.version}: checksum mismatch for {entry['path']}")
+    return bundle
+
+
+def current_version(root: str) -> Optional[str]:
+    """The active version named in <root>/CURRENT, None if there is none."""
+    try:
+        with open(os.path.join(root, CURRENT_NAME), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_bundle(root: str, version: Optional[str] = None, verify: bool = True) -> Bundle:
+    """
+    Load a bundle version under root, the active one by default.
+    
+    Raises:
+        BundleError: If there is no such version or it fails verification
+    """
+    version = version or current_version(root)
+    if not version:
+        raise BundleError(f"No active bundle in {root} ({CURRENT_NAME} is missing)")
+    # Versions are directory names; anything else could point outside the root
+    if os.path.basename(version) != version or version in ('.', '..'):
+        raise BundleError(f"Invalid bundle version '{version}'")
+    return load_bundle(os.path.join(root, version), verify)
+
+
+def activate(root: str, version: str):
+    """Make version the active bundle by rewriting <root>/CURRENT atomically."""
+    tmp_path = os.path.join(root, CURRENT_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, os.path.join(root, CURRENT_NAME))
@@ -0,0 +1,238 @@
+"""
+Query embedding cache in front of the encoder.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.cache import LRUCache, normalize_text
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteEmbeddingStore:
+    """Embedding store in a SQLite file, shared by all worker processes on a host."""
+    
+    def __init__(self, path: str, max_rows: int = 100000, ttl: Optional[float] = None):
+        """
+        Initialize the store.
+        
+        Args:
+            path: SQLite database file, created if missing
+            max_rows: Oldest rows are pruned once the table grows past this size
+            ttl: Seconds a stored embedding stays valid, None for no expiry
+        """
+        self.path = path
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+    
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Return this thread's connection, opened on first use in each process.
+        
+        sqlite3 connections are not shared across threads, and must not be used
+        across fork: a store created before gunicorn forks its workers would hand
+        them the master's connection. A connection opened in another process is
+        dropped (not closed, which could release the other process's locks).
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            # WAL lets workers read while another one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)"
+                )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return stored embeddings for the keys that are present and not expired."""
+        if not keys:
+            return {}
+        
+        placeholders = ','.join('?' * len(keys))
+        query = f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})"
+        params = list(keys)
+        if self.ttl:
+            query += " AND created >= ?"
+            params.append(time.time() - self.ttl)
+        
+        try:
+            rows = self._connection().execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding store read failed: {e}")
+            return {}
+        return {key: np.frombuffer(vector, dtype=np.float32) for key, vector in rows}
+    
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Store embeddings, pruning the oldest rows when the table is full."""
+        if not items:
+            return
+        
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        try:
+            with self._connection() as conn:
+                conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, created) VALUES (?, ?, ?)", rows)
+                self._writes += len(rows)
+                if self._writes >= 1000:
+                    self._writes = 0
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE key IN ("
+                        "SELECT key FROM embeddings ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                        (self.max_rows,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding store write failed: {e}")
+
+
+class EmbeddingCache:
+    """Text-keyed cache of query embeddings, optionally backed by a shared store."""
+    
+    def __init__(self, max_size: int = 4096, ttl: Optional[float] = None,
+                 store: Optional[SqliteEmbeddingStore] = None, namespace: str = '',
+                 case_sensitive: bool = False):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_size: Maximum number of embeddings kept in process memory
+            ttl: Seconds an embedding stays valid, None for no expiry
+            store: Optional shared store consulted on in-memory misses
+            namespace: Prefix for shared store keys (the encoder model name), so models never mix
+            case_sensitive: Key on the stripped text instead of normalize_text, for cased encoders
+                whose embeddings differ by case or Unicode form
+        """
+        self.memory = LRUCache(max_size, ttl)
+        self.store = store
+        self.namespace = namespace
+        self.case_sensitive = case_sensitive
+        self.store_hits = 0
+    
+    def key(self, text: str) -> str:
+        """Cache key of text; texts with the same key share an embedding."""
+        return text.strip() if self.case_sensitive else normalize_text(text)
+    
+    def _store_key(self, key: str) -> str:
+        return hashlib.sha1(f"{self.namespace}\0{key}".encode('utf-8')).hexdigest()
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings for texts.
+        
+        Returns:
+            One embedding per text, None where the text is not cached
+        """
+        keys = [self.key(text) for text in texts]
+        found = [self.memory.get(key) for key in keys]
+        
+        missing = [key for key, embedding in zip(keys, found) if embedding is None]
+        if self.store is not None and missing:
+            stored = self.store.get_many([self._store_key(key) for key in missing])
+            for i, key in enumerate(keys):
+                if found[i] is None:
+                    embedding = stored.get(self._store_key(key))
+                    if embedding is not None:
+                        self.memory.set(key, embedding)
+                        self.store_hits += 1
+                        found[i] = embedding
+        return found
+    
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        """Cache embeddings for texts (in memory and in the shared store, if any)."""
+        items = {}
+        for text, embedding in zip(texts, embeddings):
+            key = self.key(text)
+            self.memory.set(key, embedding)
+            items[self._store_key(key)] = embedding
+        if self.store is not None:
+            self.store.put_many(items)
+    
+    def clear(self):
+        """Clear the in-memory cache."""
+        self.memory.clear()
+    
+    def stats(self) -> dict:
+        """Return hit/miss counters; 'hits' counts memory and shared store hits together."""
+        stats = self.memory.stats()
+        stats['store_hits'] = self.store_hits
+        stats['shared_store'] = self.store.path if self.store is not None else None
+        # Memory misses that the shared store answered are hits overall
+        stats['misses'] -= self.store_hits
+        stats['hits'] += self.store_hits
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+def create_embedding_cache(namespace: str = '', case_sensitive: bool = False) -> Optional[EmbeddingCache]:
+    """
+    Create the embedding cache from environment variables.
+    
+    EMBEDDING_CACHE_SIZE: in-memory entries, 0 disables the cache (default 4096)
+    EMBEDDING_CACHE_TTL: seconds an embedding stays valid, 0 for no expiry (default 0)
+    EMBEDDING_CACHE_PATH: SQLite file shared by all workers (default: in-process only)
+    
+    Args:
+        namespace: Encoder model name, prefixed to shared store keys
+        case_sensitive: See EmbeddingCache
+    
+    Returns:
+        EmbeddingCache, or None when disabled
+    """
+    max_size = int(os.getenv('EMBEDDING_CACHE_SIZE', '4096'))
+    if max_size <= 0:
+        return None
+    
+    ttl = float(os.getenv('EMBEDDING_CACHE_TTL', '0')) or None
+    store_path = os.getenv('EMBEDDING_CACHE_PATH')
+    # The store connects on first use in each worker; an unusable file only logs warnings then
+    store = SqliteEmbeddingStore(store_path, ttl=ttl) if store_path else None
+    
+    return EmbeddingCache(max_size, ttl, store, namespace, case_sensitive)
+
+
+def encode_cached(encoder, cache: Optional[EmbeddingCache], queries: List[str]) -> np.ndarray:
+    """
+    Encode queries with encoder, reusing the embeddings found in cache.
+    
+    Args:
+        encoder: QueryEncoder whose embeddings the cache holds
+        cache: Embedding cache, or None to always encode
+        queries: Texts to encode
+    
+    Returns:
+        float32 array of shape (len(queries), dim)
+    """
+    if cache is None:
+        with timed('encode'):
+            return encoder.encode(queries)
+    
+    embeddings = cache.get_many(queries)
+    # Encode each distinct missing text (by cache key) once
+    missing = {}
+    for query, emb in zip(queries, embeddings):
+        if emb is None:
+            missing.setdefault(cache.key(query), query)
+    if missing:
+        with timed('encode'):
+            encoded = encoder.encode(list(missing.values()))
+        cache.put_many(list(missing.values()), encoded)
+        by_key = dict(zip(missing.keys(), encoded))
+        embeddings = [by_key[cache.key(q)] if emb is None else emb for q, emb in zip(queries, embeddings)]
+    
+    return np.stack(embeddings).astype(np.float32, copy=False)
@@ -0,0 +1,194 @@
+"""
+Query encoder backends for the vector search service.
+"""
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+ENCODER_BACKENDS = ('torch', 'onnx')
+
+
+class QueryEncoder(ABC):
+    """Interface for query encoders: text in, normalized float32 embeddings out."""
+    
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+    
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Identifies model and backend, e.g. for cache namespaces."""
+        pass
+    
+    @abstractmethod
+    def _load(self):
+        """Load and return the underlying model."""
+        pass
+    
+    @abstractmethod
+    def _encode(self, model, texts: List[str]) -> np.ndarray:
+        """Encode texts with the loaded model, returning normalized float32 embeddings."""
+        pass
+    
+    @property
+    def loaded(self) -> bool:
+        """Whether the model has been loaded."""
+        return self._model is not None
+    
+    def load(self):
+        """Load the model once, even when several threads ask for it at the same time."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    logger.info(f"Loading encoder: {self.name}")
+                    self._model = self._load()
+        return self
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts (normalized for cosine similarity).
+        
+        Args:
+            texts: Texts to encode
+        
+        Returns:
+            float32 array of shape (len(texts), dim)
+        """
+        self.load()
+        return self._encode(self._model, texts)
+
+
+class SentenceTransformerEncoder(QueryEncoder):
+    """PyTorch SentenceTransformer encoder (the reference implementation)."""
+    
+    def __init__(self, model_name: str, num_threads: Optional[int] = None):
+        """
+        Args:
+            model_name: SentenceTransformer model name or path
+            num_threads: torch intra-op threads, None for the library default
+        """
+        super().__init__()
+        self.model_name = model_name
+        self.num_threads = num_threads
+    
+    @property
+    def name(self) -> str:
+        return f"{self.model_name}:torch"
+    
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+        
+        if self.num_threads:
+            import torch
+            torch.set_num_threads(self.num_threads)
+        return SentenceTransformer(self.model_name)
+    
+    def _encode(self, model, texts: List[str]) -> np.ndarray:
+        return model.encode(texts, normalize_embeddings=True)
+
+
+class OnnxEncoder(QueryEncoder):
+    """ONNX Runtime encoder for a transformer exported by data/export_onnx.py (no torch import)."""
+    
+    def __init__(self, model_dir: str, quantized: bool = False, num_threads: Optional[int] = None):
+        """
+        Args:
+            model_dir: Export directory with model.onnx / model_int8.onnx, tokenizer.json and encoder_config.json
+            quantized: Use the int8 dynamically quantized model
+            num_threads: ONNX Runtime intra-op threads, None for the library default
+        """
+        super().__init__()
+        if not ONNX_AVAILABLE:
+            raise ImportError("ONNX encoder requires onnxruntime and tokenizers. Install with: pip install onnxruntime tokenizers")
+        
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.num_threads = num_threads
+        with open(os.path.join(model_dir, "encoder_config.json")) as f:
+            self.config = json.load(f)
+    
+    @property
+    def name(self) -> str:
+        return f"{self.config['model_name']}:onnx{'-int8' if self.quantized else ''}"
+    
+    def _load(self):
+        tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        tokenizer.enable_padding(pad_id=self.config['pad_token_id'], pad_token=self.config['pad_token'])
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+            options.inter_op_num_threads = 1
+        model_file = "model_int8.onnx" if self.quantized else "model.onnx"
+        session = ort.InferenceSession(os.path.join(self.model_dir, model_file), options,
+                                       providers=['CPUExecutionProvider'])
+        return tokenizer, session
+    
+    def _encode(self, model, texts: List[str]) -> np.ndarray:
+        tokenizer, session = model
+        encodings = tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.config['input_names']:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+        token_embeddings = session.run(None, feeds)[0]
+        
+        # Same pooling as the SentenceTransformer model (CLS for multi-qa-mpnet-base-dot-v1)
+        if self.config['pooling'] == 'cls':
+            embeddings = token_embeddings[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def create_encoder(model_name: str) -> QueryEncoder:
+    """
+    Create the query encoder from environment variables.
+    
+    ENCODER_BACKEND: 'torch' (default) or 'onnx'
+    ENCODER_ONNX_PATH: export directory written by data/export_onnx.py
+    ENCODER_ONNX_QUANTIZED: 'true' to use the int8 model
+    ENCODER_THREADS: intra-op threads, 0 for the library default
+    
+    Falls back to the torch encoder when the ONNX backend cannot be created.
+    """
+    backend = os.getenv('ENCODER_BACKEND', 'torch').lower()
+    num_threads = int(os.getenv('ENCODER_THREADS', '0')) or None
+    
+    if backend == 'onnx':
+        try:
+            encoder = OnnxEncoder(os.getenv('ENCODER_ONNX_PATH', ''),
+                                  quantized=os.getenv('ENCODER_ONNX_QUANTIZED', 'false').lower() == 'true',
+                                  num_threads=num_threads)
+            # The verse embeddings were built with model_name; another model would not match them
+            if encoder.config['model_name'] != model_name:
+                raise ValueError(f"export is for {encoder.config['model_name']}, expected {model_name}")
+            return encoder
+        except Exception as e:
+            logger.warning(f"ONNX encoder unavailable ({e}), using the torch encoder")
+    elif backend != 'torch':
+        logger.warning(f"Unknown encoder backend '{backend}', using the torch encoder")
+    
+    return SentenceTransformerEncoder(model_name, num_threads)
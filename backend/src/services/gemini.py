@@ -3,7 +3,7 @@ Google Gemini API service implementation.
 """
 import os
 import logging
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -18,13 +18,15 @@ except ImportError:
 class GeminiService:
     """Service for interacting with Google Gemini API."""
     
-    def __init__(self, api_key: Optional[str] = None, model_name: str = "gemini-pro"):
+    def __init__(self, api_key: Optional[str] = None, model_name: str = "gemini-pro",
+                 request_timeout: Optional[float] = None):
         """
         Initialize Gemini service.
         
         Args:
             api_key: Gemini API key. If None, will try to get from environment
             model_name: Name of the Gemini model to use
+            request_timeout: Seconds before the HTTP request to Gemini is abandoned, None for the library default
         """
         if not GEMINI_AVAILABLE:
             raise ImportError("Google GenerativeAI library is required. Install with: pip install google-generativeai")
@@ -34,6 +36,7 @@ class GeminiService:
             raise ValueError("Gemini API key is required. Set GEMINI_API_KEY environment variable or pass api_key parameter.")
         
         self.model_name = model_name
+        self.request_options = {'timeout': request_timeout} if request_timeout else {}
         genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel(model_name)
         
@@ -54,7 +57,7 @@ class GeminiService:
         """
         try:
             logger.info(f"Sending prompt to Gemini (model: {self.model_name})")
-            response = self.model.generate_content(prompt)
+            response = self.model.generate_content(prompt, request_options=self.request_options)
             
             if not response.text:
                 raise Exception("Empty response from Gemini API")
@@ -65,7 +68,97 @@ class GeminiService:
             
         except Exception as e:
             logger.error(f"Gemini API error: {e}")
-            raise Exception(f"Failed to generate response from Gemini: {e}")
+            raise Exception(f"Failed to generate response from Gemini: {e}") from e
+
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """
+        Stream a response from Gemini API.
+        
+        Args:
+            prompt: Input prompt text
+        
+        Yields:
+            Response text chunks as Gemini produces them
+        
+        Raises:
+            Exception: If API call fails
+        """
+        try:
+            logger.info(f"Streaming prompt to Gemini (model: {self.model_name})")
+            for chunk in self.model.generate_content(prompt, stream=True, request_options=self.request_options):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. only finish or safety metadata)
+                    continue
+                if text:
+                    yield text
+        
+        except Exception as e:
+            logger.error(f"Gemini API streaming error: {e}")
+            raise Exception(f"Failed to stream response from Gemini: {e}") from e
+
+    async def generate_response_async(self, prompt: str) -> str:
+        """
+        Generate response from Gemini API without blocking the event loop.
+        
+        Uses the library's async (gRPC asyncio) client. It is created on the first
+        call and its channel is kept open, so requests share pooled HTTP/2
+        connections; call it from the same event loop every time.
+        
+        Args:
+            prompt: Input prompt text
+            
+        Returns:
+            Generated response text
+            
+        Raises:
+            Exception: If API call fails
+        """
+        try:
+            logger.info(f"Sending prompt to Gemini asynchronously (model: {self.model_name})")
+            response = await self.model.generate_content_async(prompt, request_options=self.request_options)
+            
+            if not response.text:
+                raise Exception("Empty response from Gemini API")
+            
+            generated_text = response.text.strip()
+            logger.info(f"Gemini response: {generated_text}")
+            return generated_text
+            
+        except Exception as e:
+            logger.error(f"Gemini API error: {e}")
+            raise Exception(f"Failed to generate response from Gemini: {e}") from e
+    
+    async def generate_stream_async(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream a response from Gemini API without blocking the event loop.
+        
+        Args:
+            prompt: Input prompt text
+        
+        Yields:
+            Response text chunks as Gemini produces them
+        
+        Raises:
+            Exception: If API call fails
+        """
+        try:
+            logger.info(f"Streaming prompt to Gemini asynchronously (model: {self.model_name})")
+            response = await self.model.generate_content_async(prompt, stream=True,
+                                                               request_options=self.request_options)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. only finish or safety metadata)
+                    continue
+                if text:
+                    yield text
+        
+        except Exception as e:
+            logger.error(f"Gemini API streaming error: {e}")
+            raise Exception(f"Failed to stream response from Gemini: {e}") from e
 
 
 def create_gemini_function(api_key: Optional[str] = None, model_name: str = "gemini-pro") -> callable:
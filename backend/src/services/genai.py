@@ -1,23 +1,168 @@
 """
 GenAI service with dependency injection for different AI models.
 """
-from typing import Callable, Any
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Any, Iterator, Optional, Union
 import logging
+import os
+import queue
+import threading
+import time
+
+from .resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceededError, LatencyWindow, OverloadedError,
+                         backoff_delay, is_transient_error)
+from utils.metrics import bind_context, timed
 
 logger = logging.getLogger(__name__)
 
+# Put on a stream's chunk queue after its last chunk
+_STREAM_END = object()
+
 
 class GenAIService:
-    """Generic AI service that uses dependency injection for different models."""
+    """
+    Generic AI service that uses dependency injection for different models.
     
-    def __init__(self, model_function: Callable[[str], str]):
+    Calls can be bounded by a per-attempt timeout and an overall deadline,
+    retried with jittered backoff on transient errors, hedged with a second
+    request when the first is slower than usual, limited to a number of calls
+    in flight, and short-circuited while the upstream keeps failing. Every
+    safeguard is off by default; see create_genai_service for the settings
+    used by the app.
+    """
+    
+    def __init__(self, model_function: Callable[[str], str],
+                 stream_function: Optional[Callable[[str], Iterator[str]]] = None,
+                 timeout: Optional[float] = None, deadline: Optional[float] = None,
+                 max_retries: int = 0, retry_base_delay: float = 0.5, retry_max_delay: float = 8.0,
+                 hedge_after: Union[float, str, None] = None, max_in_flight: Optional[int] = None,
+                 queue_timeout: float = 1.0, circuit_breaker: Optional[CircuitBreaker] = None):
         """
         Initialize GenAI service with a model function.
         
         Args:
             model_function: A callable that takes a prompt string and returns a response string
+            stream_function: Optional callable that takes a prompt string and yields response chunks
+            timeout: Seconds each attempt may take, None for no limit
+            deadline: Seconds a generate() call may take across all attempts and backoff, None for no limit
+            max_retries: Retries after a transient error (timeouts, rate limits, 5xx)
+            retry_base_delay: Backoff before the first retry is uniform in [0, retry_base_delay]
+            retry_max_delay: Upper bound of the backoff
+            hedge_after: Send a second request when the first has not answered after this many
+                seconds, or 'p95' for the 95th percentile of recent latencies; None disables hedging
+            max_in_flight: Maximum concurrent model calls (hedges included), None for no limit
+            queue_timeout: Seconds to wait for a free slot before failing with OverloadedError
+            circuit_breaker: Optional CircuitBreaker; while open, calls fail with CircuitOpenError
         """
         self.model_function = model_function
+        self.stream_function = stream_function
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge_after = hedge_after
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(failure_threshold=0)
+        self.latencies = LatencyWindow()
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._counters = {'calls': 0, 'failures': 0, 'retries': 0, 'timeouts': 0, 'hedges': 0, 'hedge_wins': 0,
+                          'overloaded': 0, 'short_circuited': 0}
+    
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Threads running model calls that have a timeout or may be hedged (recreated after fork)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Without a slot limit, abandoned (timed out) calls could pile up without bound
+                workers = self.max_in_flight or 32
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='genai')
+                self._pid = os.getpid()
+            return self._executor
+    
+    def _acquire_slot(self, blocking: bool = True) -> bool:
+        if self._slots is None:
+            return True
+        return self._slots.acquire(timeout=self.queue_timeout) if blocking else self._slots.acquire(blocking=False)
+    
+    def _release_slot(self, *_):
+        if self._slots is not None:
+            self._slots.release()
+    
+    def _timed_call(self, prompt: str) -> str:
+        start = time.perf_counter()
+        with timed('genai'):
+            response = self.model_function(prompt)
+        self.latencies.add(time.perf_counter() - start)
+        return response
+    
+    def _submit(self, prompt: str, blocking: bool = True) -> Optional[Future]:
+        """Start a model call on the executor; its slot is released when the call really ends."""
+        if not self._acquire_slot(blocking):
+            if blocking:
+                self._count('overloaded')
+                raise OverloadedError(f"{self.max_in_flight} model calls already in flight")
+            return None
+        try:
+            future = self.executor.submit(bind_context(self._timed_call), prompt)
+        except Exception:
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_slot)
+        return future
+    
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_after == 'p95':
+            return self.latencies.percentile(95)
+        return self.hedge_after
+    
+    def _attempt(self, prompt: str, timeout: Optional[float]) -> str:
+        """One model call, bounded by timeout and possibly hedged."""
+        hedge_delay = self._hedge_delay()
+        if timeout is None and hedge_delay is None:
+            if not self._acquire_slot():
+                self._count('overloaded')
+                raise OverloadedError(f"{self.max_in_flight} model calls already in flight")
+            try:
+                return self._timed_call(prompt)
+            finally:
+                self._release_slot()
+        
+        expires = time.monotonic() + timeout if timeout is not None else None
+        primary = self._submit(prompt)
+        pending = {primary}
+        if hedge_delay is not None and (timeout is None or hedge_delay < timeout):
+            done, _ = wait(pending, timeout=hedge_delay)
+            if not done:
+                # Only hedge with a spare slot: hedges must not add to an overload
+                hedge = self._submit(prompt, blocking=False)
+                if hedge is not None:
+                    self._count('hedges')
+                    pending.add(hedge)
+        
+        error = None
+        while pending:
+            remaining = None if expires is None else max(expires - time.monotonic(), 0.0)
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                # The abandoned calls keep their slots until they return
+                self._count('timeouts')
+                raise DeadlineExceededError(f"Model call did not finish within {timeout:g}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        raise error
     
     def generate(self, prompt: str) -> str:
         """
@@ -25,18 +170,211 @@ class GenAIService:
         
         Args:
             prompt: The input prompt string
-            
+        
         Returns:
             Generated response string
-            
+        
         Raises:
+            CircuitOpenError: If the circuit breaker is open
+            OverloadedError: If no call slot became free within queue_timeout
+            DeadlineExceededError: If the call timed out and was not retried
             Exception: If model function fails
         """
+        logger.info(f"Generating response for prompt (length: {len(prompt)})")
+        self._count('calls')
+        expires = time.monotonic() + self.deadline if self.deadline is not None else None
+        attempt = 0
+        while True:
+            if not self.circuit_breaker.allow():
+                self._count('short_circuited')
+                raise CircuitOpenError("Model calls are failing; circuit breaker is open")
+            
+            timeout = self.timeout
+            if expires is not None:
+                remaining = expires - time.monotonic()
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            
+            try:
+                response = self._attempt(prompt, timeout)
+                self.circuit_breaker.record_success()
+                logger.info(f"Generated response: {response}")
+                return response
+            except OverloadedError:
+                self.circuit_breaker.release()
+                raise
+            except Exception as e:
+                self.circuit_breaker.record_error(e)
+                delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+                if (attempt >= self.max_retries or not is_transient_error(e)
+                        or (expires is not None and time.monotonic() + delay >= expires)):
+                    self._count('failures')
+                    logger.error(f"Failed to generate response: {e}")
+                    raise
+                
+                attempt += 1
+                self._count('retries')
+                logger.warning(f"Transient model error ({e}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def _produce_stream(self, prompt: str, chunks: queue.Queue, stop: threading.Event):
+        """Put the stream function's chunks on chunks, then _STREAM_END or the exception it raised."""
         try:
-            logger.info(f"Generating response for prompt (length: {len(prompt)})")
-            response = self.model_function(prompt)
-            logger.info(f"Generated response: {response}")
-            return response
+            for chunk in self.stream_function(prompt):
+                if stop.is_set():
+                    return
+                chunks.put(chunk)
+            chunks.put(_STREAM_END)
         except Exception as e:
-            logger.error(f"Failed to generate response: {e}")
+            chunks.put(e)
+        finally:
+            self._release_slot()
+    
+    def _read_stream(self, prompt: str) -> Iterator[str]:
+        """
+        The stream function's chunks, read on the executor so they can time out.
+        
+        Each chunk must arrive within timeout of the previous one (or of the start),
+        and the whole stream within deadline. The producer holds the call slot until
+        the stream function returns, like an abandoned generate() call.
+        """
+        chunks = queue.Queue()
+        stop = threading.Event()
+        try:
+            self.executor.submit(bind_context(self._produce_stream), prompt, chunks, stop)
+        except Exception:
+            self._release_slot()
             raise
+        
+        expires = time.monotonic() + self.deadline if self.deadline is not None else None
+        try:
+            while True:
+                wait_s = self.timeout
+                if expires is not None:
+                    remaining = max(expires - time.monotonic(), 0.0)
+                    wait_s = remaining if wait_s is None else min(wait_s, remaining)
+                try:
+                    item = chunks.get(timeout=wait_s)
+                except queue.Empty:
+                    self._count('timeouts')
+                    raise DeadlineExceededError(f"Response stream stalled for {wait_s:g}s")
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+    
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """
+        Generate a response in chunks using the injected stream function.
+        
+        Without a stream function, or if streaming fails before the first chunk,
+        the whole response from generate() is yielded as a single chunk. With a
+        timeout or deadline, a stream that stalls fails with DeadlineExceededError.
+        
+        Args:
+            prompt: The input prompt string
+        
+        Yields:
+            Response text chunks
+        
+        Raises:
+            DeadlineExceededError: If a chunk did not arrive in time
+            Exception: If the model fails, or streaming fails after the first chunk
+        """
+        if self.stream_function is None:
+            yield self.generate(prompt)
+            return
+        
+        if not self.circuit_breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpenError("Model calls are failing; circuit breaker is open")
+        if not self._acquire_slot():
+            self.circuit_breaker.release()
+            self._count('overloaded')
+            raise OverloadedError(f"{self.max_in_flight} model calls already in flight")
+        
+        logger.info(f"Streaming response for prompt (length: {len(prompt)})")
+        # With a timeout or deadline the stream is read on the executor, which then releases the slot
+        threaded = self.timeout is not None or self.deadline is not None
+        started = False
+        fallback = False
+        try:
+            with timed('genai_stream'):
+                for chunk in self._read_stream(prompt) if threaded else self.stream_function(prompt):
+                    if chunk:
+                        started = True
+                        yield chunk
+            self.circuit_breaker.record_success()
+        except GeneratorExit:
+            # The consumer went away (client disconnected); that says nothing about the upstream
+            self.circuit_breaker.release()
+            raise
+        except Exception as e:
+            if started or isinstance(e, DeadlineExceededError):
+                self.circuit_breaker.record_error(e)
+                self._count('failures')
+                logger.error(f"Response stream failed: {e}")
+                raise
+            # Streaming may simply be unsupported: let generate() decide whether the upstream is failing
+            self.circuit_breaker.release()
+            logger.warning(f"Streaming failed ({e}), generating without streaming")
+            fallback = True
+        finally:
+            if not threaded:
+                self._release_slot()
+        
+        if fallback:
+            yield self.generate(prompt)
+
+    def stats(self) -> dict:
+        """Return call counters, recent latency percentiles and the circuit breaker state."""
+        with self._lock:
+            counters = dict(self._counters)
+        p50, p95 = self.latencies.percentile(50), self.latencies.percentile(95)
+        counters.update({
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            'circuit': self.circuit_breaker.state,
+            'circuit_opens': self.circuit_breaker.opens
+        })
+        return counters
+
+
+def genai_settings() -> dict:
+    """
+    Resilience settings for GenAIService (and AsyncGenAIService) from environment variables.
+    
+    GENAI_TIMEOUT: seconds per attempt (default 30, 0 = no limit)
+    GENAI_DEADLINE: seconds per call including retries (default 60, 0 = no limit)
+    GENAI_MAX_RETRIES: retries on transient errors (default 2)
+    GENAI_RETRY_BASE_DELAY / GENAI_RETRY_MAX_DELAY: jittered backoff bounds in seconds (default 0.5 / 8)
+    GENAI_HEDGE_AFTER: seconds, 'p95', or empty to disable hedged requests (default empty)
+    GENAI_MAX_IN_FLIGHT: concurrent model calls (default 16)
+    GENAI_QUEUE_TIMEOUT: seconds to wait for a free call slot (default 1)
+    GENAI_BREAKER_THRESHOLD: consecutive failures that open the circuit (default 5, 0 = disabled)
+    GENAI_BREAKER_RESET: seconds before a probe call is let through (default 30)
+    """
+    hedge_after = os.getenv('GENAI_HEDGE_AFTER', '').lower() or None
+    if hedge_after not in (None, 'p95'):
+        hedge_after = float(hedge_after)
+    
+    return dict(
+        timeout=float(os.getenv('GENAI_TIMEOUT', '30')) or None,
+        deadline=float(os.getenv('GENAI_DEADLINE', '60')) or None,
+        max_retries=int(os.getenv('GENAI_MAX_RETRIES', '2')),
+        retry_base_delay=float(os.getenv('GENAI_RETRY_BASE_DELAY', '0.5')),
+        retry_max_delay=float(os.getenv('GENAI_RETRY_MAX_DELAY', '8')),
+        hedge_after=hedge_after,
+        max_in_flight=int(os.getenv('GENAI_MAX_IN_FLIGHT', '16')) or None,
+        queue_timeout=float(os.getenv('GENAI_QUEUE_TIMEOUT', '1')),
+        circuit_breaker=CircuitBreaker(failure_threshold=int(os.getenv('GENAI_BREAKER_THRESHOLD', '5')),
+                                       reset_timeout=float(os.getenv('GENAI_BREAKER_RESET', '30')))
+    )
+
+
+def create_genai_service(model_function: Callable[[str], str],
+                         stream_function: Optional[Callable[[str], Iterator[str]]] = None) -> GenAIService:
+    """Create the GenAI service with resilience settings from environment variables (see genai_settings)."""
+    return GenAIService(model_function, stream_function, **genai_settings())
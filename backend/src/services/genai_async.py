@@ -0,0 +1,318 @@
+"""
+Asyncio counterpart of GenAIService, for the async routes (see routes/api_async.py).
+
+A model call waiting on the network then holds a coroutine instead of a worker
+thread, so one process can keep hundreds of calls open at once. The same
+timeouts, deadline, retries, hedging, in-flight limit and circuit breaker
+apply; a timed-out or losing hedged call is cancelled rather than abandoned.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, Union
+
+from .genai import genai_settings
+from .resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceededError, LatencyWindow, OverloadedError,
+                         backoff_delay, is_transient_error)
+from utils.metrics import bind_context, timed
+
+logger = logging.getLogger(__name__)
+
+
+def to_async(function: Callable[[str], str]) -> Callable[[str], Awaitable[str]]:
+    """A coroutine function for function; blocking callables run in the loop's default executor."""
+    # Callable objects count by their __call__
+    if inspect.iscoroutinefunction(function) or inspect.iscoroutinefunction(getattr(function, '__call__', None)):
+        return function
+    
+    async def call(prompt: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(None, bind_context(function), prompt)
+    return call
+
+
+def to_async_stream(function: Callable[[str], Iterator[str]]) -> Callable[[str], AsyncIterator[str]]:
+    """An async generator function for function; blocking iterators are advanced in the default executor."""
+    if inspect.isasyncgenfunction(function) or inspect.isasyncgenfunction(getattr(function, '__call__', None)):
+        return function
+    
+    async def stream(prompt: str) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        chunks = await loop.run_in_executor(None, bind_context(lambda: iter(function(prompt))))
+        done = object()
+        while True:
+            chunk = await loop.run_in_executor(None, bind_context(next), chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+    return stream
+
+
+class AsyncGenAIService:
+    """
+    GenAI service whose calls are coroutines.
+    
+    Takes the same settings as GenAIService (see genai_settings) and can share
+    its circuit breaker, so both fail fast when the upstream is down.
+    """
+    
+    def __init__(self, model_function: Callable[[str], Awaitable[str]],
+                 stream_function: Optional[Callable[[str], AsyncIterator[str]]] = None,
+                 timeout: Optional[float] = None, deadline: Optional[float] = None,
+                 max_retries: int = 0, retry_base_delay: float = 0.5, retry_max_delay: float = 8.0,
+                 hedge_after: Union[float, str, None] = None, max_in_flight: Optional[int] = None,
+                 queue_timeout: float = 1.0, circuit_breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            model_function: Coroutine function taking a prompt and returning the response
+                (a blocking callable is run in the default executor)
+            stream_function: Optional async generator function taking a prompt and yielding chunks
+            timeout, deadline, max_retries, retry_base_delay, retry_max_delay, hedge_after,
+            max_in_flight, queue_timeout, circuit_breaker: As for GenAIService
+        """
+        self.model_function = to_async(model_function)
+        self.stream_function = to_async_stream(stream_function) if stream_function is not None else None
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge_after = hedge_after
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(failure_threshold=0)
+        self.latencies = LatencyWindow()
+        # asyncio.Semaphore binds to the loop it is first used in; the service is used from one loop per process
+        self._slots = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+        self._counters = {'calls': 0, 'failures': 0, 'retries': 0, 'timeouts': 0, 'hedges': 0, 'hedge_wins': 0,
+                          'overloaded': 0, 'short_circuited': 0, 'cancelled': 0}
+    
+    def _count(self, name: str):
+        # Only touched from the event loop thread
+        self._counters[name] += 1
+    
+    async def _acquire_slot(self, blocking: bool = True) -> bool:
+        if self._slots is None:
+            return True
+        if not self._slots.locked():
+            # A free slot is taken without suspending (wait_for would not even start the acquire with a 0s timeout)
+            await self._slots.acquire()
+            return True
+        if not blocking:
+            return False
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    def _release_slot(self, *_):
+        if self._slots is not None:
+            self._slots.release()
+    
+    async def _timed_call(self, prompt: str) -> str:
+        start = time.perf_counter()
+        with timed('genai'):
+            response = await self.model_function(prompt)
+        self.latencies.add(time.perf_counter() - start)
+        return response
+    
+    def _start(self, prompt: str) -> asyncio.Task:
+        """Start a model call in a task; its slot (acquired by the caller) is released when the task ends."""
+        task = asyncio.ensure_future(self._timed_call(prompt))
+        task.add_done_callback(self._release_slot)
+        return task
+    
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_after == 'p95':
+            return self.latencies.percentile(95)
+        return self.hedge_after
+    
+    async def _attempt(self, prompt: str, timeout: Optional[float]) -> str:
+        """One model call, bounded by timeout and possibly hedged."""
+        if not await self._acquire_slot():
+            self._count('overloaded')
+            raise OverloadedError(f"{self.max_in_flight} model calls already in flight")
+        
+        expires = time.monotonic() + timeout if timeout is not None else None
+        primary = self._start(prompt)
+        pending = {primary}
+        try:
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None and (timeout is None or hedge_delay < timeout):
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                # Only hedge with a spare slot: hedges must not add to an overload
+                if not done and await self._acquire_slot(blocking=False):
+                    self._count('hedges')
+                    pending.add(self._start(prompt))
+            
+            error = None
+            while pending:
+                remaining = None if expires is None else max(expires - time.monotonic(), 0.0)
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._count('timeouts')
+                    raise DeadlineExceededError(f"Model call did not finish within {timeout:g}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count('hedge_wins')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Timed-out calls and the losing hedge are cancelled, which frees their slots
+            for task in pending:
+                task.cancel()
+    
+    async def generate(self, prompt: str) -> str:
+        """
+        Generate a response; see GenAIService.generate.
+        
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            OverloadedError: If no call slot became free within queue_timeout
+            DeadlineExceededError: If the call timed out and was not retried
+            Exception: If model function fails
+        """
+        logger.info(f"Generating response for prompt (length: {len(prompt)})")
+        self._count('calls')
+        expires = time.monotonic() + self.deadline if self.deadline is not None else None
+        attempt = 0
+        while True:
+            if not self.circuit_breaker.allow():
+                self._count('short_circuited')
+                raise CircuitOpenError("Model calls are failing; circuit breaker is open")
+            
+            timeout = self.timeout
+            if expires is not None:
+                remaining = expires - time.monotonic()
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            
+            try:
+                response = await self._attempt(prompt, timeout)
+                self.circuit_breaker.record_success()
+                logger.info(f"Generated response: {response}")
+                return response
+            except OverloadedError:
+                self.circuit_breaker.release()
+                raise
+            except asyncio.CancelledError:
+                # The client went away; that says nothing about the upstream
+                self.circuit_breaker.release()
+                self._count('cancelled')
+                raise
+            except Exception as e:
+                self.circuit_breaker.record_error(e)
+                delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+                if (attempt >= self.max_retries or not is_transient_error(e)
+                        or (expires is not None and time.monotonic() + delay >= expires)):
+                    self._count('failures')
+                    logger.error(f"Failed to generate response: {e}")
+                    raise
+                
+                attempt += 1
+                self._count('retries')
+                logger.warning(f"Transient model error ({e}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+    
+    async def _read_stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        The stream function's chunks, each within timeout of the previous one (or
+        of the start) and the whole stream within deadline; a stalled stream is closed.
+        """
+        chunks = self.stream_function(prompt).__aiter__()
+        expires = time.monotonic() + self.deadline if self.deadline is not None else None
+        try:
+            while True:
+                wait_s = self.timeout
+                if expires is not None:
+                    remaining = max(expires - time.monotonic(), 0.0)
+                    wait_s = remaining if wait_s is None else min(wait_s, remaining)
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), wait_s)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self._count('timeouts')
+                    raise DeadlineExceededError(f"Response stream stalled for {wait_s:g}s")
+                yield chunk
+        finally:
+            if hasattr(chunks, 'aclose'):
+                await chunks.aclose()
+    
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Generate a response in chunks; see GenAIService.generate_stream.
+        
+        Without a stream function, or if streaming fails before the first chunk,
+        the whole response from generate() is yielded as a single chunk. With a
+        timeout or deadline, a stream that stalls fails with DeadlineExceededError.
+        """
+        if self.stream_function is None:
+            yield await self.generate(prompt)
+            return
+        
+        if not self.circuit_breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpenError("Model calls are failing; circuit breaker is open")
+        if not await self._acquire_slot():
+            self.circuit_breaker.release()
+            self._count('overloaded')
+            raise OverloadedError(f"{self.max_in_flight} model calls already in flight")
+        
+        logger.info(f"Streaming response for prompt (length: {len(prompt)})")
+        started = False
+        fallback = False
+        try:
+            with timed('genai_stream'):
+                async for chunk in self._read_stream(prompt):
+                    if chunk:
+                        started = True
+                        yield chunk
+            self.circuit_breaker.record_success()
+        except (asyncio.CancelledError, GeneratorExit):
+            self.circuit_breaker.release()
+            raise
+        except Exception as e:
+            if started or isinstance(e, DeadlineExceededError):
+                self.circuit_breaker.record_error(e)
+                self._count('failures')
+                logger.error(f"Response stream failed: {e}")
+                raise
+            # Streaming may simply be unsupported: let generate() decide whether the upstream is failing
+            self.circuit_breaker.release()
+            logger.warning(f"Streaming failed ({e}), generating without streaming")
+            fallback = True
+        finally:
+            self._release_slot()
+        
+        if fallback:
+            yield await self.generate(prompt)
+    
+    def stats(self) -> dict:
+        """Return call counters, recent latency percentiles and the circuit breaker state."""
+        counters = dict(self._counters)
+        p50, p95 = self.latencies.percentile(50), self.latencies.percentile(95)
+        counters.update({
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            'circuit': self.circuit_breaker.state,
+            'circuit_opens': self.circuit_breaker.opens
+        })
+        return counters
+
+
+def create_async_genai_service(model_function: Callable[[str], Awaitable[str]],
+                               stream_function: Optional[Callable[[str], AsyncIterator[str]]] = None,
+                               circuit_breaker: Optional[CircuitBreaker] = None) -> AsyncGenAIService:
+    """
+    Create the async GenAI service with resilience settings from environment variables (see genai_settings).
+    
+    Args:
+        circuit_breaker: Breaker to share with the sync GenAIService, instead of a new one
+    """
+    settings = genai_settings()
+    if circuit_breaker is not None:
+        settings['circuit_breaker'] = circuit_breaker
+    return AsyncGenAIService(model_function, stream_function, **settings)
@@ -0,0 +1,214 @@
+"""
+FAISS index construction and tuning shared by the data pipeline and the search service.
+"""
+import logging
+import math
+import time
+from typing import Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# flat: exact search; hnsw: graph, no training; ivf: clustered lists; ivfpq: clustered and product-quantized
+INDEX_TYPES = ('flat', 'hnsw', 'ivf', 'ivfpq')
+
+# Storage of the vectors inside the index: float32, float16 / int8 scalar quantization, or sign bits (Hamming)
+QUANTIZATIONS = ('none', 'fp16', 'int8', 'binary')
+
+# Map prebuilt index files instead of copying them onto the heap. IO_FLAG_MMAP_IFC
+# (faiss >= 1.10, pinned in backend/requirements.txt) maps flat codes zero-copy;
+# older releases fall back to IO_FLAG_MMAP, which only maps IVF lists.
+INDEX_MMAP_FLAGS = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+SCALAR_QUANTIZERS = {
+    'fp16': faiss.ScalarQuantizer.QT_fp16,
+    'int8': faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def default_nlist(num_vectors: int) -> int:
+    """Number of IVF lists: about 4*sqrt(n), but keep ~39 training points per centroid."""
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def binarize(embeddings: np.ndarray) -> np.ndarray:
+    """Pack the sign bits of embeddings into uint8 codes for binary (Hamming) indexes."""
+    return np.packbits(embeddings > 0, axis=1)
+
+
+def is_binary_index(index) -> bool:
+    """Whether index is a binary (Hamming) index."""
+    return isinstance(index, faiss.IndexBinary)
+
+
+def build_index(embeddings: np.ndarray, index_type: str = 'flat', hnsw_m: int = 32, ef_construction: int = 200,
+                nlist: Optional[int] = None, pq_m: int = 64, pq_bits: int = 8, quantization: str = 'none'):
+    """
+    Build (and train, if needed) an inner-product index over normalized embeddings.
+    
+    Args:
+        embeddings: float32 array of shape (n, dim)
+        index_type: One of INDEX_TYPES
+        hnsw_m: HNSW graph degree
+        ef_construction: HNSW build-time search depth
+        nlist: IVF list count, defaults to default_nlist(n)
+        pq_m: IVF-PQ sub-quantizers (must divide dim)
+        pq_bits: Bits per IVF-PQ sub-quantizer code
+        quantization: One of QUANTIZATIONS (IVF-PQ is already compressed and only supports 'none')
+    
+    Returns:
+        FAISS index containing all embeddings
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATIONS}")
+    if index_type == 'ivfpq' and quantization != 'none':
+        raise ValueError("IVF-PQ is already product-quantized; use quantization 'none'")
+    if quantization == 'binary' and index_type not in ('flat', 'hnsw'):
+        raise ValueError("Binary quantization supports the flat and hnsw index types")
+    
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    dim = embeddings.shape[1]
+    nlist = nlist or default_nlist(len(embeddings))
+    
+    if quantization == 'binary':
+        index = faiss.IndexBinaryFlat(dim) if index_type == 'flat' else faiss.IndexBinaryHNSW(dim, hnsw_m)
+        if index_type == 'hnsw':
+            index.hnsw.efConstruction = ef_construction
+        index.add(binarize(embeddings))
+        return index
+    
+    sq = SCALAR_QUANTIZERS.get(quantization)
+    if index_type == 'flat':
+        index = faiss.IndexFlatIP(dim) if sq is None else faiss.IndexScalarQuantizer(dim, sq, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == 'hnsw':
+        if sq is None:
+            index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWSQ(dim, sq, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+    elif index_type == 'ivf':
+        storage = {'none': 'Flat', 'fp16': 'SQfp16', 'int8': 'SQ8'}[quantization]
+        index = faiss.index_factory(dim, f"IVF{nlist},{storage}", faiss.METRIC_INNER_PRODUCT)
+    else:
+        if dim % pq_m:
+            raise ValueError(f"pq_m ({pq_m}) must divide the embedding dimension ({dim})")
+        index = faiss.index_factory(dim, f"IVF{nlist},PQ{pq_m}x{pq_bits}", faiss.METRIC_INNER_PRODUCT)
+    
+    if not index.is_trained:
+        start = time.perf_counter()
+        index.train(embeddings)
+        logger.info(f"Trained {index_type} index in {time.perf_counter() - start:.2f}s")
+    index.add(embeddings)
+    return index
+
+
+def load_index(index_path: str, mmap: bool = True):
+    """
+    Load a prebuilt FAISS index from disk.
+    
+    Args:
+        index_path: Path written by data/build_index.py or data/build_multilingual_index.py
+        mmap: Map the file read-only so worker processes share the page cache
+    
+    Returns:
+        FAISS index
+    """
+    flags = INDEX_MMAP_FLAGS if mmap else 0
+    try:
+        return faiss.read_index(index_path, flags)
+    except RuntimeError:
+        # Binary (Hamming) indexes use a separate reader
+        return faiss.read_index_binary(index_path, flags)
+
+
+def set_search_params(index, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+    """
+    Apply query-time tuning parameters; parameters that don't apply to the index type are ignored.
+    
+    Args:
+        index: FAISS index
+        ef_search: HNSW search depth (higher = better recall, slower)
+        nprobe: IVF lists visited per query (higher = better recall, slower)
+    """
+    if is_binary_index(index):
+        if ef_search and hasattr(index, 'hnsw'):
+            index.hnsw.efSearch = ef_search
+        return
+    
+    params = faiss.ParameterSpace()
+    for name, value in (('efSearch', ef_search), ('nprobe', nprobe)):
+        if value:
+            try:
+                params.set_index_parameter(index, name, value)
+            except RuntimeError:
+                logger.debug(f"Index {type(index).__name__} has no parameter {name}")
+
+
+def describe_index(index) -> str:
+    """Short name of the index type (e.g. 'IndexHNSWFlat')."""
+    if is_binary_index(index):
+        return type(faiss.downcast_IndexBinary(index)).__name__
+    return type(faiss.downcast_index(index)).__name__
+
+
+def search_index(index, queries: np.ndarray, k: int):
+    """
+    Search float or binary indexes with float query embeddings.
+    
+    Binary indexes return Hamming distances; they are mapped to an approximate
+    cosine similarity (cos(pi * h / bits)) so scores stay comparable.
+    
+    Returns:
+        (scores, ids) arrays of shape (len(queries), k)
+    """
+    if is_binary_index(index):
+        distances, ids = index.search(binarize(queries), k)
+        return np.cos(np.pi * distances / index.d).astype(np.float32), ids
+    return index.search(queries, k)
+
+
+def rescore(queries: np.ndarray, candidate_ids: np.ndarray, vectors: np.ndarray, k: int):
+    """
+    Re-rank candidates from a quantized index by exact inner product.
+    
+    Args:
+        queries: float32 query embeddings
+        candidate_ids: Overfetched ids per query (-1 for padding)
+        vectors: Full-precision embeddings; a read-only memmap keeps only the touched rows resident
+        k: Results to keep per query
+        
+    Returns:
+        (scores, ids) arrays of shape (len(queries), k), padded with -1 ids
+    """
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    for row, (query, candidates) in enumerate(zip(queries, candidate_ids)):
+        # Sorted ids read the memmap sequentially
+        candidates = np.sort(candidates[candidates >= 0])
+        exact = np.asarray(vectors[candidates], dtype=np.float32) @ query
+        top = np.argsort(-exact)[:k]
+        scores[row, :len(top)] = exact[top]
+        ids[row, :len(top)] = candidates[top]
+    return scores, ids
+
+
+def recall_at_k(exact_index, queries: np.ndarray, found: np.ndarray) -> float:
+    """
+    Fraction of the exact top-k neighbours that a search also returned.
+    
+    Args:
+        exact_index: Flat index over the searched vectors
+        queries: float32 array of query embeddings
+        found: (len(queries), k) ids returned for the queries, e.g. by search_index or rescore
+    
+    Returns:
+        Mean recall@k over all queries
+    """
+    k = found.shape[1]
+    _, expected = exact_index.search(queries, k)
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected, found))
+    return hits / (len(queries) * k)
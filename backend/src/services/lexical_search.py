@@ -0,0 +1,209 @@
+"""
+BM25 inverted index over the verse text, for exact phrases, Arabic queries and hybrid ranking.
+"""
+import logging
+import re
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Diacritics (harakat), Quranic annotation marks, tatweel and BOM
+ARABIC_MARKS = re.compile('[ؐ-ًؚ-ٟۖ-ۭـ﻿]')
+# Quranic spelling writes some long vowels as a superscript alef: modern spelling drops it
+# in some words (ٱلرَّحْمَٰنِ -> الرحمن) and writes a full alef in others (ٱلْعَٰلَمِينَ -> العالمين)
+SUPERSCRIPT_ALEF = 'ٰ'
+ARABIC_LETTER_MAP = str.maketrans({
+    'آ': 'ا',  # alef with madda -> alef
+    'أ': 'ا',  # alef with hamza above -> alef
+    'إ': 'ا',  # alef with hamza below -> alef
+    'ٱ': 'ا',  # alef wasla -> alef
+    'ى': 'ي',  # alef maksura -> yeh
+    'ة': 'ه',  # teh marbuta -> heh
+})
+TOKEN_PATTERN = re.compile(r'\w+')
+ARABIC_LETTERS = re.compile('[ء-ي]')
+# A query wrapped in straight or curly double quotes is an exact-phrase query
+PHRASE_PATTERN = re.compile(r'^\s*["“”](.+?)["“”]\s*$')
+
+# Verse fields that are indexed
+LEXICAL_FIELDS = ('verse_en', 'verse_ar')
+
+
+def normalize_arabic(text: str, superscript_alef: str = '') -> str:
+    """
+    Strip diacritics, Quranic marks and tatweel, and unify alef / yeh / teh marbuta forms.
+    
+    Args:
+        text: Text to normalize (non-Arabic characters are kept)
+        superscript_alef: Replacement for the superscript alef ('' drops it, 'ا' writes it out)
+    """
+    text = ARABIC_MARKS.sub('', text).replace(SUPERSCRIPT_ALEF, superscript_alef)
+    return text.translate(ARABIC_LETTER_MAP)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens of English or Arabic text (Arabic normalized with normalize_arabic)."""
+    return TOKEN_PATTERN.findall(normalize_arabic(text).lower())
+
+
+def document_tokens(text: str) -> List[Tuple[str, ...]]:
+    """
+    Token variants per word position of an indexed text.
+    
+    Words spelled with a superscript alef get both modern spellings, so either
+    one matches; all other words have a single variant.
+    """
+    tokens = tokenize(text)
+    if SUPERSCRIPT_ALEF not in text:
+        return [(token,) for token in tokens]
+    written = TOKEN_PATTERN.findall(normalize_arabic(text, 'ا').lower())
+    return [(dropped,) if dropped == kept else (dropped, kept) for dropped, kept in zip(tokens, written)]
+
+
+def parse_phrase(query: str) -> Optional[str]:
+    """The quoted phrase of an exact-phrase query ('"lord of the worlds"'), None for other queries."""
+    match = PHRASE_PATTERN.match(query)
+    return match.group(1) if match else None
+
+
+def _contains(text: str, phrase: List[str], pattern: re.Pattern) -> bool:
+    """Whether phrase occurs as consecutive words of text (pattern is phrase_pattern(phrase))."""
+    if SUPERSCRIPT_ALEF not in text:
+        # A single spelling per word: one regex scan over the normalized text
+        return pattern.search(normalize_arabic(text).lower()) is not None
+    positions = document_tokens(text)
+    first, rest = phrase[0], phrase[1:]
+    for i in range(len(positions) - len(rest)):
+        if first in positions[i] and all(term in positions[i + 1 + j] for j, term in enumerate(rest)):
+            return True
+    return False
+
+
+def phrase_pattern(phrase: List[str]) -> re.Pattern:
+    """Regex matching the phrase tokens as whole, consecutive words."""
+    return re.compile(r'\b' + r'\W+'.join(re.escape(term) for term in phrase) + r'\b')
+
+
+class LexicalIndex:
+    """
+    BM25 index with one document per verse (English and normalized Arabic text).
+    
+    Each term's postings store the verse rows and their precomputed BM25 term
+    weights, so a query is a few numpy additions and a top-k selection.
+    """
+    
+    def __init__(self, verses, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            verses: Verse rows (a VerseStore or list of dicts)
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        start = time.perf_counter()
+        self.verses = verses
+        self.num_documents = len(verses)
+        
+        term_counts = {}
+        lengths = np.zeros(self.num_documents, dtype=np.float32)
+        for row in range(self.num_documents):
+            verse = verses[row]
+            positions = [variants for field in LEXICAL_FIELDS for variants in document_tokens(verse.get(field) or '')]
+            lengths[row] = len(positions)
+            for variants in positions:
+                for token in variants:
+                    counts = term_counts.setdefault(token, {})
+                    counts[row] = counts.get(row, 0) + 1
+        
+        length_norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()), 1.0))
+        self.postings = {}
+        for term, counts in term_counts.items():
+            rows = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            idf = np.log(1 + (self.num_documents - len(rows) + 0.5) / (len(rows) + 0.5))
+            self.postings[term] = (rows, (idf * tf * (k1 + 1) / (tf + length_norm[rows])).astype(np.float32))
+        
+        logger.info(f"Built lexical index: {len(self.postings)} terms over {self.num_documents} verses "
+                    f"in {time.perf_counter() - start:.2f}s")
+    
+    def _scores(self, terms: List[str]) -> np.ndarray:
+        """BM25 score of every verse for the query terms."""
+        scores = np.zeros(self.num_documents, dtype=np.float32)
+        for term in set(terms):
+            if term in self.postings:
+                rows, weights = self.postings[term]
+                scores[rows] += weights
+        return scores
+    
+    def search(self, query: str, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rank verses by BM25.
+        
+        Args:
+            query: Query text
+            k: Number of results
+        
+        Returns:
+            (scores, rows) of the best matching verses, best first (only verses with a positive score)
+        """
+        scores = self._scores(tokenize(query))
+        k = min(k, self.num_documents)
+        top = np.argpartition(-scores, k - 1)[:k] if k < self.num_documents else np.arange(self.num_documents)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[scores[top] > 0]
+        return scores[top], top
+    
+    def search_phrase(self, phrase: str, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find verses containing phrase as consecutive words (in either language), ranked by BM25.
+        
+        Candidates are the verses containing every phrase term; they are checked in
+        score order and only until k matches are found. Arabic phrases are only
+        checked against verse_ar, other phrases against verse_en.
+        
+        Returns:
+            (scores, rows) of matching verses, best first
+        """
+        terms = tokenize(phrase)
+        if not terms or any(term not in self.postings for term in terms):
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        
+        candidates = self.postings[terms[0]][0]
+        for term in terms[1:]:
+            candidates = np.intersect1d(candidates, self.postings[term][0], assume_unique=True)
+        scores = self._scores(terms)[candidates]
+        order = np.argsort(-scores, kind='stable')
+        
+        field = 'verse_ar' if ARABIC_LETTERS.search(phrase) else 'verse_en'
+        pattern = phrase_pattern(terms)
+        matches = []
+        for position in order:
+            verse = self.verses[int(candidates[position])]
+            if _contains(verse.get(field) or '', terms, pattern):
+                matches.append(position)
+                if len(matches) == k:
+                    break
+        return scores[matches], candidates[matches].astype(np.int64)
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse several rankings of verse rows with reciprocal-rank fusion (sum of 1 / (rrf_k + rank)).
+    
+    Args:
+        rankings: Row ids per ranking, best first (-1 padding is ignored)
+        k: Number of fused results
+        rrf_k: Rank offset; larger values flatten the contribution of top ranks
+    
+    Returns:
+        (fused scores, rows), best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(int(row) for row in ranking if row >= 0):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return (np.array([score for _, score in best], dtype=np.float32),
+            np.array([row for row, _ in best], dtype=np.int64))
@@ -0,0 +1,173 @@
+"""
+Cross-lingual verse index, so non-English queries are searched without translating them first.
+
+data/build_multilingual_index.py embeds several text fields of every verse
+(verse_en and verse_ar by default) with a multilingual encoder into one
+matrix: the vector of verse i in field f is row f * verses + i. A query in
+Arabic, French, Spanish or English lands near the verse in whichever field
+matches it best, and the hits of the fields are merged per verse.
+"""
+import json
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .embedding_cache import EmbeddingCache, create_embedding_cache, encode_cached
+from .encoders import QueryEncoder, SentenceTransformerEncoder
+from .index_factory import load_index, search_index
+from .lexical_search import ARABIC_MARKS, SUPERSCRIPT_ALEF
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+MULTILINGUAL_MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
+MULTILINGUAL_FIELDS = ('verse_en', 'verse_ar')
+
+
+def manifest_path(embeddings_path: str) -> str:
+    """Sidecar JSON naming the model and fields of a multilingual embeddings file."""
+    return os.path.splitext(embeddings_path)[0] + '.json'
+
+
+def index_path(embeddings_path: str) -> str:
+    """Sidecar flat FAISS index over a multilingual embeddings file, mapped from disk at load."""
+    return os.path.splitext(embeddings_path)[0] + '.index'
+
+
+def prepare_text(text: str) -> str:
+    """
+    Strip Arabic diacritics and Quranic marks before encoding.
+    
+    Verses are fully vowelled but queries almost never are; unvowelled text
+    tokenizes the same way on both sides. Other scripts pass through unchanged.
+    """
+    return ARABIC_MARKS.sub('', text).replace(SUPERSCRIPT_ALEF, '')
+
+
+class MultilingualIndex:
+    """Flat inner-product index over the multilingual verse embeddings."""
+    
+    def __init__(self, embeddings_path: str, encoder: Optional[QueryEncoder] = None,
+                 embedding_cache: Optional[EmbeddingCache] = None):
+        """
+        Args:
+            embeddings_path: Embeddings written by data/build_multilingual_index.py; the index
+                file next to them is mapped read-only, so worker processes share its pages
+            encoder: Query encoder, defaults to the model named in the manifest
+            embedding_cache: Optional cache of this encoder's query embeddings
+        """
+        with open(manifest_path(embeddings_path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.embeddings_path = embeddings_path
+        self.model_name = manifest['model']
+        self.fields = tuple(manifest['fields'])
+        self.verses = manifest['verses']
+        self.encoder = encoder or SentenceTransformerEncoder(self.model_name)
+        self.embedding_cache = embedding_cache
+        self.searches = 0
+        
+        if os.path.exists(index_path(embeddings_path)):
+            self.index = load_index(index_path(embeddings_path))
+        else:
+            # Older builds have no index file: every worker then holds its own copy of the vectors
+            logger.warning(f"Index file {index_path(embeddings_path)} not found, rebuilding from {embeddings_path}")
+            embeddings = np.load(embeddings_path)
+            self.index = faiss.IndexFlatIP(embeddings.shape[1])
+            self.index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+        if self.index.ntotal != self.verses * len(self.fields):
+            raise ValueError(f"{embeddings_path} has {self.index.ntotal} vectors, expected "
+                             f"{self.verses} verses x {len(self.fields)} fields")
+        logger.info(f"Loaded multilingual index from {embeddings_path} "
+                    f"({self.verses} verses x {', '.join(self.fields)}, {self.model_name})")
+    
+    def load_model(self) -> QueryEncoder:
+        return self.encoder.load()
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Encode queries with the multilingual encoder, reusing cached embeddings."""
+        return encode_cached(self.encoder, self.embedding_cache, [prepare_text(query) for query in queries])
+    
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search every field and keep each verse's best match.
+        
+        Returns:
+            (scores, verse rows), best first, at most k of each
+        """
+        self.searches += 1
+        query_embs = self.encode_queries([query])
+        with timed('faiss'):
+            # A verse can match in every field, so k * fields hits hold at least k distinct verses
+            D, I = search_index(self.index, query_embs, k * len(self.fields))
+        
+        scores, rows, seen = [], [], set()
+        for score, idx in zip(D[0], I[0]):
+            if idx < 0:
+                continue
+            row = int(idx) % self.verses
+            if row not in seen:
+                seen.add(row)
+                scores.append(score)
+                rows.append(row)
+                if len(rows) == k:
+                    break
+        return np.asarray(scores, dtype=np.float32), np.asarray(rows, dtype=np.int64)
+    
+    def stats(self) -> dict:
+        return {
+            'model': self.model_name,
+            'fields': list(self.fields),
+            'vectors': self.index.ntotal,
+            'encoder_loaded': self.encoder.loaded,
+            'searches': self.searches,
+            'embedding_cache': self.embedding_cache.stats() if self.embedding_cache is not None else None,
+        }
+
+
+def create_multilingual_index(verses: int, path: Optional[str] = None,
+                              previous: Optional[MultilingualIndex] = None) -> Optional[MultilingualIndex]:
+    """
+    Create the cross-lingual index from environment variables.
+    
+    MULTILINGUAL_EMBEDDINGS_PATH: embeddings written by data/build_multilingual_index.py
+        (default: data/quran_embeddings_multilingual.npy), with their .json manifest and .index file;
+        the index is off when the embeddings are missing
+    MULTILINGUAL_INDEX: 'false' to disable it even when the file exists
+    ENCODER_THREADS: intra-op threads of its encoder, 0 for the library default
+    
+    Args:
+        verses: Verse count of the search service; an index built for another verse set is not used
+        path: Embeddings to load instead of MULTILINGUAL_EMBEDDINGS_PATH (e.g. from a data bundle)
+        previous: Index being replaced; its encoder and embedding cache are reused when the model matches
+    
+    Returns:
+        MultilingualIndex, or None when disabled or unavailable
+    """
+    if os.getenv('MULTILINGUAL_INDEX', 'true').lower() != 'true':
+        return None
+    default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))),
+                                'data', 'quran_embeddings_multilingual.npy')
+    path = path or os.getenv('MULTILINGUAL_EMBEDDINGS_PATH', default_path)
+    if not os.path.exists(path):
+        return None
+    
+    try:
+        with open(manifest_path(path), 'r', encoding='utf-8') as f:
+            model_name = json.load(f)['model']
+        if previous is not None and previous.model_name == model_name:
+            encoder, embedding_cache = previous.encoder, previous.embedding_cache
+        else:
+            encoder = SentenceTransformerEncoder(model_name, int(os.getenv('ENCODER_THREADS', '0')) or None)
+            # The multilingual encoder is cased: "Paix" and "paix" are encoded differently
+            embedding_cache = create_embedding_cache(encoder.name, case_sensitive=True)
+        index = MultilingualIndex(path, encoder, embedding_cache)
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"Multilingual index unavailable ({e}), non-English queries use the English index")
+        return None
+    if index.verses != verses:
+        logger.warning(f"Multilingual index has {index.verses} verses, the verse store {verses}; not using it")
+        return None
+    return index
@@ -0,0 +1,178 @@
+"""
+Building blocks for calling a flaky upstream model: a circuit breaker, a
+latency window for hedging delays, retry backoff and error classification.
+"""
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional
+
+
+class UnavailableError(Exception):
+    """The upstream model was not called or did not answer in time."""
+
+
+class CircuitOpenError(UnavailableError):
+    """The circuit breaker is open after repeated failures; calls fail fast until it resets."""
+
+
+class OverloadedError(UnavailableError):
+    """Too many calls are already in flight."""
+
+
+class DeadlineExceededError(UnavailableError, TimeoutError):
+    """The call did not finish within its deadline."""
+
+
+# HTTP statuses worth retrying: request timeout, rate limited and server-side errors
+TRANSIENT_STATUS_CODES = frozenset((408, 429, 500, 502, 503, 504))
+
+# Fallback for errors without a status code: a transient status as a whole number, or a transient phrase
+TRANSIENT_MESSAGE = re.compile(
+    r"\b(?:408|429|50[0234])\b|timeout|timed out|deadline|unavailable|resource.exhausted|rate limit|overloaded"
+    r"|temporarily|connection (?:reset|refused|aborted|closed)")
+
+
+def _error_chain(error: BaseException) -> Iterator[BaseException]:
+    """error, then the errors it was raised from."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of an upstream error: google.api_core errors carry it as code, HTTP clients as status_code."""
+    for attribute in ('code', 'status_code'):
+        code = getattr(error, attribute, None)
+        if isinstance(code, int) and not isinstance(code, bool):
+            return code
+    return None
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Whether a failed call may succeed when retried (timeouts, rate limits, 5xx, connection errors).
+    
+    Decided by the exception type or HTTP status of the error or of an error it
+    was raised from (the Gemini wrapper raises from the google.api_core error);
+    only errors with neither fall back to matching the message.
+    """
+    for cause in _error_chain(error):
+        if isinstance(cause, (TimeoutError, ConnectionError)):
+            return True
+        code = _status_code(cause)
+        if code is not None:
+            return code in TRANSIENT_STATUS_CODES
+    return TRANSIENT_MESSAGE.search(str(error).lower()) is not None
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    
+    closed: calls go through. After failure_threshold consecutive failures it
+    opens and calls fail fast. After reset_timeout seconds it is half-open and
+    lets one probe call through: success closes it, failure opens it again.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit (0 disables the breaker)
+            reset_timeout: Seconds the circuit stays open before a probe call is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opens = 0
+    
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half_open'."""
+        with self._lock:
+            return self._state(time.monotonic())
+    
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'half_open' if now - self._opened_at >= self.reset_timeout else 'open'
+    
+    def allow(self) -> bool:
+        """Whether a call may go through now; in half-open state only one probe at a time is allowed."""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+    
+    def release(self):
+        """Give back a half-open probe that was allowed but never reached the upstream."""
+        with self._lock:
+            self._probing = False
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+    
+    def record_error(self, error: Exception):
+        """
+        Record a failed call by its cause.
+        
+        Only transient errors count as failures. A blocked prompt or an invalid
+        request shows the upstream is answering, so it just gives back the probe.
+        """
+        if is_transient_error(error):
+            self.record_failure()
+        else:
+            self.release()
+    
+    def record_failure(self):
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    self.opens += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful calls, for percentile-based hedging delays."""
+    
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+    
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        """q-th percentile (0-100) in seconds, None until min_samples calls were recorded."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
@@ -0,0 +1,281 @@
+"""
+Semantic response cache for the therapy pipeline.
+
+Issues are matched by embedding similarity rather than exact text, so a
+paraphrase of an earlier issue ("I feel anxious about my future" / "I'm
+worried about what the future holds") reuses its AI response and verses
+instead of making new GenAI calls. Only the embedding and the response are
+kept; the user's issue text is never stored or written to a snapshot.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, every process saves
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache:
+    """Thread-safe, bounded cache keyed by normalized embeddings, with LRU eviction, TTL and snapshots."""
+    
+    def __init__(self, threshold: float = 0.92, max_size: int = 1000, ttl: Optional[float] = None,
+                 snapshot_path: Optional[str] = None, namespace: str = '', save_every: int = 20):
+        """
+        Initialize the cache.
+        
+        Args:
+            threshold: Minimum cosine similarity for an issue to reuse a cached response
+            max_size: Maximum number of entries before the least recently used one is evicted
+            ttl: Seconds an entry stays valid, None for no expiry
+            snapshot_path: .npz file the cache is loaded from and saved to, None to keep it in memory
+            namespace: Encoder name; snapshots from another encoder are ignored
+            save_every: Save the snapshot after this many new entries
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.namespace = namespace
+        self.save_every = save_every
+        self._vectors = None  # (max_size, dim) float32; free slots are zero vectors
+        self._entries = [None] * max_size
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        # Lock file held by the one process that saves the snapshot, and that process's pid
+        self._owner_file = None
+        self._owner_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load(snapshot_path)
+    
+    def _expired(self, entry: dict, now: float) -> bool:
+        return self.ttl is not None and entry['created'] + self.ttl < now
+    
+    def _free(self, slot: int):
+        self._entries[slot] = None
+        self._vectors[slot] = 0
+    
+    def _best_match(self, embedding: np.ndarray):
+        """Slot and similarity of the closest entry, (None, 0.0) when empty."""
+        if self._vectors is None:
+            return None, 0.0
+        similarities = self._vectors @ embedding
+        slot = int(np.argmax(similarities))
+        if self._entries[slot] is None:
+            return None, 0.0
+        return slot, float(similarities[slot])
+    
+    def get(self, embedding: np.ndarray) -> Optional[Any]:
+        """
+        Return the cached value of the most similar issue above the threshold.
+        
+        Args:
+            embedding: Normalized embedding of the incoming issue
+        
+        Returns:
+            Cached value, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            slot, similarity = self._best_match(embedding)
+            if slot is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            
+            entry = self._entries[slot]
+            if self._expired(entry, now):
+                self._free(slot)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            entry['last_used'] = now
+            self.hits += 1
+            return entry['value']
+    
+    def put(self, embedding: np.ndarray, value: Any):
+        """
+        Cache value for an issue; an entry that is already above the threshold is replaced.
+        
+        Args:
+            embedding: Normalized embedding of the issue
+            value: JSON-serializable value to return for similar issues
+        """
+        if self.max_size <= 0:
+            return
+        
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(embedding)), dtype=np.float32)
+            
+            slot, similarity = self._best_match(embedding)
+            if slot is None or similarity < self.threshold:
+                slot = self._free_slot(now)
+            
+            self._vectors[slot] = embedding
+            self._entries[slot] = {'value': value, 'created': now, 'last_used': now}
+            self._unsaved += 1
+            save = self.snapshot_path is not None and self._unsaved >= self.save_every
+        
+        if save:
+            self.save()
+    
+    def _free_slot(self, now: float) -> int:
+        """An empty slot, freeing expired entries or evicting the least recently used one if needed."""
+        for slot, entry in enumerate(self._entries):
+            if entry is None:
+                return slot
+        
+        expired = [slot for slot, entry in enumerate(self._entries) if self._expired(entry, now)]
+        for slot in expired:
+            self._free(slot)
+        self.expirations += len(expired)
+        if expired:
+            return expired[0]
+        
+        slot = min(range(self.max_size), key=lambda i: self._entries[i]['last_used'])
+        self._free(slot)
+        self.evictions += 1
+        return slot
+    
+    def _owns_snapshot(self) -> bool:
+        """
+        Whether this process saves the snapshot.
+        
+        Gunicorn workers share THERAPY_CACHE_PATH and would overwrite each other's
+        saves, so only the process holding an exclusive lock on <path>.lock saves.
+        When it exits the lock is released and the next worker to save takes over.
+        """
+        if fcntl is None or self._owner_pid == os.getpid():
+            return True
+        lock_file = open(f"{self.snapshot_path}.lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._owner_file, self._owner_pid = lock_file, os.getpid()
+        return True
+    
+    def save(self, path: Optional[str] = None):
+        """
+        Write a snapshot (vectors and entries) to path, defaulting to the snapshot path.
+        
+        The snapshot path is only written by one process (see _owns_snapshot), and
+        only when there are entries it has not saved yet.
+        """
+        if path is None:
+            path = self.snapshot_path
+            if not path or not self._unsaved:
+                return
+            if not self._owns_snapshot():
+                self._unsaved = 0
+                return
+        
+        with self._lock:
+            slots = [slot for slot, entry in enumerate(self._entries) if entry is not None]
+            vectors = self._vectors[slots] if self._vectors is not None else np.zeros((0, 0), dtype=np.float32)
+            meta = json.dumps({'namespace': self.namespace, 'entries': [self._entries[slot] for slot in slots]})
+            self._unsaved = 0
+        
+        # Write a private temp file, then replace atomically, so readers never see a partial snapshot
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(tmp_path, vectors=vectors, meta=np.array(meta))
+            os.replace(tmp_path, path)
+            logger.info(f"Saved response cache snapshot ({len(slots)} entries) to {path}")
+        except OSError as e:
+            logger.warning(f"Could not save response cache snapshot to {path}: {e}")
+    
+    def load(self, path: str):
+        """Load a snapshot, skipping expired entries and snapshots from another encoder."""
+        try:
+            with np.load(path, allow_pickle=False) as snapshot:
+                vectors = snapshot['vectors']
+                meta = json.loads(str(snapshot['meta']))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load response cache snapshot from {path}: {e}")
+            return
+        
+        if meta['namespace'] != self.namespace:
+            logger.info(f"Ignoring response cache snapshot for {meta['namespace']} (encoder is {self.namespace})")
+            return
+        
+        now = time.time()
+        # Keep the most recently used entries that fit
+        entries = sorted(zip(meta['entries'], vectors), key=lambda item: -item[0]['last_used'])
+        entries = [(entry, vector) for entry, vector in entries if not self._expired(entry, now)][:self.max_size]
+        with self._lock:
+            if entries:
+                self._vectors = np.zeros((self.max_size, vectors.shape[1]), dtype=np.float32)
+            for slot, (entry, vector) in enumerate(entries):
+                # Snapshots from before issue texts were dropped still have them
+                entry.pop('text', None)
+                self._vectors[slot] = vector
+                self._entries[slot] = entry
+        logger.info(f"Loaded {len(entries)} response cache entries from {path}")
+    
+    def clear(self):
+        """Remove all entries (counters are kept)."""
+        with self._lock:
+            self._entries = [None] * self.max_size
+            self._vectors = None
+    
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self._entries)
+    
+    def stats(self) -> dict:
+        """Return size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+def create_response_cache(namespace: str = '') -> Optional[SemanticResponseCache]:
+    """
+    Create the therapy response cache from environment variables.
+    
+    THERAPY_CACHE_SIZE: cached responses, 0 disables the cache (default 0: opt-in, since users
+        with similar issues are served the same response)
+    THERAPY_CACHE_THRESHOLD: minimum cosine similarity to reuse a response (default 0.92)
+    THERAPY_CACHE_TTL: seconds a response stays valid, 0 for no expiry (default 86400)
+    THERAPY_CACHE_PATH: snapshot file, loaded at startup and saved periodically and at exit
+    
+    Returns:
+        SemanticResponseCache, or None when disabled
+    """
+    max_size = int(os.getenv('THERAPY_CACHE_SIZE', '0'))
+    if max_size <= 0:
+        return None
+    
+    cache = SemanticResponseCache(threshold=float(os.getenv('THERAPY_CACHE_THRESHOLD', '0.92')),
+                                  max_size=max_size,
+                                  ttl=float(os.getenv('THERAPY_CACHE_TTL', '86400')) or None,
+                                  snapshot_path=os.getenv('THERAPY_CACHE_PATH') or None,
+                                  namespace=namespace)
+    if cache.snapshot_path:
+        atexit.register(cache.save)
+    return cache
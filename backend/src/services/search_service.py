@@ -1,8 +1,25 @@
 """
 Search service interface.
 """
+import os
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional, Union
+
+
+def check_k(k) -> Optional[str]:
+    """
+    Why k is not a valid number of results for a request, or None if it is.
+    
+    Searches are micro-batched, so a bad k from one request would fail, or with
+    a huge value slow down, every request batched with it.
+    
+    SEARCH_MAX_K: largest k a request may ask for (default 100)
+    """
+    max_k = int(os.getenv('SEARCH_MAX_K', '100'))
+    # bool is an int subclass, but true/false is not a count
+    if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= max_k:
+        return f'k must be an integer between 1 and {max_k}'
+    return None
 
 
 class SearchService(ABC):
@@ -21,3 +38,20 @@ class SearchService(ABC):
             List of results with scores
         """
         pass
+    
+    def search_batch(self, queries: List[str], k: Union[int, List[int]] = 5) -> List[List[dict]]:
+        """
+        Search for several queries at once.
+        
+        Implementations should override this to batch the work; the default
+        runs one search per query.
+        
+        Args:
+            queries: Texts to search for
+            k: Number of results, either one value for all queries or one per query
+            
+        Returns:
+            One list of results per query
+        """
+        ks = [k] * len(queries) if isinstance(k, int) else list(k)
+        return [self.search(query, query_k) for query, query_k in zip(queries, ks)]
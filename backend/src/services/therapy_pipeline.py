@@ -0,0 +1,482 @@
+"""
+Therapy response generation: translation and therapy prompting, as two model calls or one fused call.
+
+Generation can run speculatively alongside input validation (run_gated), so a
+request takes about as long as the slower of the two instead of their sum.
+The *_async methods do the same with an AsyncGenAIService, for the async routes.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, Tuple
+
+from prompts import therapy_prompt, fused_therapy_prompt
+from utils.metrics import bind_context, timed
+
+logger = logging.getLogger(__name__)
+
+# two_step: translation_prompt call (non-English only), then therapy_prompt call
+# fused: one fused_therapy_prompt call for non-English issues, returning JSON
+PIPELINE_MODES = ('two_step', 'fused')
+
+CODE_FENCE_PATTERN = re.compile(r'^```(?:json)?\s*(.*?)\s*```$', re.DOTALL)
+
+
+class StageTimeoutError(TimeoutError):
+    """A pipeline stage did not finish within its timeout."""
+    
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} did not finish within {timeout:g}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+def parse_fused_response(text: str) -> dict:
+    """
+    Parse the JSON reply to fused_therapy_prompt.
+    
+    Tolerates a surrounding code block or stray text around the object.
+    
+    Args:
+        text: Model reply
+    
+    Returns:
+        Dict with 'language', 'issue_en' and 'response'
+    
+    Raises:
+        ValueError: If the reply has no JSON object or no response sentence
+    """
+    cleaned = text.strip()
+    fence = CODE_FENCE_PATTERN.match(cleaned)
+    if fence:
+        cleaned = fence.group(1)
+    start, end = cleaned.find('{'), cleaned.rfind('}')
+    if start < 0 or end < start:
+        raise ValueError("No JSON object in fused response")
+    
+    data = json.loads(cleaned[start:end + 1])
+    response = data.get('response') if isinstance(data, dict) else None
+    if not isinstance(response, str) or not response.strip():
+        raise ValueError("Fused response has no 'response' sentence")
+    return {
+        'language': str(data.get('language') or 'unknown'),
+        'issue_en': str(data.get('issue_en') or ''),
+        'response': response.strip()
+    }
+
+
+class TherapyPipeline:
+    """Turns a user issue into the English therapy sentence used as the verse search query."""
+    
+    # Paths a request can take: direct (no translation needed, one call), two_step,
+    # fused, fused_fallback (unparseable fused reply, then the two-step path)
+    PATHS = ('direct', 'two_step', 'fused', 'fused_fallback')
+    
+    def __init__(self, genai, translation_middleware=None, mode: str = 'two_step', concurrent: bool = True,
+                 guardrails_timeout: float = 10.0, generation_timeout: float = 60.0, max_workers: int = 8,
+                 async_genai=None, gate_workers: int = 4):
+        """
+        Args:
+            genai: GenAIService used for all model calls
+            async_genai: Optional AsyncGenAIService used by the *_async methods
+            translation_middleware: Optional TranslationMiddleware (decides which issues need translating)
+            mode: One of PIPELINE_MODES
+            concurrent: Run work speculatively alongside validation in run_gated
+            guardrails_timeout: Seconds validation may take in run_gated
+            generation_timeout: Seconds the speculative work may take in run_gated, from its start
+            max_workers: Threads for the speculative work of all requests
+            gate_workers: Threads for validation, separate so that slow generations cannot
+                starve it (and time it out) under load
+        """
+        if mode not in PIPELINE_MODES:
+            logger.warning(f"Unknown therapy pipeline mode '{mode}', using 'two_step'")
+            mode = 'two_step'
+        self.genai = genai
+        self.async_genai = async_genai
+        self.translation_middleware = translation_middleware
+        self.mode = mode
+        self.concurrent = concurrent
+        self.guardrails_timeout = guardrails_timeout
+        self.generation_timeout = generation_timeout
+        self.max_workers = max_workers
+        self.gate_workers = gate_workers
+        self._executor = None
+        self._gate_executor = None
+        self._lock = threading.Lock()
+        self._counters = {path: {'requests': 0, 'model_calls': 0, 'total_s': 0.0} for path in self.PATHS}
+        self._gated = {'requests': 0, 'rejected': 0, 'discarded': 0, 'guardrails_errors': 0,
+                       'guardrails_timeouts': 0, 'generation_timeouts': 0, 'saved_s': 0.0}
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool for the speculative work of run_gated, created on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='therapy-stage')
+            return self._executor
+    
+    @property
+    def gate_executor(self) -> ThreadPoolExecutor:
+        """Thread pool for the validation of run_gated and run_gated_async, created on first use."""
+        with self._lock:
+            if self._gate_executor is None:
+                self._gate_executor = ThreadPoolExecutor(max_workers=self.gate_workers,
+                                                         thread_name_prefix='therapy-gate')
+            return self._gate_executor
+    
+    def _gate_failed(self, error: Exception) -> Tuple[bool, str, None]:
+        """Treat a gate that raised as a failed validation: the input is not known to be safe."""
+        logger.error(f"Input validation raised: {error}")
+        with self._lock:
+            self._gated['guardrails_errors'] += 1
+        return False, "Input validation failed", None
+    
+    def _needs_translation(self, issue: str) -> bool:
+        return self.translation_middleware is not None and self.translation_middleware.needs_translation(issue)
+    
+    def generate(self, issue: str, cancelled: Optional[threading.Event] = None) -> dict:
+        """
+        Generate the therapy sentence for an issue.
+        
+        Args:
+            issue: The user's issue, in any language
+            cancelled: Optional event; once set, no further model calls are started
+        
+        Returns:
+            Dict with 'ai_response', 'issue_en', 'path' and 'model_calls'
+        
+        Raises:
+            CancelledError: If cancelled was set between model calls
+            Exception: If a model call fails
+        """
+        start = time.perf_counter()
+        if self.mode == 'fused' and self._needs_translation(issue):
+            result = self._generate_fused(issue, cancelled)
+        else:
+            result = self._generate_two_step(issue, cancelled)
+        self._record(result, start)
+        return result
+    
+    def generate_stream(self, issue: str, cancelled: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        Generate the therapy sentence for an issue, yielding it in chunks as the model writes it.
+        
+        Translation is not streamed. In fused mode the JSON reply can only be used
+        once it is complete, so non-English issues yield the sentence as one chunk.
+        
+        Args:
+            issue: The user's issue, in any language
+            cancelled: Optional event; once set, no further model calls are started
+        
+        Yields:
+            Chunks of the therapy sentence
+        
+        Raises:
+            CancelledError: If cancelled was set between model calls
+            Exception: If a model call fails
+        """
+        start = time.perf_counter()
+        if self.mode == 'fused' and self._needs_translation(issue):
+            result = self._generate_fused(issue, cancelled)
+            yield result['ai_response']
+        else:
+            translated, model_calls = self._translate(issue, cancelled)
+            chunks = []
+            for chunk in self.genai.generate_stream(therapy_prompt(translated)):
+                chunks.append(chunk)
+                yield chunk
+            result = {'ai_response': ''.join(chunks).strip(), 'issue_en': translated,
+                      'path': 'two_step' if model_calls else 'direct', 'model_calls': model_calls + 1}
+        self._record(result, start)
+    
+    def _record(self, result: dict, start: float):
+        with self._lock:
+            counters = self._counters[result['path']]
+            counters['requests'] += 1
+            counters['model_calls'] += result['model_calls']
+            counters['total_s'] += time.perf_counter() - start
+    
+    def _translate(self, issue: str, cancelled: Optional[threading.Event] = None) -> Tuple[str, int]:
+        """Translate the issue if needed; returns (English issue, model calls made)."""
+        translated = issue
+        model_calls = 0
+        if self.translation_middleware is not None:
+            model_calls += self._needs_translation(issue)
+            with timed('translation'):
+                translated = self.translation_middleware.process(issue)
+        
+        if cancelled is not None and cancelled.is_set():
+            raise CancelledError()
+        return translated, model_calls
+    
+    def _generate_two_step(self, issue: str, cancelled: Optional[threading.Event] = None) -> dict:
+        """Translate (if needed) with one call, then prompt for the therapy sentence with another."""
+        translated, model_calls = self._translate(issue, cancelled)
+        ai_response = self.genai.generate(therapy_prompt(translated))
+        return {'ai_response': ai_response, 'issue_en': translated,
+                'path': 'two_step' if model_calls else 'direct', 'model_calls': model_calls + 1}
+    
+    def _generate_fused(self, issue: str, cancelled: Optional[threading.Event] = None) -> dict:
+        """Translate and write the therapy sentence in one call, falling back to two steps on a bad reply."""
+        reply = self.genai.generate(fused_therapy_prompt(issue))
+        try:
+            parsed = parse_fused_response(reply)
+        except ValueError as e:
+            logger.warning(f"Unparseable fused response ({e}), using the two-step pipeline: {reply!r}")
+            if cancelled is not None and cancelled.is_set():
+                raise CancelledError()
+            result = self._generate_two_step(issue, cancelled)
+            result['path'] = 'fused_fallback'
+            result['model_calls'] += 1
+            return result
+        
+        logger.info(f"Fused pipeline ({parsed['language']}): '{issue}' -> '{parsed['issue_en']}'")
+        return {'ai_response': parsed['response'], 'issue_en': parsed['issue_en'] or issue,
+                'path': 'fused', 'model_calls': 1}
+    
+    def run_gated(self, gate: Callable[[], Tuple[bool, str]], work: Callable[[threading.Event], object]):
+        """
+        Run work speculatively while gate decides whether its result may be used.
+        
+        The gate runs on gate_executor, work on executor. If the gate rejects the
+        input, raises or times out, the cancel event passed to work is set and its
+        result is discarded (a model call already in flight cannot be interrupted,
+        but no new one is started). A gate that raises counts as a rejection.
+        Without concurrency the gate runs first and work only if it passes.
+        
+        Args:
+            gate: Validation returning (is_valid, reason), e.g. GuardrailsMiddleware.validate
+            work: Called with a threading.Event that is set when the result will be discarded
+        
+        Returns:
+            Tuple of (is_valid, reason, work result or None when rejected)
+        
+        Raises:
+            StageTimeoutError: If the gate or the work exceeds its timeout
+            Exception: Whatever work raised
+        """
+        cancelled = threading.Event()
+        if not self.concurrent:
+            try:
+                is_valid, reason = gate()
+            except Exception as e:
+                return self._gate_failed(e)
+            return is_valid, reason, work(cancelled) if is_valid else None
+        
+        start = time.perf_counter()
+        # Each stage runs in a copy of the request's context, so its timings are attributed to the request
+        gate_future = self.gate_executor.submit(bind_context(self._timed), gate)
+        work_future = self.executor.submit(bind_context(self._timed), work, cancelled)
+        
+        def discard(counter: str):
+            cancelled.set()
+            work_future.cancel()
+            with self._lock:
+                self._gated[counter] += 1
+        
+        with self._lock:
+            self._gated['requests'] += 1
+        try:
+            (is_valid, reason), gate_s = gate_future.result(timeout=self.guardrails_timeout)
+        except FutureTimeoutError:
+            discard('guardrails_timeouts')
+            raise StageTimeoutError('guardrails', self.guardrails_timeout)
+        except Exception as e:
+            discard('discarded')
+            return self._gate_failed(e)
+        
+        if not is_valid:
+            discard('rejected')
+            return is_valid, reason, None
+        
+        remaining = self.generation_timeout - (time.perf_counter() - start)
+        try:
+            result, work_s = work_future.result(timeout=max(remaining, 0.0))
+        except FutureTimeoutError:
+            discard('generation_timeouts')
+            raise StageTimeoutError('generation', self.generation_timeout)
+        
+        with self._lock:
+            self._gated['saved_s'] += max(gate_s + work_s - (time.perf_counter() - start), 0.0)
+        return is_valid, reason, result
+    
+    @staticmethod
+    def _timed(function: Callable, *args):
+        """Call function and return (result, seconds taken)."""
+        start = time.perf_counter()
+        result = function(*args)
+        return result, time.perf_counter() - start
+    
+    async def generate_async(self, issue: str) -> dict:
+        """generate() with the model calls awaited on async_genai; cancelling it cancels the call in flight."""
+        start = time.perf_counter()
+        if self.mode == 'fused' and self._needs_translation(issue):
+            result = await self._generate_fused_async(issue)
+        else:
+            result = await self._generate_two_step_async(issue)
+        self._record(result, start)
+        return result
+    
+    async def generate_stream_async(self, issue: str) -> AsyncIterator[str]:
+        """generate_stream() with the model calls awaited on async_genai."""
+        start = time.perf_counter()
+        if self.mode == 'fused' and self._needs_translation(issue):
+            result = await self._generate_fused_async(issue)
+            yield result['ai_response']
+        else:
+            translated, model_calls = await self._translate_async(issue)
+            chunks = []
+            async for chunk in self.async_genai.generate_stream(therapy_prompt(translated)):
+                chunks.append(chunk)
+                yield chunk
+            result = {'ai_response': ''.join(chunks).strip(), 'issue_en': translated,
+                      'path': 'two_step' if model_calls else 'direct', 'model_calls': model_calls + 1}
+        self._record(result, start)
+    
+    async def _translate_async(self, issue: str) -> Tuple[str, int]:
+        translated = issue
+        model_calls = 0
+        if self.translation_middleware is not None:
+            model_calls += self._needs_translation(issue)
+            with timed('translation'):
+                translated = await self.translation_middleware.process_async(issue)
+        return translated, model_calls
+    
+    async def _generate_two_step_async(self, issue: str) -> dict:
+        translated, model_calls = await self._translate_async(issue)
+        ai_response = await self.async_genai.generate(therapy_prompt(translated))
+        return {'ai_response': ai_response, 'issue_en': translated,
+                'path': 'two_step' if model_calls else 'direct', 'model_calls': model_calls + 1}
+    
+    async def _generate_fused_async(self, issue: str) -> dict:
+        reply = await self.async_genai.generate(fused_therapy_prompt(issue))
+        try:
+            parsed = parse_fused_response(reply)
+        except ValueError as e:
+            logger.warning(f"Unparseable fused response ({e}), using the two-step pipeline: {reply!r}")
+            result = await self._generate_two_step_async(issue)
+            result['path'] = 'fused_fallback'
+            result['model_calls'] += 1
+            return result
+        
+        logger.info(f"Fused pipeline ({parsed['language']}): '{issue}' -> '{parsed['issue_en']}'")
+        return {'ai_response': parsed['response'], 'issue_en': parsed['issue_en'] or issue,
+                'path': 'fused', 'model_calls': 1}
+    
+    async def run_gated_async(self, gate: Callable[[], Tuple[bool, str]], work: Callable[[], Awaitable]):
+        """
+        run_gated() for a coroutine: work runs as a task on the event loop while the
+        (blocking) gate runs on gate_executor.
+        
+        A rejection or timeout cancels the work task, which also cancels a model
+        call in flight instead of letting it run to completion.
+        
+        Args:
+            gate: Validation returning (is_valid, reason), e.g. GuardrailsMiddleware.validate
+            work: Coroutine function producing the result
+        
+        Returns:
+            Tuple of (is_valid, reason, work result or None when rejected)
+        
+        Raises:
+            StageTimeoutError: If the gate or the work exceeds its timeout
+            Exception: Whatever work raised
+        """
+        loop = asyncio.get_running_loop()
+        if not self.concurrent:
+            try:
+                is_valid, reason = await loop.run_in_executor(self.gate_executor, bind_context(gate))
+            except Exception as e:
+                return self._gate_failed(e)
+            return is_valid, reason, await work() if is_valid else None
+        
+        start = time.perf_counter()
+        gate_future = loop.run_in_executor(self.gate_executor, bind_context(self._timed), gate)
+        # Tasks run in a copy of the request's context, so the work's timings are attributed to the request
+        work_task = asyncio.ensure_future(self._timed_async(work))
+        
+        def discard(counter: str):
+            work_task.cancel()
+            # Retrieve an exception the discarded work may already have raised, so asyncio does not log it
+            work_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            with self._lock:
+                self._gated[counter] += 1
+        
+        with self._lock:
+            self._gated['requests'] += 1
+        try:
+            (is_valid, reason), gate_s = await asyncio.wait_for(gate_future, self.guardrails_timeout)
+        except asyncio.TimeoutError:
+            discard('guardrails_timeouts')
+            raise StageTimeoutError('guardrails', self.guardrails_timeout)
+        except Exception as e:
+            discard('discarded')
+            return self._gate_failed(e)
+        except BaseException:
+            # The request itself was cancelled (client disconnected)
+            discard('discarded')
+            raise
+        
+        if not is_valid:
+            discard('rejected')
+            return is_valid, reason, None
+        
+        remaining = self.generation_timeout - (time.perf_counter() - start)
+        try:
+            result, work_s = await asyncio.wait_for(work_task, max(remaining, 0.0))
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._gated['generation_timeouts'] += 1
+            raise StageTimeoutError('generation', self.generation_timeout)
+        
+        with self._lock:
+            self._gated['saved_s'] += max(gate_s + work_s - (time.perf_counter() - start), 0.0)
+        return is_valid, reason, result
+    
+    @staticmethod
+    async def _timed_async(work: Callable[[], Awaitable]):
+        start = time.perf_counter()
+        result = await work()
+        return result, time.perf_counter() - start
+    
+    def stats(self) -> dict:
+        """Return the mode, per path requests, model calls and mean latency, and run_gated counters."""
+        with self._lock:
+            paths = {
+                path: {'requests': c['requests'], 'model_calls': c['model_calls'],
+                       'avg_latency_ms': c['total_s'] / c['requests'] * 1000 if c['requests'] else 0.0}
+                for path, c in self._counters.items()
+            }
+            gated = dict(self._gated)
+        gated['saved_ms'] = round(gated.pop('saved_s') * 1000, 1)
+        return {'mode': self.mode, 'concurrent': self.concurrent, 'paths': paths, 'gated': gated}
+
+
+def create_therapy_pipeline(genai, translation_middleware=None) -> Optional[TherapyPipeline]:
+    """
+    Create the therapy pipeline from environment variables.
+    
+    THERAPY_PIPELINE_MODE: 'two_step' (default) or 'fused'
+    THERAPY_PIPELINE_CONCURRENT: generate alongside guardrails validation (default true)
+    THERAPY_GUARDRAILS_TIMEOUT: seconds validation may take (default 10)
+    THERAPY_GENERATION_TIMEOUT: seconds translation and generation may take (default 60)
+    THERAPY_PIPELINE_WORKERS: threads for speculative generation (default 8)
+    THERAPY_GATE_WORKERS: threads for guardrails validation (default 4)
+    
+    Returns:
+        TherapyPipeline, or None without a GenAI service
+    """
+    if genai is None:
+        return None
+    return TherapyPipeline(genai, translation_middleware,
+                           mode=os.getenv('THERAPY_PIPELINE_MODE', 'two_step').lower(),
+                           concurrent=os.getenv('THERAPY_PIPELINE_CONCURRENT', 'true').lower() == 'true',
+                           guardrails_timeout=float(os.getenv('THERAPY_GUARDRAILS_TIMEOUT', '10')),
+                           generation_timeout=float(os.getenv('THERAPY_GENERATION_TIMEOUT', '60')),
+                           max_workers=int(os.getenv('THERAPY_PIPELINE_WORKERS', '8')),
+                           gate_workers=int(os.getenv('THERAPY_GATE_WORKERS', '4')))
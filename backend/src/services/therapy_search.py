@@ -0,0 +1,54 @@
+"""
+Stages of a therapy search shared by the Flask routes (routes/api.py) and
+the async routes (routes/api_async.py).
+"""
+from typing import Optional, Tuple
+
+from middleware.language import is_english
+from utils.metrics import timed
+from .search_service import check_k
+
+
+def parse_therapy_request(data) -> Tuple[Optional[Tuple[str, int]], Optional[str]]:
+    """
+    Issue and k of a therapy request body: ((issue, k), None), or (None, why it is invalid).
+    
+    k is checked here, before it reaches the searches and the response cache entry.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('issue'), str):
+        return None, 'User issue is required'
+    k = data.get('k', 5)
+    k_error = check_k(k)
+    if k_error:
+        return None, k_error
+    return (data['issue'], k), None
+
+
+def cached_therapy_response(search, response_cache, user_issue: str):
+    """
+    Semantic cache lookup for an issue: (cached value or None, issue embedding or None).
+    
+    Only issues the translation middleware would pass through untranslated are cached:
+    the English-only encoder maps unrelated non-English issues close together, so they
+    could be served each other's responses. The embedding is None when the issue is not cached.
+    """
+    if response_cache is None or not is_english(user_issue):
+        return None, None
+    issue_embedding = search.encode_queries([user_issue])[0]
+    return response_cache.get(issue_embedding), issue_embedding
+
+
+def cached_results(search, cached: dict, k: int) -> list:
+    """
+    Verses for a cached response; they are searched again (no GenAI call) when more
+    verses than were cached are needed or the data bundle has changed since.
+    """
+    if k <= cached['k'] and cached.get('version') == search.version:
+        return cached['results'][:k]
+    return search.search(cached['ai_response'], k, index='english')
+
+
+def timed_validate(guardrails, user_issue: str):
+    """Guardrails validation of an issue, timed as the 'guardrails' stage."""
+    with timed('guardrails'):
+        return guardrails.validate(user_issue)
@@ -3,60 +3,328 @@ FAISS-based search implementation.
 """
 import faiss
 import numpy as np
-import json
+import logging
+import os
+from typing import List, Optional, Union
 from .search_service import SearchService
+from .embedding_cache import EmbeddingCache, encode_cached
+from .encoders import QueryEncoder, SentenceTransformerEncoder
+from .batching import MicroBatcher
+from .index_factory import load_index, set_search_params, describe_index, search_index, rescore
+from .verse_store import load_verses
+from .lexical_search import LexicalIndex, parse_phrase, reciprocal_rank_fusion
+from .multilingual_index import MultilingualIndex
+from middleware.language import WORD_PATTERN, detect_language, script_counts
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = 'multi-qa-mpnet-base-dot-v1'
+
+# semantic: FAISS only; lexical: BM25 only; hybrid: reciprocal-rank fusion of both
+SEARCH_MODES = ('semantic', 'lexical', 'hybrid')
+# auto: the multilingual index for non-English queries when it is loaded, else the English one
+SEARCH_INDEXES = ('auto', 'english', 'multilingual')
+# Minimum detect_language confidence for routing a Latin-script query to the multilingual index
+MULTILINGUAL_MIN_CONFIDENCE = 0.3
+# Queries with a smaller share of Latin letters (e.g. Arabic, or English mixed with Arabic) are foreign
+MULTILINGUAL_MIN_LATIN_SHARE = 0.9
+# Candidates taken from each ranking before hybrid fusion
+HYBRID_CANDIDATES = 50
+
+# Representative queries of different lengths, used to warm up the encoder
+WARMUP_QUERIES = [
+    "peace",
+    "I feel anxious about my future",
+    "Trust in Allah's plan for you, as every hardship is followed by ease and every moment of worry can become patience.",
+]
 
 
 class VectorSearchService(SearchService):
     """FAISS-based vector search implementation."""
     
-    def __init__(self, embeddings_path: str, metadata_path: str, model_name: str = 'multi-qa-mpnet-base-dot-v1'):
+    def __init__(self, embeddings_path: str, metadata_path: str, model_name: str = DEFAULT_MODEL_NAME,
+                 index_path: Optional[str] = None, embedding_cache: Optional[EmbeddingCache] = None,
+                 micro_batch_size: int = 0, micro_batch_wait_ms: float = 5.0,
+                 ef_search: Optional[int] = None, nprobe: Optional[int] = None, rescore_factor: int = 0,
+                 encoder: Optional[QueryEncoder] = None, lexical_index: bool = False,
+                 multilingual: Optional[MultilingualIndex] = None, version: Optional[str] = None):
         self.embeddings_path = embeddings_path
         self.metadata_path = metadata_path
+        # Data bundle version (services/bundle.py), None when loaded from plain paths
+        self.version = version
         self.model_name = model_name
+        # Pluggable query encoder (torch SentenceTransformer by default, or ONNX Runtime)
+        self.encoder = encoder or SentenceTransformerEncoder(model_name)
+        self.index_path = index_path
+        self.embedding_cache = embedding_cache
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        # With a quantized index, fetch k * rescore_factor candidates and re-rank them exactly
+        self.rescore_factor = rescore_factor
+        self.rescore_vectors = None
+        # Opt-in: concurrent single-query searches are queued and run as one batch
+        self.batcher = MicroBatcher(self.search_batch, micro_batch_size, micro_batch_wait_ms) if micro_batch_size > 1 else None
+        self.lexical_index = lexical_index
+        self.lexical = None
+        # Optional cross-lingual index: non-English queries are searched directly, without translation
+        self.multilingual = multilingual
         self.index = None
         self.verses = []
-        self.model = None
+        self.warmed_up = False
         self._initialize()
     
     def _initialize(self):
-        """Initialize FAISS index with precomputed embeddings."""
-        # Load precomputed embeddings
-        embeddings = np.load(self.embeddings_path)
+        """Initialize FAISS index from a prebuilt index file or precomputed embeddings."""
+        if self.index_path and os.path.exists(self.index_path):
+            # Prebuilt index: mapped from disk, nothing to rebuild
+            self.index = load_index(self.index_path)
+            logger.info(f"Loaded prebuilt index from {self.index_path} ({self.index.ntotal} vectors)")
+        else:
+            if self.index_path:
+                logger.warning(f"Index file {self.index_path} not found, rebuilding from {self.embeddings_path}")
+            
+            # Load precomputed embeddings
+            embeddings = np.load(self.embeddings_path)
+            
+            # Create FAISS index (cosine similarity)
+            self.index = faiss.IndexFlatIP(embeddings.shape[1])
+            self.index.add(embeddings)
         
-        # Load metadata (bilingual format)
-        with open(self.metadata_path) as f:
-            self.verses = json.load(f)
+        # Query-time tuning for approximate indexes (HNSW efSearch, IVF nprobe)
+        set_search_params(self.index, ef_search=self.ef_search, nprobe=self.nprobe)
+        
+        if self.rescore_factor > 1:
+            # Full-precision vectors stay on disk; only rescored candidate rows are paged in
+            self.rescore_vectors = np.load(self.embeddings_path, mmap_mode='r')
+        
+        # Load metadata (bilingual format) as a columnar store: the .bin file is
+        # memory-mapped, JSON metadata is packed in memory
+        self.verses = load_verses(self.metadata_path)
         
         # Verify that the number of embeddings matches the number of verses
-        if len(embeddings) != len(self.verses):
-            print(f"Warning: Embedding count ({len(embeddings)}) doesn't match verse count ({len(self.verses)})")
+        if self.index.ntotal != len(self.verses):
+            logger.warning(f"Embedding count ({self.index.ntotal}) doesn't match verse count ({len(self.verses)})")
+        
+        if self.lexical_index:
+            # BM25 over verse_en and normalized verse_ar for phrase, lexical and hybrid search
+            self.lexical = LexicalIndex(self.verses)
+    
+    def load_model(self) -> QueryEncoder:
+        """Load the query encoders once, even when several threads ask for them at the same time."""
+        if self.multilingual is not None:
+            self.multilingual.load_model()
+        return self.encoder.load()
+    
+    def warmup(self, queries: Optional[List[str]] = None, runs: int = 2):
+        """
+        Load the encoder and run a few encodes and searches so the first real request is fast.
+        
+        Args:
+            queries: Texts to encode, defaults to WARMUP_QUERIES
+            runs: Number of passes over the warmup queries
+        """
+        encoder = self.load_model()
+        queries = queries or WARMUP_QUERIES
+        for _ in range(runs):
+            # Bypass the embedding cache so every pass really runs the encoder
+            for query in queries:
+                self._search_index(encoder.encode([query]), 1)
+            self._search_index(encoder.encode(queries), 1)
+            if self.multilingual is not None:
+                self.multilingual.encoder.encode(queries)
+        self.warmed_up = True
+        logger.info(f"Encoder warmed up with {runs} passes")
+    
+    def readiness(self) -> dict:
+        """Report readiness of the index and the encoder (and of the multilingual encoder when loaded)."""
+        encoder_state = 'warm' if self.warmed_up else ('loaded' if self.encoder.loaded else 'not_loaded')
+        components = {
+            'index': {'ready': self.index is not None and self.index.ntotal > 0,
+                      'version': self.version,
+                      'vectors': self.index.ntotal if self.index is not None else 0,
+                      'type': describe_index(self.index) if self.index is not None else None},
+            'encoder': {'ready': self.encoder.loaded, 'state': encoder_state, 'name': self.encoder.name},
+        }
+        if self.multilingual is not None:
+            encoder = self.multilingual.encoder
+            state = 'warm' if self.warmed_up else ('loaded' if encoder.loaded else 'not_loaded')
+            components['multilingual_encoder'] = {'ready': encoder.loaded, 'state': state, 'name': encoder.name}
+        return components
+    
+    def close(self):
+        """Stop the micro-batcher after its queued searches; the service still answers searches unbatched."""
+        if self.batcher is not None:
+            self.batcher.close()
+    
+    def stats(self) -> dict:
+        """Return cache and micro-batching counters."""
+        return {
+            'version': self.version,
+            'embedding_cache': self.embedding_cache.stats() if self.embedding_cache is not None else None,
+            'micro_batching': self.batcher.stats() if self.batcher is not None else None,
+            'multilingual': self.multilingual.stats() if self.multilingual is not None else None
+        }
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Encode queries (normalized for cosine similarity), reusing cached embeddings.
+        
+        Args:
+            queries: Texts to encode
+            
+        Returns:
+            float32 array of shape (len(queries), dim)
+        """
+        return encode_cached(self.encoder, self.embedding_cache, queries)
+    
+    def route(self, query: str, index: str = 'auto') -> str:
+        """
+        Pick the index a query is searched in.
+        
+        Args:
+            query: Text to search for
+            index: One of SEARCH_INDEXES ('multilingual' needs the multilingual index)
+        
+        Returns:
+            'english' or 'multilingual'
+        """
+        if index not in SEARCH_INDEXES:
+            raise ValueError(f"Unknown search index '{index}', expected one of {SEARCH_INDEXES}")
+        if index == 'multilingual' and self.multilingual is None:
+            raise ValueError("Search index 'multilingual' is not loaded")
+        if index == 'auto':
+            return 'multilingual' if self.multilingual is not None and self._is_foreign(query) else 'english'
+        return index
+    
+    @staticmethod
+    def _is_foreign(query: str) -> bool:
+        """
+        Whether query is written in another script, or is Latin text confidently detected as another language.
         
-        # Create FAISS index (cosine similarity)
-        self.index = faiss.IndexFlatIP(embeddings.shape[1])
-        self.index.add(embeddings)
+        Unlike translation, which treats uncertain text as foreign to be safe, routing
+        keeps it on the English index: English detections of any confidence, and single
+        words and names ("Allah", "heaven"), whatever language their spelling suggests.
+        """
+        scripts = script_counts(query)
+        letters = sum(scripts.values())
+        if not letters:
+            return False
+        if scripts['LATIN'] / letters < MULTILINGUAL_MIN_LATIN_SHARE:
+            return True
+        if len(WORD_PATTERN.findall(query)) < 2:
+            return False
+        language, confidence = detect_language(query)
+        return language != 'en' and confidence >= MULTILINGUAL_MIN_CONFIDENCE
     
-    def search(self, query: str, k: int = 5) -> list:
-        """Search for similar verses and return bilingual results."""
-        from sentence_transformers import SentenceTransformer
+    def search(self, query: str, k: int = 5, mode: str = 'semantic', index: str = 'auto') -> list:
+        """
+        Search for verses and return bilingual results.
         
-        if self.model is None:
-            self.model = SentenceTransformer(self.model_name)
+        A query wrapped in double quotes is an exact-phrase query and is answered
+        from the lexical index without encoding it; when no verse contains the
+        phrase, the unquoted text is searched with the requested mode. Semantic
+        rankings come from the index picked by route().
         
-        # Encode query (normalize for cosine similarity)
-        query_emb = self.model.encode([query], normalize_embeddings=True)
+        Args:
+            query: Text to search for
+            k: Number of results
+            mode: One of SEARCH_MODES ('lexical' and 'hybrid' need the lexical index)
+            index: One of SEARCH_INDEXES
+            
+        Returns:
+            Bilingual results with scores (cosine for semantic, BM25 for lexical, RRF for hybrid)
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        if mode != 'semantic' and self.lexical is None:
+            raise ValueError(f"Search mode '{mode}' requires the lexical index")
+        multilingual = self.route(query, index) == 'multilingual'
+        
+        if self.lexical is not None:
+            phrase = parse_phrase(query)
+            if phrase is not None:
+                scores, rows = self.lexical.search_phrase(phrase, k)
+                if len(rows) or mode == 'lexical':
+                    return self._format_results(scores, rows)
+                query = phrase
+            if mode == 'lexical':
+                return self._format_results(*self.lexical.search(query, k))
+            if mode == 'hybrid':
+                return self._hybrid_search(query, k, multilingual)
+        
+        if multilingual:
+            return self._format_results(*self.multilingual.search(query, k))
+        if self.batcher is not None:
+            return self.batcher.search(query, k)
+        return self.search_batch([query], k)[0]
+    
+    def _hybrid_search(self, query: str, k: int, multilingual: bool = False) -> list:
+        """Fuse the FAISS and BM25 rankings of query with reciprocal-rank fusion."""
+        depth = max(k, HYBRID_CANDIDATES)
+        if multilingual:
+            _, semantic_rows = self.multilingual.search(query, depth)
+        else:
+            _, semantic_rows = self._search_index(self.encode_queries([query]), depth)
+            semantic_rows = semantic_rows[0]
+        _, lexical_rows = self.lexical.search(query, depth)
+        return self._format_results(*reciprocal_rank_fusion([semantic_rows, lexical_rows], k))
+    
+    def search_batch(self, queries: List[str], k: Union[int, List[int]] = 5) -> List[list]:
+        """
+        Search for many queries with one batched encode and one FAISS search.
         
-        # Search using FAISS
-        D, I = self.index.search(query_emb, k)
+        Args:
+            queries: Texts to search for
+            k: Number of results, either one value for all queries or one per query
+            
+        Returns:
+            One list of bilingual results per query
+        """
+        if not queries:
+            return []
+        ks = [k] * len(queries) if isinstance(k, int) else list(k)
+        if len(ks) != len(queries):
+            raise ValueError(f"Got {len(ks)} k values for {len(queries)} queries")
         
-        # Format results with scores and bilingual verses
+        # Encode all queries in one forward pass (normalize for cosine similarity)
+        query_embs = self.encode_queries(queries)
+        
+        # One matrix search at the largest k, then truncate per query
+        D, I = self._search_index(query_embs, max(ks))
+        
+        return [self._format_results(D[row][:ks[row]], I[row][:ks[row]]) for row in range(len(queries))]
+    
+    def get_verse(self, verse_id: str) -> Optional[dict]:
+        """Look up one verse by its 'surah:verse' id (O(1)), None if unknown."""
+        return self.verses.get(verse_id)
+    
+    def get_verses(self, verse_ids: List[str]) -> List[Optional[dict]]:
+        """Look up several verses by id, keeping the request order (None for unknown ids)."""
+        return [self.verses.get(verse_id) for verse_id in verse_ids]
+    
+    def get_surah_verses(self, surah: int, start: Optional[int] = None, end: Optional[int] = None) -> Optional[List[dict]]:
+        """Read a contiguous range of a surah's verses (inclusive verse numbers), None if the surah is unknown."""
+        return self.verses.surah_range(surah, start, end)
+    
+    def _search_index(self, query_embs: np.ndarray, k: int):
+        """Search the index, overfetching and rescoring exactly when rescoring is enabled."""
+        with timed('faiss'):
+            if self.rescore_vectors is None:
+                return search_index(self.index, query_embs, k)
+            
+            _, candidates = search_index(self.index, query_embs, k * self.rescore_factor)
+            return rescore(query_embs, candidates, self.rescore_vectors, k)
+    
+    def _format_results(self, scores, ids) -> list:
+        """Format results with scores and bilingual verses."""
         results = []
-        for score, idx in zip(D[0], I[0]):
-            if idx < len(self.verses):  # Safety check
-                verse = self.verses[idx].copy()
+        for score, idx in zip(scores, ids):
+            if 0 <= idx < len(self.verses):  # Safety check (FAISS pads missing results with -1)
+                verse = self.verses[idx]  # Materialized on demand, already a fresh dict
                 verse['score'] = float(score)
                 results.append(verse)
             else:
-                print(f"Warning: Index {idx} is out of range for verses array")
+                logger.warning(f"Index {idx} is out of range for verses array")
         
         return results
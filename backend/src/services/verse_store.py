@@ -0,0 +1,314 @@
+"""
+Compact columnar verse store.
+
+Verses are stored column by column in one memory-mappable file: each string
+column is a UTF-8 blob plus uint32 offsets, and low-cardinality columns (such
+as surah_name) are dictionary encoded as codes into a small string table.
+Rows are only materialized as dicts for the ids a request actually returns.
+Each row's JSON encoding is also kept once computed, so responses can splice
+it in instead of encoding the same strings again (see utils/fastjson.py).
+
+File layout:
+    b'QVS1' | uint32 header length | JSON header | padding | column sections
+"""
+import functools
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'QVS1'
+VERSE_COLUMNS = ('id', 'verse_en', 'verse_ar', 'surah_name')
+ALIGNMENT = 8
+
+
+class _SectionWriter:
+    """Appends aligned numpy arrays and byte blobs, remembering their offsets."""
+    
+    def __init__(self):
+        self.data = bytearray()
+    
+    def add(self, payload: bytes) -> int:
+        self.data.extend(b'\0' * (-len(self.data) % ALIGNMENT))
+        offset = len(self.data)
+        self.data.extend(payload)
+        return offset
+
+
+def _string_table(values: Sequence[str]):
+    """Encode strings as (uint32 offsets, UTF-8 blob)."""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, b''.join(encoded)
+
+
+def encode_verse_store(verses: List[dict], columns: Sequence[str] = VERSE_COLUMNS) -> bytes:
+    """
+    Encode verse dicts into the columnar store format.
+    
+    Args:
+        verses: Verse dicts (missing keys and None values are stored as nulls)
+        columns: Columns to store, in order
+    
+    Returns:
+        File contents
+    """
+    sections = _SectionWriter()
+    header = {'rows': len(verses), 'columns': []}
+    
+    for name in columns:
+        values = [verse.get(name) for verse in verses]
+        nulls = np.array([value is None for value in values], dtype=np.uint8)
+        strings = ['' if value is None else str(value) for value in values]
+        column = {'name': name, 'nulls': sections.add(nulls.tobytes()) if nulls.any() else None}
+        
+        distinct = list(dict.fromkeys(strings))
+        if len(distinct) <= min(len(strings) // 4, 65535):
+            # Dictionary encoding: uint16 codes into a table of distinct strings
+            codes = {value: code for code, value in enumerate(distinct)}
+            offsets, blob = _string_table(distinct)
+            column.update(encoding='dict', size=len(distinct),
+                          codes=sections.add(np.array([codes[v] for v in strings], dtype=np.uint16).tobytes()))
+        else:
+            offsets, blob = _string_table(strings)
+            column.update(encoding='plain', size=len(strings))
+        
+        column['offsets'] = sections.add(offsets.tobytes())
+        column['data'] = sections.add(blob)
+        header['columns'].append(column)
+    
+    header_bytes = json.dumps(header).encode('utf-8')
+    prefix = MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+    prefix += b'\0' * (-len(prefix) % ALIGNMENT)
+    return prefix + bytes(sections.data)
+
+
+def write_verse_store(verses: List[dict], path: str, columns: Sequence[str] = VERSE_COLUMNS):
+    """Write verses to a columnar store file (via a temp file, so readers never see a partial file)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_verse_store(verses, columns))
+    os.replace(tmp_path, path)
+
+
+class _Column:
+    """Read-only view of one column inside the store buffer."""
+    
+    def __init__(self, buffer, view: memoryview, base: int, spec: dict, rows: int):
+        self.name = spec['name']
+        self.buffer = buffer
+        self.view = view
+        self.data_start = base + spec['data']
+        # memoryview casts index to plain ints without copying (cheaper per row than numpy scalars)
+        self.offsets = self._array(base + spec['offsets'], 'I', spec['size'] + 1)
+        self.nulls = self._array(base + spec['nulls'], 'B', rows) if spec['nulls'] is not None else None
+        self.codes = None
+        self.table = None
+        if spec['encoding'] == 'dict':
+            self.codes = self._array(base + spec['codes'], 'H', rows)
+            # The string table is tiny, decode it once
+            self.table = [self._decode(i) for i in range(spec['size'])]
+    
+    def _array(self, offset: int, fmt: str, count: int) -> memoryview:
+        return self.view[offset:offset + count * struct.calcsize(fmt)].cast(fmt)
+    
+    def _decode(self, position: int) -> str:
+        start = self.data_start + self.offsets[position]
+        end = self.data_start + self.offsets[position + 1]
+        return self.buffer[start:end].decode('utf-8')
+    
+    def value(self, row: int) -> Optional[str]:
+        if self.nulls is not None and self.nulls[row]:
+            return None
+        if self.table is not None:
+            return self.table[self.codes[row]]
+        return self._decode(row)
+
+
+def _editing(method):
+    """Wrap a dict method so that calling it marks the VerseResult as edited."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.edited = True
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+class VerseResult(dict):
+    """Verse dict that remembers its store row, so its JSON can come from the store's pre-encoded fragment."""
+    
+    __slots__ = ('store', 'row', 'edited')
+    
+    def __setitem__(self, key, value):
+        # Setting 'score' keeps the fragment usable; any other change means the row's JSON no longer matches
+        if key != 'score':
+            self.edited = True
+        super().__setitem__(key, value)
+    
+    __delitem__ = _editing(dict.__delitem__)
+    __ior__ = _editing(dict.__ior__)
+    clear = _editing(dict.clear)
+    pop = _editing(dict.pop)
+    popitem = _editing(dict.popitem)
+    setdefault = _editing(dict.setdefault)
+    update = _editing(dict.update)
+    
+    def json_fragment(self) -> Optional[bytes]:
+        """
+        UTF-8 JSON of this verse: the row's pre-encoded fields, plus 'score' if set.
+        
+        Returns:
+            JSON bytes, or None if the verse was changed other than by setting 'score'
+            (the dict must then be encoded normally)
+        """
+        if self.edited:
+            return None
+        score = self.get('score')
+        if score is None:
+            return self.store.fragment(self.row) + b'}' if 'score' not in self else None
+        if type(score) is not float or not math.isfinite(score):
+            return None
+        return b''.join((self.store.fragment(self.row), b',"score":', repr(score).encode('ascii'), b'}'))
+
+
+class VerseStore:
+    """Columnar, memory-mappable verse store; indexing returns a freshly materialized verse dict."""
+    
+    def __init__(self, buffer, path: Optional[str] = None):
+        """
+        Args:
+            buffer: Store contents (bytes or a read-only mmap)
+            path: Source file, if any
+        """
+        if buffer[:4] != MAGIC:
+            raise ValueError("Not a verse store file")
+        header_length = struct.unpack('<I', buffer[4:8])[0]
+        header = json.loads(buffer[8:8 + header_length].decode('utf-8'))
+        base = 8 + header_length
+        base += -base % ALIGNMENT
+        
+        self.path = path
+        self._buffer = buffer
+        self._rows = header['rows']
+        view = memoryview(buffer)
+        self._columns = [_Column(buffer, view, base, spec, self._rows) for spec in header['columns']]
+        self._getters = [(column.name, column.value) for column in self._columns]
+        self.width = len(self._columns)
+        # Row -> UTF-8 JSON of the row without the closing brace, filled on first use
+        self._fragments = {}
+        # 'surah:verse' -> row and surah -> (start row, first verse, end row), built on first lookup
+        self._lookup = None
+    
+    @classmethod
+    def open(cls, path: str) -> 'VerseStore':
+        """Memory-map a store file read-only, so all workers share the page cache."""
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, path)
+    
+    @classmethod
+    def from_verses(cls, verses: List[dict], columns: Sequence[str] = VERSE_COLUMNS) -> 'VerseStore':
+        """Build an in-memory store from verse dicts (e.g. loaded from the JSON metadata)."""
+        return cls(encode_verse_store(verses, columns))
+    
+    @property
+    def columns(self) -> List[str]:
+        return [column.name for column in self._columns]
+    
+    def __len__(self) -> int:
+        return self._rows
+    
+    def __getitem__(self, row) -> Dict[str, Optional[str]]:
+        row = int(row)
+        if row < 0:
+            row += self._rows
+        if not 0 <= row < self._rows:
+            raise IndexError(f"Verse row {row} out of range")
+        verse = VerseResult({name: value(row) for name, value in self._getters})
+        verse.store = self
+        verse.row = row
+        verse.edited = False
+        return verse
+    
+    def fragment(self, row: int) -> bytes:
+        """Compact UTF-8 JSON of a row without its closing brace, so more fields can be appended."""
+        fragment = self._fragments.get(row)
+        if fragment is None:
+            verse = {name: value(row) for name, value in self._getters}
+            fragment = json.dumps(verse, ensure_ascii=False, separators=(',', ':'))[:-1].encode('utf-8')
+            self._fragments[row] = fragment
+        return fragment
+    
+    def column(self, name: str) -> List[Optional[str]]:
+        """All values of one column."""
+        column = next(column for column in self._columns if column.name == name)
+        return [column.value(row) for row in range(self._rows)]
+    
+    def _build_lookup(self) -> Tuple[Dict[str, int], Dict[int, Tuple[int, int, int]]]:
+        """Index rows by verse id and surah. Concurrent first calls may both build it; the result is the same."""
+        if self._lookup is None:
+            rows_by_id = {}
+            surah_ranges = {}
+            for row, verse_id in enumerate(self.column('id')):
+                rows_by_id[verse_id] = row
+                surah, _, verse = verse_id.partition(':')
+                surah, verse = int(surah), int(verse)
+                start, first_verse, _ = surah_ranges.get(surah, (row, verse, row))
+                if verse - first_verse != row - start:
+                    logger.warning(f"Verse {verse_id} is not stored in order; range reads of surah {surah} may be wrong")
+                surah_ranges[surah] = (start, first_verse, row + 1)
+            self._lookup = rows_by_id, surah_ranges
+        return self._lookup
+    
+    def row_of(self, verse_id: str) -> Optional[int]:
+        """Row of a 'surah:verse' id, None if unknown."""
+        return self._build_lookup()[0].get(verse_id)
+    
+    def get(self, verse_id: str) -> Optional[Dict[str, Optional[str]]]:
+        """Verse by 'surah:verse' id, None if unknown."""
+        row = self.row_of(verse_id)
+        return None if row is None else self[row]
+    
+    def surah_range(self, surah: int, start: Optional[int] = None, end: Optional[int] = None) -> Optional[List[dict]]:
+        """
+        Contiguous verses of one surah.
+        
+        Args:
+            surah: Surah number
+            start: First verse number (inclusive), defaults to the first verse
+            end: Last verse number (inclusive), defaults to the last verse
+        
+        Returns:
+            Verses in order (empty when the range lies outside the surah), None if the surah is unknown
+        """
+        surah_ranges = self._build_lookup()[1]
+        if surah not in surah_ranges:
+            return None
+        first_row, first_verse, end_row = surah_ranges[surah]
+        start_row = first_row if start is None else max(first_row, first_row + start - first_verse)
+        stop_row = end_row if end is None else min(end_row, first_row + end - first_verse + 1)
+        return [self[row] for row in range(start_row, stop_row)]
+
+
+def load_verses(path: str) -> VerseStore:
+    """
+    Load verse metadata as a VerseStore.
+    
+    Args:
+        path: Columnar store (.bin, memory-mapped) or bilingual JSON metadata (converted in memory)
+    """
+    with open(path, 'rb') as f:
+        is_store = f.read(4) == MAGIC
+    if is_store:
+        return VerseStore.open(path)
+    
+    with open(path, encoding='utf-8') as f:
+        return VerseStore.from_verses(json.load(f))
@@ -0,0 +1,85 @@
+"""Small in-process caches shared by services and middleware."""
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of text for cache keys and word matching (Unicode NFKC, casefolded, collapsed whitespace)."""
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional TTL and hit/miss counters."""
+    
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_size: Maximum number of entries before the least recently used one is evicted
+            ttl: Seconds an entry stays valid, None for no expiry
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Store value under key, evicting the least recently used entry if full."""
+        if self.max_size <= 0:
+            return
+        
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Remove all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        """Return size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
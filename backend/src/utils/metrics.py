@@ -0,0 +1,265 @@
+"""
+Latency histograms and counters, exposed in the Prometheus text format and,
+per request, as a Server-Timing header.
+
+Stages are timed with timed(stage). Timings of the current request are kept in
+a context variable, so work submitted to a thread pool is only attributed to
+the request when it runs in a copy of the request's context (see bind_context).
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from cache hits and index searches up to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (stage, seconds) of the current request, None outside a request
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """A named metric with a value per combination of label values."""
+    
+    kind = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [per-bucket counts..., sum, count]; buckets are made cumulative when rendered
+            series = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+    
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}')
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of this process, rendered together for /api/metrics."""
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'quran_http_request_duration_seconds', 'Time until the response headers are ready, by endpoint.',
+    ('endpoint', 'method', 'status'))
+REQUESTS_IN_FLIGHT = registry.gauge(
+    'quran_http_requests_in_flight', 'Requests currently being handled, by endpoint.', ('endpoint',))
+REQUEST_ERRORS = registry.counter(
+    'quran_http_errors_total', 'Responses with a 4xx or 5xx status, by endpoint.', ('endpoint', 'status'))
+STAGE_LATENCY = registry.histogram(
+    'quran_stage_duration_seconds',
+    'Time spent in each stage (guardrails, translation, genai, encode, faiss).', ('stage',))
+STAGE_ERRORS = registry.counter(
+    'quran_stage_errors_total', 'Stages that raised an exception.', ('stage',))
+
+
+def start_request() -> contextvars.Token:
+    """Start collecting stage timings for the current request."""
+    return _request_timings.set([])
+
+
+def finish_request(token: contextvars.Token) -> List[Tuple[str, float]]:
+    """Stop collecting stage timings and return them in the order they finished."""
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def record(stage: str, seconds: float, failed: bool = False):
+    """Record a stage duration in the histogram and in the current request's timings."""
+    STAGE_LATENCY.observe(seconds, stage=stage)
+    if failed:
+        STAGE_ERRORS.inc(stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time the enclosed block as stage; exceptions are counted as stage errors."""
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        record(stage, time.perf_counter() - start, failed)
+
+
+def bind_context(function: Callable) -> Callable:
+    """Wrap function to run in a copy of the caller's context, e.g. before submitting it to an executor."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+def server_timing(timings: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """
+    Server-Timing header value, one entry per stage.
+    
+    Repeated stages (e.g. two model calls) are summed, with the count in the description.
+    """
+    durations: Dict[str, List[float]] = {}
+    for stage, seconds in timings:
+        durations.setdefault(stage, []).append(seconds)
+    entries = []
+    for stage, values in durations.items():
+        entry = f'{stage};dur={sum(values) * 1000:.1f}'
+        if len(values) > 1:
+            entry += f';desc="{len(values)}x"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _cache_counters(stats: dict) -> Dict[str, Tuple[float, float]]:
+    """(hits, misses) of each cache in AppServices.stats()."""
+    caches = {}
+    embedding_cache = (stats.get('search') or {}).get('embedding_cache')
+    if embedding_cache:
+        caches['embedding'] = (embedding_cache['hits'], embedding_cache['misses'])
+    therapy_cache = stats.get('therapy_cache')
+    if therapy_cache:
+        caches['therapy_response'] = (therapy_cache['hits'], therapy_cache['misses'])
+    guardrails = stats.get('guardrails')
+    if guardrails:
+        # Inputs that got past the verdict cache were decided by the wordlist or the validators
+        tiers = guardrails['tiers']
+        caches['guardrails_verdict'] = (tiers['cache']['decided'],
+                                        tiers['wordlist']['decided'] + tiers['validators']['decided'])
+    return caches
+
+
+def render_metrics(stats: Optional[dict] = None) -> str:
+    """
+    All metrics in the Prometheus text format.
+    
+    Args:
+        stats: Optional AppServices.stats(); its cache and GenAI counters are included
+    """
+    lines = [registry.render().rstrip('\n')]
+    if stats:
+        caches = _cache_counters(stats)
+        for name, position, documentation in (('quran_cache_hits_total', 0, 'Cache hits, by cache.'),
+                                              ('quran_cache_misses_total', 1, 'Cache misses, by cache.')):
+            lines += [f'# HELP {name} {documentation}', f'# TYPE {name} counter']
+            lines += [f'{name}{{cache="{cache}"}} {_format_value(counts[position])}'
+                      for cache, counts in caches.items()]
+        genai = stats.get('genai')
+        if genai:
+            name = 'quran_genai_events_total'
+            lines += [f'# HELP {name} GenAI calls, failures, retries, timeouts, hedges and rejections.',
+                      f'# TYPE {name} counter']
+            lines += [f'{name}{{event="{event}"}} {_format_value(genai[event])}'
+                      for event in ('calls', 'failures', 'retries', 'timeouts', 'hedges', 'hedge_wins',
+                                    'overloaded', 'short_circuited')]
+    return '\n'.join(lines) + '\n'
@@ -1,6 +1,18 @@
 """Consistent response utilities for the Flask API."""
-from flask import jsonify
+import os
+from flask import Response, jsonify
 from typing import Dict, Any, Optional
+from utils.fastjson import dumps
+
+# 'fast' (default) writes compact UTF-8 JSON with pre-encoded verses spliced in; 'flask' uses jsonify
+JSON_RESPONSES = os.getenv('JSON_RESPONSES', 'fast').lower()
+
+
+def json_response(payload: Dict[str, Any]) -> Response:
+    """Create a JSON response with the encoder selected by JSON_RESPONSES."""
+    if JSON_RESPONSES == 'flask':
+        return jsonify(payload)
+    return Response(dumps(payload), mimetype='application/json')
 
 
 class APIError:
@@ -10,6 +22,7 @@ class APIError:
     INTERNAL_ERROR = "internal_error"
     SERVICE_ERROR = "service_error"
     NOT_FOUND = "not_found"
+    UNAUTHORIZED = "unauthorized"
     
     def __init__(self, message: str, error_type: str, status_code: int = 400, details: Optional[Dict[str, Any]] = None):
         self.message = message
@@ -17,16 +30,21 @@ class APIError:
         self.status_code = status_code
         self.details = details or {}
     
-    def to_response(self):
-        """Convert to Flask JSON response."""
-        return jsonify({
+    @property
+    def payload(self) -> Dict[str, Any]:
+        """Response body, also encoded by the async routes."""
+        return {
             "success": False,
             "error": {
                 "message": self.message,
                 "type": self.error_type,
                 "details": self.details
             }
-        }), self.status_code
+        }
+    
+    def to_response(self):
+        """Convert to Flask JSON response."""
+        return json_response(self.payload), self.status_code
 
 
 class APISuccess:
@@ -36,13 +54,18 @@ class APISuccess:
         self.data = data
         self.message = message
     
-    def to_response(self):
-        """Convert to Flask JSON response."""
-        return jsonify({
+    @property
+    def payload(self) -> Dict[str, Any]:
+        """Response body, also encoded by the async routes."""
+        return {
             "success": True,
             "message": self.message,
             "data": self.data
-        }), 200
+        }
+    
+    def to_response(self):
+        """Convert to Flask JSON response."""
+        return json_response(self.payload), 200
 
 
 # Convenience functions
@@ -56,9 +79,24 @@ def internal_error(message: str = "Internal server error"):
     return APIError(message, APIError.INTERNAL_ERROR, 500).to_response()
 
 
-def service_error(message: str):
+def not_found_error(message: str, details: Optional[Dict[str, Any]] = None):
+    """Create a not found error response."""
+    return APIError(message, APIError.NOT_FOUND, 404, details).to_response()
+
+
+def unauthorized_error(message: str):
+    """Create an unauthorized error response."""
+    return APIError(message, APIError.UNAUTHORIZED, 401).to_response()
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+def service_error(message: str, details: Optional[Dict[str, Any]] = None):
     """Create a service error response."""
-    return APIError(message, APIError.SERVICE_ERROR, 503).to_response()
+    return APIError(message, APIError.SERVICE_ERROR, 503, details).to_response()
 
 
 def success_response(data: Dict[str, Any], message: str = "Success"):
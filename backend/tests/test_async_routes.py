@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pytest
+
+starlette = pytest.importorskip('starlette')
+httpx = pytest.importorskip('httpx')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from starlette.applications import Starlette
+
+from routes.api_async import create_routes
+from services import services
+from services.genai_async import AsyncGenAIService
+from services.therapy_pipeline import TherapyPipeline
+
+VERSE = {'id': '94:5', 'verse_en': 'So surely with hardship comes ease', 'surah_name': 'Ash-Sharh'}
+
+
+class FakeSearch:
+    """Search service that records its queries."""
+
+    version = 'test'
+
+    def __init__(self):
+        self.queries = []
+
+    def search(self, query, k=5, index='english'):
+        self.queries.append(query)
+        return [dict(VERSE, score=0.5)][:k]
+
+
+class FakeGuardrails:
+    """Guardrails that reject issues containing 'blocked'."""
+
+    enabled = True
+
+    def precheck(self, text):
+        return True, "ok"
+
+    def validate(self, text):
+        return ('blocked' not in text), "Input rejected"
+
+
+async def model(prompt):
+    return "Be patient"
+
+
+async def stream(prompt):
+    yield "Be "
+    yield "patient"
+
+
+@pytest.fixture
+def search(monkeypatch):
+    """Services of the async routes, with a fake model, search and guardrails."""
+    genai = AsyncGenAIService(model, stream_function=stream)
+    search = FakeSearch()
+    monkeypatch.setattr(services, '_search_service', search)
+    monkeypatch.setattr(services, '_async_genai_service', genai)
+    monkeypatch.setattr(services, '_therapy_pipeline', TherapyPipeline(None, async_genai=genai))
+    monkeypatch.setattr(services, '_guardrails_middleware', FakeGuardrails())
+    monkeypatch.setattr(services, '_response_cache', None)
+    return search
+
+
+def post(path, payload):
+    async def send():
+        transport = httpx.ASGITransport(app=Starlette(routes=create_routes()))
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.post(path, json=payload)
+    return asyncio.run(send())
+
+
+def events(body):
+    return [(block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+            for block in body.strip().split('\n\n')]
+
+
+def test_therapy_search(search):
+    response = post('/api/therapy-search', {'issue': 'I feel anxious', 'k': 1})
+
+    assert response.status_code == 200
+    data = response.json()['data']
+    assert data['ai_response'] == "Be patient"
+    assert data['results'] == [dict(VERSE, score=0.5)]
+    assert search.queries == ["Be patient"]
+    assert 'guardrails' in response.headers['Server-Timing']
+
+
+def test_rejected_and_invalid_requests(search):
+    response = post('/api/therapy-search', {'issue': 'blocked issue'})
+    assert response.status_code == 400
+    assert response.json()['error']['message'] == "Input rejected"
+
+    assert post('/api/therapy-search', {'k': 5}).status_code == 400
+    for k in ('5', 0, 1000):
+        response = post('/api/therapy-search/stream', {'issue': 'I feel anxious', 'k': k})
+        assert response.status_code == 400
+        assert response.json()['error']['message'] == 'k must be an integer between 1 and 100'
+    assert search.queries == []
+
+
+def test_therapy_search_stream(search):
+    response = post('/api/therapy-search/stream', {'issue': 'I feel anxious', 'k': 1})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    assert events(response.text) == [
+        ('token', {'text': "Be "}),
+        ('token', {'text': "patient"}),
+        ('result', {'ai_response': "Be patient", 'search_query': "Be patient", 'results': [dict(VERSE, score=0.5)]}),
+    ]
+
+
+def test_stream_started_before_a_rejection_is_closed(search, monkeypatch):
+    closed = []
+
+    async def recorded_stream(issue):
+        try:
+            yield "Be "
+            yield "patient"
+        finally:
+            closed.append(issue)
+
+    def slow_validate(text):
+        # The first chunk arrives before the issue is rejected
+        time.sleep(0.05)
+        return False, "Input rejected"
+
+    monkeypatch.setattr(services.therapy_pipeline, 'generate_stream_async', recorded_stream)
+    monkeypatch.setattr(services.guardrails_middleware, 'validate', slow_validate)
+
+    async def send():
+        transport = httpx.ASGITransport(app=Starlette(routes=create_routes()))
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            response = await client.post('/api/therapy-search/stream', json={'issue': 'blocked issue'})
+            # Checked before asyncio.run() would close the stream on shutdown
+            return response, list(closed)
+
+    response, closed_before_shutdown = asyncio.run(send())
+    assert response.status_code == 400
+    assert closed_before_shutdown == ['blocked issue']
@@ -0,0 +1,81 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services.batching import MicroBatcher
+
+
+class FakeBatchSearch:
+    """Batch function returning [query, k] per query and recording the batches it ran."""
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+        self._lock = threading.Lock()
+
+    def __call__(self, queries, ks):
+        with self._lock:
+            self.batches.append(list(queries))
+        if self.error is not None:
+            raise self.error
+        return [[query, k] for query, k in zip(queries, ks)]
+
+
+def test_concurrent_queries_are_batched_and_fanned_out():
+    search = FakeBatchSearch()
+    batcher = MicroBatcher(search, max_batch_size=8, max_wait_ms=200)
+    start = threading.Barrier(8)
+
+    def query(i):
+        start.wait()
+        return batcher.search(f"q{i}", i, timeout=5)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(query, range(8)))
+    batcher.close()
+
+    # Every caller gets its own results, whichever batch its query landed in
+    assert results == [[f"q{i}", i] for i in range(8)]
+    assert len(search.batches) < 8
+    assert sum(len(batch) for batch in search.batches) == 8
+    stats = batcher.stats()
+    assert stats['queries'] == 8 and stats['batches'] == len(search.batches)
+    assert stats['batch_size_histogram']['8'] == stats['batches']
+
+
+def test_batch_respects_the_size_limit():
+    search = FakeBatchSearch()
+    batcher = MicroBatcher(search, max_batch_size=2, max_wait_ms=200)
+
+    futures = [batcher.submit(f"q{i}", 1) for i in range(5)]
+    assert [future.result(5) for future in futures] == [[f"q{i}", 1] for i in range(5)]
+    batcher.close()
+
+    assert all(len(batch) <= 2 for batch in search.batches)
+
+
+def test_a_failing_batch_fails_every_query_in_it():
+    batcher = MicroBatcher(FakeBatchSearch(RuntimeError("index unavailable")), max_batch_size=4, max_wait_ms=200)
+
+    futures = [batcher.submit(f"q{i}", 1) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="index unavailable"):
+            future.result(5)
+    batcher.close()
+
+
+def test_queries_after_close_run_on_the_caller_thread():
+    search = FakeBatchSearch()
+    batcher = MicroBatcher(search, max_batch_size=4, max_wait_ms=1)
+    assert batcher.search("before", 1, timeout=5) == ["before", 1]
+    batcher.close()
+    batcher._worker.join(5)
+
+    assert not batcher._worker.is_alive()
+    assert batcher.search("after", 2, timeout=5) == ["after", 2]
+    assert search.batches[-1] == ["after"]
@@ -0,0 +1,164 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services import AppServices
+from services.bundle import (MANIFEST_NAME, BundleError, activate, current_version, file_sha256, load_bundle,
+                             resolve_bundle)
+
+
+def write_bundle(root, version, files=None, entries=None):
+    """A bundle directory under root with files ({name: bytes}); entries overrides manifest entries by role."""
+    files = files or {'quran_embeddings.npy': b'vectors', 'quran_metadata.json': b'[]'}
+    path = root / version
+    path.mkdir(parents=True)
+    manifest_files = {}
+    for role, (name, content) in zip(('embeddings', 'metadata'), files.items()):
+        (path / name).write_bytes(content)
+        manifest_files[role] = {'path': name, 'bytes': len(content), 'sha256': file_sha256(str(path / name))}
+    manifest_files.update(entries or {})
+    (path / MANIFEST_NAME).write_text(json.dumps({'version': version, 'model': 'test-model',
+                                                  'files': manifest_files}), encoding='utf-8')
+    return path
+
+
+def test_load_bundle_checks_sizes_and_checksums(tmp_path):
+    path = write_bundle(tmp_path, 'v1')
+    bundle = load_bundle(str(path))
+    assert bundle.version == 'v1'
+    assert bundle.file('embeddings') == os.path.join(str(path), 'quran_embeddings.npy')
+    assert bundle.file('index') is None
+
+    # Same size, different content: only the checksum notices
+    (path / 'quran_embeddings.npy').write_bytes(b'VECTORS')
+    with pytest.raises(BundleError, match='checksum mismatch'):
+        load_bundle(str(path))
+    assert load_bundle(str(path), verify=False).version == 'v1'
+
+    (path / 'quran_embeddings.npy').write_bytes(b'vector')
+    with pytest.raises(BundleError, match='has 6 bytes'):
+        load_bundle(str(path), verify=False)
+
+
+def test_missing_files_and_manifests(tmp_path):
+    with pytest.raises(BundleError, match='Unreadable bundle manifest'):
+        load_bundle(str(tmp_path))
+
+    path = write_bundle(tmp_path, 'v1')
+    (path / 'quran_metadata.json').unlink()
+    with pytest.raises(BundleError, match='is missing quran_metadata.json'):
+        load_bundle(str(path))
+
+
+@pytest.mark.parametrize('manifest', ['[]', '{"files": {}}', '{"version": "v1", "files": []}',
+                                      '{"version": "v1", "files": {"embeddings": {}}}'])
+def test_malformed_manifests(tmp_path, manifest):
+    (tmp_path / MANIFEST_NAME).write_text(manifest, encoding='utf-8')
+    with pytest.raises(BundleError):
+        load_bundle(str(tmp_path))
+
+
+@pytest.mark.parametrize('entry', [
+    'quran_embeddings.index',
+    None,
+    {'path': 'quran_embeddings.index'},
+    {'path': 'quran_embeddings.index', 'bytes': '5', 'sha256': ''},
+    {'path': ['quran_embeddings.index'], 'bytes': 5, 'sha256': ''},
+    {'path': 'quran_embeddings.index', 'bytes': 5},
+])
+def test_malformed_entries(tmp_path, entry):
+    path = write_bundle(tmp_path, 'v1', entries={'index': entry})
+    with pytest.raises(BundleError, match='malformed index entry'):
+        load_bundle(str(path))
+
+
+@pytest.mark.parametrize('file_path', ['../v0/quran_embeddings.npy', 'data/../../v0/quran_embeddings.npy',
+                                       '/etc/hostname', '', 'link/quran_embeddings.npy'])
+def test_paths_outside_the_bundle_are_rejected(tmp_path, file_path):
+    write_bundle(tmp_path, 'v0')
+    path = write_bundle(tmp_path, 'v1', entries={'index': {'path': file_path, 'bytes': 7, 'sha256': ''}})
+    os.symlink(tmp_path / 'v0', path / 'link')
+
+    with pytest.raises(BundleError, match='outside the bundle'):
+        load_bundle(str(path), verify=False)
+
+
+def test_resolve_bundle_follows_current(tmp_path):
+    write_bundle(tmp_path, 'v1')
+    write_bundle(tmp_path, 'v2')
+    with pytest.raises(BundleError, match='No active bundle'):
+        resolve_bundle(str(tmp_path))
+
+    activate(str(tmp_path), 'v2')
+    assert current_version(str(tmp_path)) == 'v2'
+    assert resolve_bundle(str(tmp_path)).version == 'v2'
+    assert resolve_bundle(str(tmp_path), 'v1').version == 'v1'
+    for version in ('..', '../v1', 'v3'):
+        with pytest.raises(BundleError):
+            resolve_bundle(str(tmp_path), version)
+
+
+class FakeSearchService:
+    """Search service for a bundle version; loading the 'broken' version fails."""
+
+    def __init__(self, bundle):
+        if bundle.version == 'broken':
+            raise RuntimeError("corrupt index")
+        self.version = bundle.version
+        self.model_name = bundle.model
+        self.encoder = object()
+        self.warmed_up = False
+        self.closed = False
+
+    def stats(self):
+        return {'version': self.version}
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def app_services(tmp_path, monkeypatch):
+    """Services loaded from bundle v1 under tmp_path, with fake search services."""
+    monkeypatch.setattr(AppServices, '_create_search_service',
+                        lambda self, bundle, previous=None: FakeSearchService(bundle))
+    write_bundle(tmp_path, 'v1')
+    activate(str(tmp_path), 'v1')
+    app_services = AppServices()
+    assert app_services.initialize_search_bundle(str(tmp_path))
+    return app_services
+
+
+@pytest.mark.parametrize('version, entries', [
+    ('malformed', {'index': {'path': 'quran_embeddings.index'}}),
+    ('escaping', {'index': {'path': '../v1/quran_embeddings.npy', 'bytes': 7, 'sha256': ''}}),
+    ('broken', None),
+])
+def test_failed_reload_keeps_the_old_version(tmp_path, app_services, version, entries):
+    write_bundle(tmp_path, version, entries=entries)
+    activate(str(tmp_path), version)
+    old_service = app_services.search
+
+    with pytest.raises((BundleError, RuntimeError)):
+        app_services.reload_search_service()
+
+    assert app_services.search is old_service and not old_service.closed
+    bundle_stats = app_services.stats()['bundle']
+    assert bundle_stats['version'] == 'v1'
+    assert bundle_stats['reloads']['failed'] == 1
+
+
+def test_reload_switches_versions(tmp_path, app_services):
+    old_service = app_services.search
+    write_bundle(tmp_path, 'v2')
+
+    reloaded = app_services.reload_search_service('v2')
+
+    assert reloaded['version'] == 'v2' and reloaded['previous_version'] == 'v1'
+    assert app_services.search.version == 'v2'
+    assert old_service.closed
+    assert app_services.stats()['bundle']['reloads']['succeeded'] == 1
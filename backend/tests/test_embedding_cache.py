@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services.embedding_cache import EmbeddingCache, SqliteEmbeddingStore, encode_cached
+from utils.cache import LRUCache
+
+
+class FakeEncoder:
+    """Encoder that records the texts it is asked to encode."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_entries_expire_after_the_ttl():
+    cache = LRUCache(max_size=2, ttl=0.05)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+
+    assert cache.get('a', 'gone') == 'gone'
+    assert cache.stats()['expirations'] == 1
+    assert len(cache) == 0
+
+
+def test_encode_cached_encodes_each_normalized_text_once():
+    encoder, cache = FakeEncoder(), EmbeddingCache()
+
+    first = encode_cached(encoder, cache, ['Peace', ' peace ', 'patience'])
+    second = encode_cached(encoder, cache, ['PEACE'])
+
+    assert encoder.calls == [['Peace', 'patience']]
+    np.testing.assert_array_equal(first[0], first[1])
+    np.testing.assert_array_equal(second[0], first[0])
+
+
+def test_case_sensitive_cache_keeps_cased_texts_apart():
+    encoder, cache = FakeEncoder(), EmbeddingCache(case_sensitive=True)
+
+    encode_cached(encoder, cache, ['Paix', ' Paix ', 'paix'])
+
+    assert encoder.calls == [['Paix', 'paix']]
+
+
+def test_store_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / 'embeddings.sqlite')
+    encoder = FakeEncoder()
+    encode_cached(encoder, EmbeddingCache(store=SqliteEmbeddingStore(path), namespace='m'), ['peace'])
+
+    other = EmbeddingCache(store=SqliteEmbeddingStore(path), namespace='m')
+    encode_cached(encoder, other, ['peace'])
+    assert len(encoder.calls) == 1
+    assert other.stats()['store_hits'] == 1
+
+    # Another model's namespace never sees these embeddings
+    encode_cached(encoder, EmbeddingCache(store=SqliteEmbeddingStore(path), namespace='n'), ['peace'])
+    assert len(encoder.calls) == 2
+
+
+def test_store_skips_expired_rows(tmp_path):
+    store = SqliteEmbeddingStore(str(tmp_path / 'embeddings.sqlite'), ttl=0.05)
+    store.put_many({'k': np.ones(2, dtype=np.float32)})
+    assert set(store.get_many(['k'])) == {'k'}
+    time.sleep(0.1)
+
+    assert store.get_many(['k']) == {}
+
+
+def test_store_opens_nothing_until_used(tmp_path):
+    path = tmp_path / 'embeddings.sqlite'
+    store = SqliteEmbeddingStore(str(path))
+    assert not path.exists()
+
+    store.put_many({'k': np.ones(2, dtype=np.float32)})
+    assert path.exists()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+def test_forked_worker_opens_its_own_connection(tmp_path):
+    store = SqliteEmbeddingStore(str(tmp_path / 'embeddings.sqlite'))
+    store.put_many({'parent': np.ones(2, dtype=np.float32)})
+    parent_connection = store._connection()
+
+    pid = os.fork()
+    if pid == 0:
+        # Exit codes report the child's checks back to the parent
+        ok = store._connection() is not parent_connection and 'parent' in store.get_many(['parent'])
+        store.put_many({'child': np.zeros(2, dtype=np.float32)})
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert store._connection() is parent_connection
+    assert set(store.get_many(['parent', 'child'])) == {'parent', 'child'}
@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services.verse_store import VerseStore
+from utils import fastjson
+
+VERSES = [
+    {'id': '2:286', 'verse_en': 'Allah does not burden a soul beyond that it can bear',
+     'verse_ar': 'لَا يُكَلِّفُ ٱللَّهُ نَفْسًا', 'surah_name': 'Al-Baqarah'},
+    {'id': '94:5', 'verse_en': 'So surely with "hardship" comes ease\n', 'verse_ar': None, 'surah_name': 'Ash-Sharh'},
+]
+
+
+@pytest.fixture(params=['orjson', 'fragments'])
+def encoder(request, monkeypatch):
+    """fastjson.dumps with orjson, and with the pure-Python fragment splicing."""
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+        monkeypatch.setattr(fastjson, 'ORJSON_AVAILABLE', True)
+    else:
+        monkeypatch.setattr(fastjson, 'ORJSON_AVAILABLE', False)
+    return fastjson.dumps
+
+
+def reference(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def search_response():
+    store = VerseStore.from_verses(VERSES)
+    results = []
+    for row, score in ((0, 0.8125), (1, 0.5)):
+        verse = store[row]
+        verse['score'] = score
+        results.append(verse)
+    return {'success': True, 'data': {'query': 'بالقلق', 'results': results, 'count': 2, 'nested': [[1, 2.5], None]}}
+
+
+def test_matches_json_dumps(encoder):
+    payload = search_response()
+    assert encoder(payload) == reference(payload)
+
+
+def test_non_ascii_text_is_not_escaped(encoder):
+    assert encoder({'verse_ar': 'نَفْسًا'}) == '{"verse_ar":"نَفْسًا"}'.encode('utf-8')
+
+
+def test_non_string_keys_are_converted(encoder):
+    payload = {1: 'a', False: 'b', None: 'c'}
+    assert encoder(payload) == reference(payload)
+
+
+def test_edited_verses_are_encoded_from_the_dict(encoder):
+    payload = search_response()
+    verse = payload['data']['results'][0]
+    verse['verse_en'] = 'edited'
+    verse['note'] = 'added'
+
+    assert json.loads(encoder(payload))['data']['results'][0] == dict(verse)
+
+
+def test_unencodable_values_raise(encoder):
+    with pytest.raises(TypeError):
+        encoder({'value': object()})
@@ -0,0 +1,302 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services.genai import GenAIService
+from services.genai_async import AsyncGenAIService
+from services.resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceededError, OverloadedError,
+                                 is_transient_error)
+
+
+class FakeModel:
+    """Model function that replays a script of delays and errors, one entry per call."""
+
+    def __init__(self, script=(), delay=0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.calls += 1
+            step = self.script.pop(0) if self.script else self.delay
+        if isinstance(step, Exception):
+            raise step
+        time.sleep(step)
+        return f"reply to {prompt}"
+
+
+def test_retries_transient_errors():
+    model = FakeModel([Exception("503 Service Unavailable"), Exception("429 Resource exhausted"), 0.0])
+    genai = GenAIService(model, max_retries=2, retry_base_delay=0.01)
+
+    assert genai.generate("hi") == "reply to hi"
+    assert model.calls == 3
+    assert genai.stats()['retries'] == 2
+
+
+def test_does_not_retry_permanent_errors():
+    model = FakeModel([ValueError("400 Invalid argument: prompt blocked")])
+    genai = GenAIService(model, max_retries=3, retry_base_delay=0.01)
+
+    with pytest.raises(ValueError):
+        genai.generate("hi")
+    assert model.calls == 1
+    assert not is_transient_error(ValueError("400 Invalid argument"))
+
+
+class UpstreamError(Exception):
+    """Upstream error with an HTTP status, like google.api_core's GoogleAPICallError."""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+def wrapped(error):
+    """error as GeminiService raises it: a bare Exception raised from the upstream error."""
+    try:
+        raise Exception(f"Failed to generate response from Gemini: {error}") from error
+    except Exception as wrapper:
+        return wrapper
+
+
+@pytest.mark.parametrize('error, transient', [
+    (wrapped(UpstreamError("503 The model is overloaded", 503)), True),
+    (wrapped(UpstreamError("429 Resource has been exhausted", 429)), True),
+    # A status code decides, whatever the message says
+    (wrapped(UpstreamError("400 Request timeout must be positive", 400)), False),
+    (wrapped(UpstreamError("500 internal", 500)), True),
+    (wrapped(TimeoutError("read timed out")), True),
+    # Without a status code, only whole status numbers and transient phrases count
+    (Exception("Failed to generate response from Gemini: 400 prompt exceeds 1500 tokens"), False),
+    (Exception("400 Invalid connection_id"), False),
+    (Exception("503 Service Unavailable"), True),
+    (Exception("Connection reset by peer"), True),
+])
+def test_transient_errors_are_classified_by_cause(error, transient):
+    assert is_transient_error(error) is transient
+
+
+def test_timeout_fails_fast_and_keeps_the_slot_until_the_call_returns():
+    model = FakeModel([0.3])
+    genai = GenAIService(model, timeout=0.05, max_in_flight=1, queue_timeout=0.0)
+
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceededError):
+        genai.generate("slow")
+    assert time.perf_counter() - start < 0.2
+
+    # The abandoned call still occupies the only slot
+    with pytest.raises(OverloadedError):
+        genai.generate("next")
+    time.sleep(0.35)
+    assert genai.generate("later") == "reply to later"
+
+
+def test_deadline_bounds_retries():
+    model = FakeModel(delay=0.1)
+    genai = GenAIService(model, timeout=0.05, deadline=0.2, max_retries=10, retry_base_delay=0.01)
+
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceededError):
+        genai.generate("slow")
+    assert time.perf_counter() - start < 0.35
+
+
+def test_hedged_request_wins_over_a_slow_primary():
+    model = FakeModel([0.5, 0.0])
+    genai = GenAIService(model, hedge_after=0.05, max_in_flight=4)
+
+    start = time.perf_counter()
+    assert genai.generate("hi") == "reply to hi"
+    assert time.perf_counter() - start < 0.3
+    stats = genai.stats()
+    assert stats['hedges'] == 1 and stats['hedge_wins'] == 1
+
+
+def test_circuit_breaker_opens_and_recovers():
+    model = FakeModel([Exception("503 unavailable")] * 3)
+    genai = GenAIService(model, circuit_breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.1))
+
+    for _ in range(3):
+        with pytest.raises(Exception):
+            genai.generate("hi")
+    with pytest.raises(CircuitOpenError):
+        genai.generate("hi")
+    assert model.calls == 3
+
+    time.sleep(0.15)
+    assert genai.circuit_breaker.state == 'half_open'
+    assert genai.generate("probe") == "reply to probe"
+    assert genai.circuit_breaker.state == 'closed'
+
+
+def test_stream_falls_back_without_stream_support():
+    def unsupported(prompt):
+        raise NotImplementedError("no streaming")
+        yield
+
+    genai = GenAIService(FakeModel(), stream_function=unsupported)
+    assert list(genai.generate_stream("hi")) == ["reply to hi"]
+    assert list(GenAIService(FakeModel()).generate_stream("hi")) == ["reply to hi"]
+
+
+def test_closing_a_half_open_stream_gives_back_the_probe():
+    def chunks(prompt):
+        yield "a "
+        yield "b"
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    genai = GenAIService(FakeModel([Exception("503 unavailable")]), stream_function=chunks, circuit_breaker=breaker)
+    with pytest.raises(Exception):
+        genai.generate("hi")
+    time.sleep(0.1)
+    assert breaker.state == 'half_open'
+
+    stream = genai.generate_stream("hi")
+    assert next(stream) == "a "
+    # The client disconnects while the stream holds the half-open probe
+    stream.close()
+    assert genai.generate("next") == "reply to next"
+    assert breaker.state == 'closed'
+
+
+def test_stalled_stream_times_out():
+    def stalls(prompt):
+        yield "a "
+        time.sleep(0.5)
+        yield "b"
+
+    genai = GenAIService(FakeModel(), stream_function=stalls, timeout=0.05, max_in_flight=1, queue_timeout=1.0)
+    stream = genai.generate_stream("hi")
+    assert next(stream) == "a "
+    with pytest.raises(DeadlineExceededError):
+        next(stream)
+    assert genai.stats()['timeouts'] == 1
+    # The slot is freed once the stalled stream function returns
+    time.sleep(0.5)
+    assert genai.generate("next") == "reply to next"
+
+
+def test_permanent_errors_do_not_open_the_circuit():
+    model = FakeModel([ValueError("400 Invalid argument: prompt blocked")] * 3)
+    genai = GenAIService(model, circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            genai.generate("blocked")
+    assert genai.circuit_breaker.state == 'closed'
+    assert genai.generate("fine") == "reply to fine"
+
+class AsyncFakeModel(FakeModel):
+    """FakeModel as a coroutine function; counts the calls that were cancelled."""
+
+    cancelled = 0
+
+    async def __call__(self, prompt):
+        with self._lock:
+            self.calls += 1
+            step = self.script.pop(0) if self.script else self.delay
+        if isinstance(step, Exception):
+            raise step
+        try:
+            await asyncio.sleep(step)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"reply to {prompt}"
+
+
+def test_async_retries_transient_errors():
+    model = AsyncFakeModel([Exception("503 Service Unavailable"), 0.0])
+    genai = AsyncGenAIService(model, max_retries=2, retry_base_delay=0.01)
+
+    assert asyncio.run(genai.generate("hi")) == "reply to hi"
+    assert model.calls == 2
+    assert genai.stats()['retries'] == 1
+
+
+def test_async_timeout_cancels_the_call_and_frees_its_slot():
+    async def scenario():
+        model = AsyncFakeModel([0.3])
+        genai = AsyncGenAIService(model, timeout=0.05, max_in_flight=1, queue_timeout=0.0)
+        with pytest.raises(DeadlineExceededError):
+            await genai.generate("slow")
+        await asyncio.sleep(0.01)
+        # Unlike a thread, the timed-out call does not keep running
+        assert model.cancelled == 1
+        assert await genai.generate("next") == "reply to next"
+
+    asyncio.run(scenario())
+
+
+def test_async_hedged_request_wins_and_the_slow_primary_is_cancelled():
+    model = AsyncFakeModel([0.5, 0.0])
+    genai = AsyncGenAIService(model, hedge_after=0.05, max_in_flight=4)
+
+    start = time.perf_counter()
+    assert asyncio.run(genai.generate("hi")) == "reply to hi"
+    assert time.perf_counter() - start < 0.3
+    assert genai.stats()['hedge_wins'] == 1 and model.cancelled == 1
+
+
+def test_async_concurrent_calls_do_not_need_threads():
+    async def scenario():
+        genai = AsyncGenAIService(AsyncFakeModel(delay=0.2), max_in_flight=500)
+        return await asyncio.gather(*(genai.generate(str(i)) for i in range(500)))
+
+    start = time.perf_counter()
+    assert len(asyncio.run(scenario())) == 500
+    assert time.perf_counter() - start < 1.5
+
+
+def test_async_stream_wraps_a_blocking_stream_function():
+    def chunks(prompt):
+        yield "a "
+        yield "b"
+
+    async def collect(genai):
+        return [chunk async for chunk in genai.generate_stream("hi")]
+
+    assert asyncio.run(collect(AsyncGenAIService(AsyncFakeModel(), stream_function=chunks))) == ["a ", "b"]
+    assert asyncio.run(collect(AsyncGenAIService(AsyncFakeModel()))) == ["reply to hi"]
+
+
+def test_async_stalled_stream_times_out():
+    async def stalls(prompt):
+        yield "a "
+        await asyncio.sleep(0.5)
+        yield "b"
+
+    async def scenario():
+        genai = AsyncGenAIService(AsyncFakeModel(), stream_function=stalls, timeout=0.05)
+        stream = genai.generate_stream("hi")
+        assert await stream.__anext__() == "a "
+        with pytest.raises(DeadlineExceededError):
+            await stream.__anext__()
+        return genai.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['timeouts'] == 1 and stats['failures'] == 1
+
+
+def test_async_permanent_errors_do_not_open_the_circuit():
+    model = AsyncFakeModel([ValueError("400 Invalid argument: prompt blocked")] * 3)
+    genai = AsyncGenAIService(model, circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await genai.generate("blocked")
+        return await genai.generate("fine")
+
+    assert asyncio.run(scenario()) == "reply to fine"
+    assert genai.circuit_breaker.state == 'closed'
@@ -0,0 +1,58 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from middleware import guardrails
+from middleware.guardrails import GuardrailsMiddleware
+
+ISSUE = "I feel anxious about my future"
+
+
+class FakeGuard:
+    """Guard whose validators accept everything."""
+
+    def validate(self, text):
+        return text
+
+
+@pytest.fixture
+def slow_load(monkeypatch):
+    """Validators that load in the background until the returned event is set."""
+    loaded = threading.Event()
+
+    def create_guard(self):
+        loaded.wait(5)
+        return FakeGuard()
+
+    monkeypatch.setattr(guardrails, 'GUARDRAILS_AVAILABLE', True)
+    monkeypatch.setattr(GuardrailsMiddleware, '_create_guard', create_guard)
+    monkeypatch.setenv('GUARDRAILS_LOAD', 'background')
+    monkeypatch.setenv('GUARDRAILS_LOAD_TIMEOUT', '0.05')
+    monkeypatch.delenv('GUARDRAILS_ENABLED', raising=False)
+    yield loaded
+    loaded.set()
+
+
+def test_inputs_are_rejected_while_the_validators_load(slow_load):
+    middleware = GuardrailsMiddleware()
+
+    is_valid, reason = middleware.validate(ISSUE)
+    assert not is_valid and 'starting up' in reason
+    assert middleware.state == 'loading' and not middleware.ready
+    assert middleware.stats()['rejected_while_loading'] == 1
+
+    slow_load.set()
+    assert middleware._loaded.wait(5)
+    assert middleware.validate(ISSUE) == (True, "Input validation passed")
+
+
+def test_without_guardrails_installed_inputs_are_accepted(monkeypatch):
+    monkeypatch.setattr(guardrails, 'GUARDRAILS_AVAILABLE', False)
+    middleware = GuardrailsMiddleware()
+
+    assert middleware.validate(ISSUE) == (True, "Guardrails disabled")
+    assert middleware.state == 'disabled'
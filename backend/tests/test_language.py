@@ -0,0 +1,94 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from middleware.language import detect_language, is_english
+from middleware.translation import TranslationMiddleware
+
+
+@pytest.mark.parametrize('text, language', [
+    ("I feel anxious and lonely, what should I do?", 'en'),
+    ("I am so tired of everything", 'en'),
+    ("je me sens très seul", 'fr'),
+    ("Me siento perdido y triste", 'es'),
+    ("Ich fühle mich so allein", 'de'),
+    ("Mi sento molto solo", 'it'),
+    ("Eu me sinto muito sozinho", 'pt'),
+    ("Ik voel me heel alleen", 'nl'),
+    ("Kendimi çok yalnız hissediyorum", 'tr'),
+    ("Saya merasa sangat sendiri", 'id'),
+    ("أشعر بالقلق", 'ar'),
+    ("Мне очень одиноко", 'ru'),
+    ("私はとても寂しい", 'ja'),
+])
+def test_detects_the_language(text, language):
+    detected, confidence = detect_language(text)
+    assert detected == language
+    assert 0.3 <= confidence <= 1.0
+
+
+def test_text_without_letters_is_unknown():
+    assert detect_language("12345 !!!") == ('unknown', 0.0)
+    assert detect_language("") == ('unknown', 0.0)
+
+
+def test_only_confident_english_counts_as_english():
+    assert is_english("I feel anxious and lonely, what should I do?")
+    # Too few function words to be sure; translation is the safe side
+    assert not is_english("Help me find peace")
+    # Mostly English, but the Arabic part still needs translating
+    assert not is_english("I feel لوحدي")
+    assert not is_english("je me sens très seul")
+
+
+@pytest.mark.parametrize('text', [
+    "Hindi ako makatulog dahil sobrang lungkot ko at nag-iisa, ano ang gagawin ko?",
+    "Jestem bardzo samotny i smutny",
+    "Ina jin kadaici a yau",
+])
+def test_unlisted_latin_languages_are_not_english(text):
+    # One shared short word ('at', 'i', 'a') is not enough evidence for English
+    assert detect_language(text) == ('unknown', 0.0)
+    assert not is_english(text)
+
+
+def test_short_english_needs_two_function_words():
+    assert is_english("I need help")
+    assert detect_language("patience in hardship") == ('unknown', 0.0)
+
+
+class FakeTranslator:
+    """Model service that records its prompts."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        return "translated"
+
+
+def test_translation_skips_english(monkeypatch):
+    monkeypatch.delenv('TRANSLATION_ENABLED', raising=False)
+    monkeypatch.delenv('TRANSLATION_DETECT_LANGUAGE', raising=False)
+    translator = FakeTranslator()
+    middleware = TranslationMiddleware(translator, lambda text: f"translate: {text}")
+
+    assert middleware.process("I feel anxious and lonely, what should I do?") == \
+        "I feel anxious and lonely, what should I do?"
+    assert middleware.process("je me sens très seul") == "translated"
+    assert translator.prompts == ["translate: je me sens très seul"]
+    stats = middleware.stats()
+    assert stats['skipped_english'] == 1 and stats['translated'] == 1
+
+
+def test_language_detection_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv('TRANSLATION_DETECT_LANGUAGE', 'false')
+    translator = FakeTranslator()
+    middleware = TranslationMiddleware(translator, lambda text: text)
+
+    middleware.process("I feel anxious and lonely, what should I do?")
+    assert len(translator.prompts) == 1
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services.lexical_search import (LexicalIndex, normalize_arabic, parse_phrase, reciprocal_rank_fusion,
+                                     tokenize)
+
+VERSES = [
+    {'id': '1:1', 'verse_en': 'In the name of Allah, the Most Compassionate, the Most Merciful',
+     'verse_ar': 'بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ'},
+    {'id': '1:2', 'verse_en': 'All praise is for Allah, Lord of all worlds',
+     'verse_ar': 'ٱلْحَمْدُ لِلَّهِ رَبِّ ٱلْعَٰلَمِينَ'},
+    {'id': '2:153', 'verse_en': 'Seek help through patience and prayer. Allah is with the patient',
+     'verse_ar': 'ٱسْتَعِينُوا۟ بِٱلصَّبْرِ وَٱلصَّلَوٰةِ'},
+    {'id': '94:5', 'verse_en': 'So surely with hardship comes ease', 'verse_ar': 'فَإِنَّ مَعَ ٱلْعُسْرِ يُسْرًا'},
+    {'id': '94:6', 'verse_en': 'Surely with that hardship comes more ease', 'verse_ar': 'إِنَّ مَعَ ٱلْعُسْرِ يُسْرًا'},
+]
+
+
+def ids(rows):
+    return [VERSES[row]['id'] for row in rows]
+
+
+def test_arabic_normalization():
+    assert normalize_arabic('ٱلرَّحْمَٰنِ') == 'الرحمن'
+    assert normalize_arabic('ٱلْعَٰلَمِينَ', 'ا') == 'العالمين'
+    assert normalize_arabic('أَمْرٌ إِلَى آيَةٍ') == 'امر الي ايه'
+    assert normalize_arabic('Peace') == 'Peace'
+    assert tokenize('Lord of ALL worlds') == ['lord', 'of', 'all', 'worlds']
+
+
+def test_bm25_ranks_the_rarer_term_higher():
+    index = LexicalIndex(VERSES)
+    scores, rows = index.search('patience', 3)
+    assert ids(rows) == ['2:153']
+
+    scores, rows = index.search('hardship ease', 5)
+    assert sorted(ids(rows)[:2]) == ['94:5', '94:6']
+    assert list(scores) == sorted(scores, reverse=True)
+    assert index.search('nonexistent', 3)[1].size == 0
+
+
+def test_unvowelled_arabic_matches_vowelled_verses():
+    index = LexicalIndex(VERSES)
+    assert ids(index.search('الرحمن الرحيم', 1)[1]) == ['1:1']
+    # Both modern spellings of a superscript-alef word are indexed
+    assert ids(index.search('العالمين', 1)[1]) == ['1:2']
+    assert ids(index.search('العلمين', 1)[1]) == ['1:2']
+
+
+def test_phrase_search_needs_consecutive_words():
+    index = LexicalIndex(VERSES)
+    assert parse_phrase('"lord of all worlds"') == 'lord of all worlds'
+    assert parse_phrase('“with hardship”') == 'with hardship'
+    assert parse_phrase('lord of all worlds') is None
+
+    assert ids(index.search_phrase('lord of all worlds', 5)[1]) == ['1:2']
+    assert ids(index.search_phrase('with hardship', 5)[1]) == ['94:5']
+    assert index.search_phrase('worlds of lord', 5)[1].size == 0
+    assert sorted(ids(index.search_phrase('مع العسر', 5)[1])) == ['94:5', '94:6']
+    assert ids(index.search_phrase('رب العالمين', 5)[1]) == ['1:2']
+
+
+def test_reciprocal_rank_fusion():
+    scores, rows = reciprocal_rank_fusion([np.array([3, 1, 2]), np.array([1, 4, -1])], k=3, rrf_k=60)
+
+    # Row 1 is ranked by both lists, so it beats row 3, ranked first by only one
+    assert rows.tolist() == [1, 3, 4]
+    assert scores[0] == np.float32(1 / 62 + 1 / 61)
+    assert scores[1] == np.float32(1 / 61)
+    assert -1 not in rows
@@ -0,0 +1,87 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from utils import metrics
+from utils.metrics import MetricsRegistry
+
+
+def test_counter_and_gauge_rendering():
+    registry = MetricsRegistry()
+    errors = registry.counter('test_errors_total', 'Errors.', ('endpoint', 'status'))
+    in_flight = registry.gauge('test_in_flight', 'In flight.', ('endpoint',))
+    errors.inc(endpoint='api.search', status=500)
+    errors.inc(2, endpoint='api.search', status=500)
+    in_flight.inc(endpoint='a"b')
+    in_flight.dec(endpoint='a"b')
+
+    assert registry.render().splitlines() == [
+        '# HELP test_errors_total Errors.',
+        '# TYPE test_errors_total counter',
+        'test_errors_total{endpoint="api.search",status="500"} 3',
+        '# HELP test_in_flight In flight.',
+        '# TYPE test_in_flight gauge',
+        'test_in_flight{endpoint="a\\"b"} 0',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram('test_seconds', 'Latency.', ('stage',), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(seconds, stage='genai')
+
+    assert registry.render().splitlines()[2:] == [
+        'test_seconds_bucket{stage="genai",le="0.1"} 1',
+        'test_seconds_bucket{stage="genai",le="1"} 3',
+        'test_seconds_bucket{stage="genai",le="+Inf"} 4',
+        'test_seconds_sum{stage="genai"} 4.25',
+        'test_seconds_count{stage="genai"} 4',
+    ]
+
+
+def test_request_timings_follow_the_context():
+    token = metrics.start_request()
+    with metrics.timed('encode'):
+        pass
+    with ThreadPoolExecutor(1) as pool:
+        # Only work run in a copy of the request's context counts for the request
+        pool.submit(metrics.bind_context(metrics.record), 'genai', 0.5).result()
+        pool.submit(metrics.record, 'genai', 0.25).result()
+    timings = metrics.finish_request(token)
+
+    assert [stage for stage, _ in timings] == ['encode', 'genai']
+
+
+def test_failed_stages_are_counted():
+    before = metrics.STAGE_ERRORS._values.get(('test_stage',), 0)
+    with pytest.raises(ValueError):
+        with metrics.timed('test_stage'):
+            raise ValueError("boom")
+    assert metrics.STAGE_ERRORS._values[('test_stage',)] == before + 1
+
+
+def test_server_timing_sums_repeated_stages():
+    header = metrics.server_timing([('genai', 0.5), ('encode', 0.01), ('genai', 0.25)], total=0.8)
+    assert header == 'genai;dur=750.0;desc="2x", encode;dur=10.0, total;dur=800.0'
+
+
+def test_render_metrics_includes_cache_and_genai_counters():
+    stats = {
+        'search': {'embedding_cache': {'hits': 7, 'misses': 3}},
+        'therapy_cache': {'hits': 1, 'misses': 4},
+        'guardrails': {'tiers': {'cache': {'decided': 5}, 'wordlist': {'decided': 1}, 'validators': {'decided': 2}}},
+        'genai': {'calls': 10, 'failures': 1, 'retries': 2, 'timeouts': 0, 'hedges': 3, 'hedge_wins': 1,
+                  'overloaded': 0, 'short_circuited': 0},
+    }
+    lines = metrics.render_metrics(stats).splitlines()
+
+    assert 'quran_cache_hits_total{cache="embedding"} 7' in lines
+    assert 'quran_cache_misses_total{cache="therapy_response"} 4' in lines
+    assert 'quran_cache_misses_total{cache="guardrails_verdict"} 3' in lines
+    assert 'quran_genai_events_total{event="hedges"} 3' in lines
+    assert '# TYPE quran_stage_duration_seconds histogram' in lines
@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services.response_cache import SemanticResponseCache, create_response_cache
+from services.therapy_search import cached_therapy_response
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeSearch:
+    """Search service whose encoder maps every issue to the same direction."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode_queries(self, queries):
+        self.encoded.extend(queries)
+        return np.stack([unit(1, 0, 0)] * len(queries))
+
+
+def test_similar_issues_share_a_response():
+    cache = SemanticResponseCache(threshold=0.9, max_size=4)
+    cache.put(unit(1, 0, 0), {'ai_response': 'a'})
+
+    assert cache.get(unit(1, 0.1, 0)) == {'ai_response': 'a'}
+    assert cache.get(unit(1, 1, 0)) is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_a_similar_issue_replaces_the_entry_and_the_oldest_is_evicted():
+    cache = SemanticResponseCache(threshold=0.9, max_size=2)
+    cache.put(unit(1, 0, 0), 1)
+    cache.put(unit(1, 0.01, 0), 2)
+    assert len(cache) == 1 and cache.get(unit(1, 0, 0)) == 2
+
+    cache.put(unit(0, 1, 0), 3)
+    cache.get(unit(1, 0, 0))
+    cache.put(unit(0, 0, 1), 4)
+    assert cache.get(unit(0, 1, 0)) is None
+    assert cache.get(unit(1, 0, 0)) == 2
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire():
+    cache = SemanticResponseCache(threshold=0.9, max_size=2, ttl=0.05)
+    cache.put(unit(1, 0, 0), 1)
+    time.sleep(0.1)
+
+    assert cache.get(unit(1, 0, 0)) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_snapshots_are_only_loaded_by_the_same_encoder(tmp_path):
+    path = str(tmp_path / 'cache.npz')
+    cache = SemanticResponseCache(threshold=0.9, snapshot_path=path, namespace='model-a')
+    cache.put(unit(1, 0, 0), {'ai_response': 'a'})
+    cache.save()
+
+    assert SemanticResponseCache(snapshot_path=path, namespace='model-a').get(unit(1, 0, 0)) == {'ai_response': 'a'}
+    assert len(SemanticResponseCache(snapshot_path=path, namespace='model-b')) == 0
+
+
+def test_snapshots_do_not_store_issue_text(tmp_path):
+    path = str(tmp_path / 'cache.npz')
+    cache = SemanticResponseCache(threshold=0.9, snapshot_path=path)
+    cache.put(unit(1, 0, 0), {'ai_response': 'a'})
+    cache.save()
+
+    with np.load(path) as snapshot:
+        entries = json.loads(str(snapshot['meta']))['entries']
+    assert [sorted(entry) for entry in entries] == [['created', 'last_used', 'value']]
+
+
+def test_only_one_process_saves_a_shared_snapshot(tmp_path):
+    pytest.importorskip('fcntl')
+    path = str(tmp_path / 'cache.npz')
+    first = SemanticResponseCache(threshold=0.9, snapshot_path=path, save_every=1)
+    # Another worker's cache: its lock file handle is separate, like another process's
+    second = SemanticResponseCache(threshold=0.9, snapshot_path=path, save_every=1)
+    first.put(unit(1, 0, 0), 'first')
+    second.put(unit(0, 1, 0), 'second')
+
+    loaded = SemanticResponseCache(threshold=0.9, snapshot_path=path)
+    assert loaded.get(unit(1, 0, 0)) == 'first'
+    assert loaded.get(unit(0, 1, 0)) is None
+
+
+def test_cache_is_opt_in(monkeypatch):
+    monkeypatch.delenv('THERAPY_CACHE_SIZE', raising=False)
+    assert create_response_cache() is None
+
+    monkeypatch.setenv('THERAPY_CACHE_SIZE', '10')
+    assert create_response_cache().max_size == 10
+
+
+@pytest.mark.parametrize('issue', ["أشعر بالقلق", "Je me sens très seul et perdu", "I feel لوحدي"])
+def test_non_english_issues_are_not_cached(issue):
+    cache, search = SemanticResponseCache(threshold=0.9), FakeSearch()
+    cache.put(unit(1, 0, 0), {'ai_response': 'not yours'})
+
+    assert cached_therapy_response(search, cache, issue) == (None, None)
+    assert search.encoded == []
+
+
+def test_english_issues_are_looked_up():
+    cache, search = SemanticResponseCache(threshold=0.9), FakeSearch()
+    cache.put(unit(1, 0, 0), {'ai_response': 'a'})
+
+    cached, embedding = cached_therapy_response(search, cache, "I am worried about what the future holds for me")
+    assert cached == {'ai_response': 'a'}
+    np.testing.assert_array_equal(embedding, unit(1, 0, 0))
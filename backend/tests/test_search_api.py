@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from routes.api import bp
+from services import services
+from services.therapy_pipeline import TherapyPipeline
+
+
+class FakeSearch:
+    """Search service that records the k of each search."""
+
+    def __init__(self):
+        self.ks = []
+
+    def route(self, query, index):
+        return 'english'
+
+    def search(self, query, k=5, mode='semantic', index='english'):
+        self.ks.append(k)
+        return []
+
+    def search_batch(self, queries, ks):
+        self.ks.extend(ks)
+        return [[] for _ in queries]
+
+
+@pytest.fixture
+def search(monkeypatch):
+    monkeypatch.delenv('SEARCH_MAX_K', raising=False)
+    search = FakeSearch()
+    monkeypatch.setattr(services, '_search_service', search)
+    return search
+
+
+@pytest.fixture
+def client(search):
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('k', ['5', 0, -1, 2.5, True, None, 101])
+def test_invalid_k_is_rejected_before_searching(client, search, k):
+    response = client.post('/api/search', json={'text': 'patience', 'k': k})
+    assert response.status_code == 400
+    assert response.get_json()['error']['message'] == 'k must be an integer between 1 and 100'
+
+    response = client.post('/api/search/batch', json={'queries': ['patience', {'text': 'mercy', 'k': k}]})
+    assert response.status_code == 400
+    assert response.get_json()['error']['details'] == {'position': 1}
+    assert search.ks == []
+
+
+def test_valid_k_is_searched(client, search, monkeypatch):
+    assert client.post('/api/search', json={'text': 'patience'}).status_code == 200
+    assert client.post('/api/search', json={'text': 'patience', 'k': 100}).status_code == 200
+    monkeypatch.setenv('SEARCH_MAX_K', '500')
+    assert client.post('/api/search/batch', json={'queries': ['patience', {'text': 'mercy', 'k': 500}]}).status_code == 200
+    assert search.ks == [5, 100, 5, 500]
+
+
+@pytest.mark.parametrize('path', ['/api/therapy-search', '/api/therapy-search/stream'])
+@pytest.mark.parametrize('payload', [{'issue': 'I feel anxious', 'k': '5'}, {'issue': 'I feel anxious', 'k': 1000},
+                                     {'issue': ['I feel anxious']}, {'k': 5}])
+def test_invalid_therapy_requests_are_rejected(client, search, monkeypatch, path, payload):
+    monkeypatch.setattr(services, '_genai_service', object())
+    assert client.post(path, json=payload).status_code == 400
+    assert search.ks == []
+
+
+def test_stream_started_before_a_rejection_is_closed(client, monkeypatch):
+    closed = []
+
+    class SlowGuardrails:
+        """Guardrails that reject every issue after the first chunk has arrived."""
+
+        enabled = True
+
+        def precheck(self, text):
+            return True, "ok"
+
+        def validate(self, text):
+            time.sleep(0.05)
+            return False, "Input rejected"
+
+    def recorded_stream(issue, cancelled=None):
+        try:
+            yield "Be "
+            yield "patient"
+        finally:
+            closed.append(issue)
+
+    pipeline = TherapyPipeline(object())
+    monkeypatch.setattr(pipeline, 'generate_stream', recorded_stream)
+    monkeypatch.setattr(services, '_genai_service', object())
+    monkeypatch.setattr(services, '_therapy_pipeline', pipeline)
+    monkeypatch.setattr(services, '_guardrails_middleware', SlowGuardrails())
+    monkeypatch.setattr(services, '_response_cache', None)
+
+    response = client.post('/api/therapy-search/stream', json={'issue': 'I feel anxious'})
+    assert response.status_code == 400
+    assert closed == ['I feel anxious']
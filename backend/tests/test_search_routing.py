@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services.vector_search import VectorSearchService
+
+
+def routing_service(multilingual=True):
+    """A VectorSearchService with only what route() needs."""
+    service = VectorSearchService.__new__(VectorSearchService)
+    service.multilingual = object() if multilingual else None
+    return service
+
+
+@pytest.mark.parametrize('query', [
+    "Help me find peace", "God is great", "Allah", "heaven", "Depression", "patience",
+    "I feel anxious about my future", "", "1:255",
+])
+def test_english_and_uncertain_queries_stay_on_the_english_index(query):
+    assert routing_service().route(query) == 'english'
+
+
+@pytest.mark.parametrize('query', [
+    "je me sens seul", "Ich habe Angst vor dem Tod", "Me siento perdido", "أشعر بالقلق", "I feel لوحدي",
+])
+def test_foreign_queries_go_to_the_multilingual_index(query):
+    assert routing_service().route(query) == 'multilingual'
+
+
+def test_routing_without_the_multilingual_index():
+    service = routing_service(multilingual=False)
+    assert service.route("je me sens seul") == 'english'
+    with pytest.raises(ValueError):
+        service.route("peace", 'multilingual')
+    with pytest.raises(ValueError):
+        service.route("peace", 'klingon')
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services.therapy_pipeline import StageTimeoutError, TherapyPipeline
+
+
+def failing_gate():
+    raise RuntimeError("validator crashed")
+
+
+def test_a_gate_that_raises_rejects_the_input_and_cancels_the_work():
+    pipeline = TherapyPipeline(None)
+    cancelled_events = []
+
+    def work(cancelled):
+        cancelled_events.append(cancelled)
+        time.sleep(0.1)
+        return "response"
+
+    assert pipeline.run_gated(failing_gate, work) == (False, "Input validation failed", None)
+    assert cancelled_events[0].is_set()
+    assert pipeline.stats()['gated']['guardrails_errors'] == 1
+
+
+def test_a_gate_that_raises_without_concurrency():
+    pipeline = TherapyPipeline(None, concurrent=False)
+    calls = []
+
+    assert pipeline.run_gated(failing_gate, calls.append) == (False, "Input validation failed", None)
+    assert calls == []
+
+
+def test_validation_is_not_queued_behind_generations():
+    pipeline = TherapyPipeline(None, max_workers=2, guardrails_timeout=0.5)
+    release = threading.Event()
+    # Fill every generation thread with work that outlasts the guardrails timeout
+    blockers = [pipeline.executor.submit(release.wait, 5) for _ in range(2)]
+    try:
+        is_valid, reason, _ = pipeline.run_gated(lambda: (False, "rejected"), lambda cancelled: "response")
+    finally:
+        release.set()
+    assert (is_valid, reason) == (False, "rejected")
+    assert all(blocker.result(5) for blocker in blockers)
+
+
+def test_a_slow_gate_times_out():
+    pipeline = TherapyPipeline(None, guardrails_timeout=0.05)
+
+    with pytest.raises(StageTimeoutError) as error:
+        pipeline.run_gated(lambda: time.sleep(0.3) or (True, "ok"), lambda cancelled: "response")
+    assert error.value.stage == 'guardrails'
+
+
+def test_async_gate_that_raises_cancels_the_work():
+    pipeline = TherapyPipeline(None)
+
+    async def work():
+        await asyncio.sleep(5)
+        return "response"
+
+    async def run():
+        return await pipeline.run_gated_async(failing_gate, work)
+
+    start = time.perf_counter()
+    assert asyncio.run(run()) == (False, "Input validation failed", None)
+    assert time.perf_counter() - start < 2
+    assert pipeline.stats()['gated']['guardrails_errors'] == 1
+
+
+def test_async_gate_passes_the_work_result():
+    pipeline = TherapyPipeline(None)
+
+    async def work():
+        return "response"
+
+    assert asyncio.run(pipeline.run_gated_async(lambda: (True, "ok"), work)) == (True, "ok", "response")
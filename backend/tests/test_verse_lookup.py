@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from routes.api import bp
+from services import services
+from services.vector_search import VectorSearchService
+from services.verse_store import VerseStore
+
+VERSES = [
+    {'id': f'{surah}:{verse}', 'verse_en': f'English {surah}:{verse}', 'verse_ar': f'عربي {surah}:{verse}',
+     'surah_name': f'Surah {surah}'}
+    for surah, count in ((1, 7), (2, 5)) for verse in range(1, count + 1)
+]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client of the API blueprint, with a search service holding only the verses."""
+    search = VectorSearchService.__new__(VectorSearchService)
+    search.verses = VerseStore.from_verses(VERSES)
+    monkeypatch.setattr(services, '_search_service', search)
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+def test_single_verse(client):
+    response = client.get('/api/verses/2/3')
+    assert response.status_code == 200
+    assert response.get_json()['data']['verse'] == VERSES[9]
+
+    response = client.get('/api/verses/2/6')
+    assert response.status_code == 404
+    assert response.get_json()['error']['details'] == {'id': '2:6'}
+
+
+def test_surah_range(client):
+    data = client.get('/api/verses/1?from=6').get_json()['data']
+    assert [verse['id'] for verse in data['verses']] == ['1:6', '1:7']
+
+    data = client.get('/api/verses/2?from=2&to=3').get_json()['data']
+    assert [verse['id'] for verse in data['verses']] == ['2:2', '2:3']
+
+    assert len(client.get('/api/verses/1').get_json()['data']['verses']) == 7
+    assert client.get('/api/verses/3').status_code == 404
+
+
+@pytest.mark.parametrize('query', ['from=0', 'to=-1', 'from=4&to=2'])
+def test_invalid_ranges(client, query):
+    response = client.get(f'/api/verses/1?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['error']['type'] == 'validation_error'
+
+
+def test_bulk_lookup_keeps_the_request_order(client, monkeypatch):
+    response = client.post('/api/verses', json={'ids': ['2:5', '9:9', '1:1']})
+    data = response.get_json()['data']
+    assert [verse['id'] for verse in data['verses']] == ['2:5', '1:1']
+    assert data['missing'] == ['9:9']
+
+    monkeypatch.setenv('VERSE_LOOKUP_MAX_IDS', '2')
+    assert client.post('/api/verses', json={'ids': ['1:1', '1:2', '1:3']}).status_code == 400
+    assert client.post('/api/verses', json={'ids': [1]}).status_code == 400
+    assert client.post('/api/verses', json={'ids': []}).status_code == 400
+
+
+def test_lookup_without_a_search_service(client, monkeypatch):
+    monkeypatch.setattr(services, '_search_service', None)
+    assert client.get('/api/verses/1/1').status_code == 503
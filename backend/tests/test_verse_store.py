@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from services.verse_store import VerseStore, load_verses, write_verse_store
+
+VERSES = [
+    {'id': '1:1', 'verse_en': 'In the name of Allah', 'verse_ar': 'بِسْمِ ٱللَّهِ', 'surah_name': 'Al-Fatihah'},
+    {'id': '1:2', 'verse_en': 'All praise is for Allah', 'verse_ar': 'ٱلْحَمْدُ لِلَّهِ', 'surah_name': 'Al-Fatihah'},
+    {'id': '1:3', 'verse_en': 'The Most Compassionate', 'verse_ar': 'ٱلرَّحْمَٰنِ', 'surah_name': 'Al-Fatihah'},
+    {'id': '2:1', 'verse_en': 'Alif-Lam-Mim', 'verse_ar': 'الٓمٓ', 'surah_name': 'Al-Baqarah'},
+    {'id': '2:2', 'verse_en': None, 'verse_ar': 'ذَٰلِكَ', 'surah_name': 'Al-Baqarah'},
+]
+
+
+@pytest.fixture
+def store():
+    return VerseStore.from_verses(VERSES)
+
+
+def test_rows_round_trip(store):
+    assert len(store) == len(VERSES)
+    assert [dict(store[row]) for row in range(len(store))] == VERSES
+    assert store[-1]['id'] == '2:2'
+    with pytest.raises(IndexError):
+        store[len(VERSES)]
+
+
+def test_memory_mapped_file_matches_the_json(tmp_path):
+    path = str(tmp_path / 'verses.bin')
+    write_verse_store(VERSES, path)
+    json_path = tmp_path / 'verses.json'
+    json_path.write_text(json.dumps(VERSES), encoding='utf-8')
+
+    mapped, parsed = load_verses(path), load_verses(str(json_path))
+    assert mapped.path == path
+    assert [dict(mapped[row]) for row in range(len(mapped))] == [dict(parsed[row]) for row in range(len(parsed))]
+
+
+def test_lookup_by_id(store):
+    assert store.get('1:3')['verse_en'] == 'The Most Compassionate'
+    assert store.row_of('2:1') == 3
+    assert store.get('9:9') is None
+
+
+def test_surah_ranges(store):
+    assert [verse['id'] for verse in store.surah_range(1)] == ['1:1', '1:2', '1:3']
+    assert [verse['id'] for verse in store.surah_range(1, 2)] == ['1:2', '1:3']
+    assert [verse['id'] for verse in store.surah_range(1, 2, 2)] == ['1:2']
+    assert [verse['id'] for verse in store.surah_range(2, end=9)] == ['2:1', '2:2']
+    assert store.surah_range(1, 5) == []
+    assert store.surah_range(3) is None
+
+
+def test_json_fragment_matches_json_dumps(store):
+    for row in range(len(store)):
+        verse = store[row]
+        assert json.loads(verse.json_fragment()) == VERSES[row]
+        verse['score'] = 0.8125
+        assert json.loads(verse.json_fragment()) == dict(VERSES[row], score=0.8125)
+
+
+def test_json_fragment_is_not_used_for_unusual_scores(store):
+    verse = store[0]
+    verse['score'] = float('nan')
+    assert verse.json_fragment() is None
+    verse['score'] = None
+    assert verse.json_fragment() is None
+
+
+@pytest.mark.parametrize('change', [
+    lambda verse: verse.__setitem__('verse_en', 'edited'),
+    lambda verse: verse.update(verse_en='edited'),
+    lambda verse: verse.setdefault('note', 'added'),
+    lambda verse: verse.pop('surah_name'),
+    lambda verse: verse.__delitem__('verse_ar'),
+])
+def test_any_edit_invalidates_the_fragment(store, change):
+    verse = store[0]
+    change(verse)
+    assert verse.json_fragment() is None
+    # A fresh row is unaffected
+    assert store[0].json_fragment() is not None
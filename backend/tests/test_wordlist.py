@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from middleware.wordlist import DEFAULT_WORDS, WordlistMatcher, load_wordlist, normalize_text
+
+
+@pytest.fixture(scope='module')
+def matcher():
+    return WordlistMatcher(DEFAULT_WORDS + ['ass'])
+
+
+@pytest.mark.parametrize('text, word', [
+    ("this is shit", 'shit'),
+    ("SHIT happens", 'shit'),
+    ("what an ass.", 'ass'),
+    ("ass", 'ass'),
+])
+def test_matches_whole_words(matcher, text, word):
+    assert matcher.find(text) == word
+
+
+@pytest.mark.parametrize('text', [
+    "I need help with my class",
+    "I feel like a bassist without a band",
+    "shitake mushrooms",
+    "Peace be upon you",
+    "",
+])
+def test_words_inside_other_words_do_not_match(matcher, text):
+    assert matcher.find(text) is None
+
+
+def test_prefix_words_match_longer_words(matcher):
+    assert matcher.find("this is so fucking hard") == 'fuck'
+    assert matcher.find("motherfucker") == 'motherfuck'
+    # A prefix still has to start a word
+    assert matcher.find("unfuckable") is None
+
+
+def test_leetspeak_and_unicode_forms_are_undone(matcher):
+    assert matcher.find("sh1t") == 'shit'
+    assert matcher.find("$hit") == 'shit'
+    assert matcher.find("ｓｈｉｔ") == 'shit'
+    assert normalize_text("  Ｈello\n  World ") == 'hello world'
+
+
+def test_overlapping_words_are_found():
+    matcher = WordlistMatcher(['he', 'she', 'hers'])
+    assert matcher.find("ushers") is None
+    assert matcher.find("she said") == 'she'
+    assert matcher.find("it is hers") == 'hers'
+    assert matcher.size == 3
+
+
+def test_load_wordlist_adds_words_from_a_file(tmp_path):
+    path = tmp_path / 'words.txt'
+    path.write_text("# extra words\nheck*  # mild\n\ndarn\n", encoding='utf-8')
+
+    words = load_wordlist(str(path))
+    assert words[:len(DEFAULT_WORDS)] == DEFAULT_WORDS
+    assert words[len(DEFAULT_WORDS):] == ['heck*', 'darn']
+    assert WordlistMatcher(words).find("what the heckin") == 'heck'
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Script to package the search artifacts into a versioned data bundle.
+
+Copies the outputs of the other data scripts (embeddings, prebuilt index,
+bilingual metadata and, when present, the multilingual embeddings) into
+bundles/<version>/ with a manifest.json of their sizes and SHA-256 checksums.
+The bundle directory appears only once it is complete. With --activate it
+becomes the version named in bundles/CURRENT, which the backend loads at
+startup and switches to on SIGHUP or POST /api/admin/reload, without a restart.
+
+Usage:
+    python build_bundle.py --activate
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "src"))
+from services.bundle import CURRENT_NAME, MANIFEST_NAME, activate, current_version, file_sha256, load_bundle
+from services.multilingual_index import index_path as multilingual_index_path, manifest_path as multilingual_manifest_path
+from services.vector_search import DEFAULT_MODEL_NAME
+from services.verse_store import load_verses
+
+def embeddings_model(embeddings: Path, default: str) -> str:
+    """Model recorded by generate_embeddings.py next to the embeddings, else default."""
+    manifest = embeddings.with_suffix(".manifest.json")
+    if manifest.exists():
+        with open(manifest, "r", encoding="utf-8") as f:
+            return json.load(f)["model"]
+    return default
+
+def collect_files(args) -> dict:
+    """Role -> source path of the artifacts to bundle."""
+    files = {"embeddings": args.embeddings, "metadata": args.metadata}
+    if args.index and args.index.exists():
+        files["index"] = args.index
+    if args.multilingual and args.multilingual.exists():
+        files["multilingual"] = args.multilingual
+        files["multilingual_manifest"] = Path(multilingual_manifest_path(str(args.multilingual)))
+        index = Path(multilingual_index_path(str(args.multilingual)))
+        if index.exists():
+            files["multilingual_index"] = index
+    for role, path in files.items():
+        if not path.exists():
+            raise FileNotFoundError(f"{role} file {path} not found")
+    return files
+
+def check_counts(files: dict):
+    """Refuse to bundle embeddings and metadata that describe different verse sets."""
+    verses = len(load_verses(str(files["metadata"])))
+    vectors = len(np.load(files["embeddings"], mmap_mode="r"))
+    if vectors != verses:
+        raise ValueError(f"{files['embeddings']} has {vectors} vectors but {files['metadata']} has {verses} verses")
+    return verses
+
+def prune(root: Path, keep: int) -> list:
+    """Delete all but the newest keep bundles, never the active one."""
+    active = current_version(str(root))
+    versions = sorted((path for path in root.iterdir()
+                       if not path.name.startswith(".") and (path / MANIFEST_NAME).exists()),
+                      key=lambda path: path.stat().st_mtime, reverse=True)
+    removed = []
+    for path in versions[keep:]:
+        if path.name != active:
+            shutil.rmtree(path)
+            removed.append(path.name)
+    return removed
+
+def build(args) -> dict:
+    """Write the bundle; returns its manifest."""
+    start = time.perf_counter()
+    files = collect_files(args)
+    verses = check_counts(files)
+    version = args.version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    target = args.root / version
+    if target.exists():
+        raise FileExistsError(f"Bundle {target} already exists")
+    
+    args.root.mkdir(parents=True, exist_ok=True)
+    partial = args.root / f".{version}.partial"
+    if partial.exists():
+        shutil.rmtree(partial)
+    partial.mkdir()
+    
+    manifest = {
+        "version": version,
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "model": embeddings_model(args.embeddings, args.model),
+        "verses": verses,
+        "files": {},
+    }
+    for role, source in files.items():
+        destination = partial / source.name
+        if args.link:
+            destination.hardlink_to(source)
+        else:
+            shutil.copy2(source, destination)
+        manifest["files"][role] = {"path": source.name, "bytes": destination.stat().st_size,
+                                   "sha256": file_sha256(str(destination))}
+        print(f"Added {role}: {source.name} ({manifest['files'][role]['bytes']} bytes)")
+    with open(partial / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    
+    partial.rename(target)
+    # Read it back the way the backend will, checksums included
+    load_bundle(str(target))
+    if args.activate:
+        activate(str(args.root), version)
+        print(f"Activated {version} ({args.root / CURRENT_NAME})")
+    if args.keep:
+        removed = prune(args.root, args.keep)
+        if removed:
+            print(f"Removed old bundles: {', '.join(removed)}")
+    
+    print(f"Built {target} in {time.perf_counter() - start:.2f}s")
+    return manifest
+
+def main():
+    """Main function to build a data bundle."""
+    script_dir = Path(__file__).parent
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', type=Path, default=script_dir / "bundles", help="Bundle directory (BUNDLE_ROOT)")
+    parser.add_argument('--version', help="Bundle version (default: UTC timestamp)")
+    parser.add_argument('--embeddings', type=Path, default=script_dir / "quran_embeddings.npy")
+    parser.add_argument('--index', type=Path, default=script_dir / "quran_embeddings.index",
+                        help="Prebuilt FAISS index, skipped when missing")
+    parser.add_argument('--metadata', type=Path, default=None,
+                        help="Verse metadata (default: quran_bilingual_metadata.bin, else the .json)")
+    parser.add_argument('--multilingual', type=Path, default=script_dir / "quran_embeddings_multilingual.npy",
+                        help="Multilingual embeddings, skipped when missing")
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME,
+                        help="Embedding model, when the embeddings have no generate_embeddings.py manifest")
+    parser.add_argument('--link', action='store_true',
+                        help="Hard-link instead of copying (only if the sources are replaced, never rewritten in place)")
+    parser.add_argument('--activate', action='store_true', help="Make the new bundle the active one")
+    parser.add_argument('--keep', type=int, default=0, help="Keep only the newest N bundles (0 keeps all)")
+    args = parser.parse_args()
+    
+    if args.metadata is None:
+        binary = script_dir / "quran_bilingual_metadata.bin"
+        args.metadata = binary if binary.exists() else script_dir / "quran_bilingual_metadata.json"
+    
+    manifest = build(args)
+    print(json.dumps({key: value for key, value in manifest.items() if key != "files"}, indent=2))
+
+if __name__ == "__main__":
+    main()
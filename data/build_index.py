@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Script to build the prebuilt FAISS index used by the backend.
+The index is trained (when the type needs it) and written once here, then
+memory-mapped by every worker at startup, so workers no longer rebuild it
+from quran_embeddings.npy.
+
+It also reports recall@k and query latency against the exact flat index
+for a range of query-time parameters (efSearch for HNSW, nprobe for IVF),
+so each deployment can pick its latency/recall trade-off. Pass real queries
+with --query-texts (encoded with the embeddings' model) or --queries (.npy).
+Without them a sample of the corpus vectors is used and the number is
+reported as self-recall, which is optimistic: every query is its own nearest
+neighbour, which approximate indexes find easily. With --compare it builds
+every quantization mode (float32, float16, int8, binary) in memory and
+reports index size and recall, with and without exact rescoring.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "src"))
+from build_bundle import embeddings_model
+from services.index_factory import (INDEX_TYPES, QUANTIZATIONS, build_index, set_search_params,
+                                    search_index, rescore, is_binary_index, recall_at_k)
+from services.vector_search import DEFAULT_MODEL_NAME
+
+def parse_values(text: str) -> list:
+    """Parse a comma separated list of integers like '16,32,64'."""
+    return [int(value) for value in text.split(',') if value]
+
+def load_query_texts(path: Path) -> list:
+    """Queries from a JSON list or a text file with one query per line."""
+    with open(path, encoding='utf-8') as f:
+        if path.suffix == '.json':
+            return [item['issue'] if isinstance(item, dict) else item for item in json.load(f)]
+        return [line.strip() for line in f if line.strip()]
+
+def load_queries(args, embeddings: np.ndarray):
+    """Query vectors for the recall report, and where they came from."""
+    if args.query_texts:
+        from sentence_transformers import SentenceTransformer
+        model_name = embeddings_model(args.embeddings, args.model)
+        texts = load_query_texts(args.query_texts)
+        print(f"Encoding {len(texts)} queries from {args.query_texts} with {model_name}...")
+        queries = SentenceTransformer(model_name, device="cpu").encode(texts, normalize_embeddings=True)
+        return np.ascontiguousarray(queries, dtype=np.float32), 'texts'
+    if args.queries:
+        return np.ascontiguousarray(np.load(args.queries), dtype=np.float32), 'embeddings'
+    # Corpus vectors as queries: each one finds itself, so this only measures self-recall
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(embeddings), min(args.num_queries, len(embeddings)), replace=False)
+    return embeddings[sample], 'corpus'
+
+def describe_queries(queries: np.ndarray, source: str) -> str:
+    if source == 'corpus':
+        return f"self-recall, {len(queries)} corpus vectors as queries"
+    return f"{len(queries)} queries"
+
+def index_size_bytes(index) -> int:
+    """Serialized size of the index, i.e. what each worker maps into memory."""
+    if is_binary_index(index):
+        return faiss.serialize_index_binary(index).nbytes
+    return faiss.serialize_index(index).nbytes
+
+def measure(index, exact_index, queries: np.ndarray, k: int, embeddings: np.ndarray = None,
+            rescore_factor: int = 0) -> dict:
+    """Measure recall@k and mean per-query latency (one query at a time, like the API)."""
+    def search(batch):
+        if not rescore_factor:
+            return search_index(index, batch, k)
+        _, candidates = search_index(index, batch, k * rescore_factor)
+        return rescore(batch, candidates, embeddings, k)
+    
+    start = time.perf_counter()
+    for query in queries:
+        search(query[None, :])
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    
+    _, found = search(queries)
+    recall = recall_at_k(exact_index, queries, found)
+    return {'recall_at_k': round(recall, 4), 'latency_ms': round(latency_ms, 4)}
+
+def compare_quantization(args, embeddings: np.ndarray, queries: np.ndarray) -> list:
+    """Build the index in every quantization mode and report size and recall, with and without rescoring."""
+    exact_index = faiss.IndexFlatIP(embeddings.shape[1])
+    exact_index.add(embeddings)
+    
+    rows = []
+    for quantization in QUANTIZATIONS:
+        try:
+            index = build_index(embeddings, args.type, hnsw_m=args.hnsw_m, ef_construction=args.ef_construction,
+                                nlist=args.nlist, pq_m=args.pq_m, pq_bits=args.pq_bits, quantization=quantization)
+        except ValueError as e:
+            print(f"  skipping {quantization}: {e}")
+            continue
+        set_search_params(index, ef_search=args.ef_search[-1], nprobe=args.nprobe[-1])
+        row = {'quantization': quantization, 'size_mb': round(index_size_bytes(index) / 1e6, 2),
+               **measure(index, exact_index, queries, args.k)}
+        if args.rescore_factor > 1:
+            rescored = measure(index, exact_index, queries, args.k, embeddings, args.rescore_factor)
+            row['rescored_recall_at_k'] = rescored['recall_at_k']
+            row['rescored_latency_ms'] = rescored['latency_ms']
+        rows.append(row)
+    return rows
+
+def report_recall(index, embeddings: np.ndarray, queries: np.ndarray, k: int, ef_search: list, nprobe: list) -> list:
+    """Compare the index against exact search for each query-time setting."""
+    exact_index = faiss.IndexFlatIP(embeddings.shape[1])
+    exact_index.add(embeddings)
+    
+    rows = [{'index': 'flat', **measure(exact_index, exact_index, queries, k)}]
+    if isinstance(index, faiss.IndexHNSW) or isinstance(index, faiss.IndexBinaryHNSW):
+        settings = [{'ef_search': value} for value in ef_search]
+    elif not is_binary_index(index) and faiss.try_extract_index_ivf(index) is not None:
+        settings = [{'nprobe': value} for value in nprobe]
+    else:
+        settings = [{}]
+    
+    for setting in settings:
+        set_search_params(index, **setting)
+        rows.append({'index': type(index).__name__, **setting, **measure(index, exact_index, queries, k)})
+    return rows
+
+def main():
+    script_dir = Path(__file__).parent
+    
+    parser = argparse.ArgumentParser(description="Build the prebuilt FAISS index for the backend")
+    parser.add_argument('--embeddings', type=Path, default=script_dir / "quran_embeddings.npy")
+    parser.add_argument('--output', type=Path, default=script_dir / "quran_embeddings.index")
+    parser.add_argument('--type', choices=INDEX_TYPES, default='flat', help="Index type")
+    parser.add_argument('--hnsw-m', type=int, default=32, help="HNSW graph degree")
+    parser.add_argument('--ef-construction', type=int, default=200, help="HNSW build-time search depth")
+    parser.add_argument('--nlist', type=int, default=None, help="IVF list count (default ~4*sqrt(n))")
+    parser.add_argument('--pq-m', type=int, default=64, help="IVF-PQ sub-quantizers (must divide the dimension)")
+    parser.add_argument('--pq-bits', type=int, default=8, help="Bits per IVF-PQ code")
+    parser.add_argument('--quantization', choices=QUANTIZATIONS, default='none',
+                        help="Vector storage: float32, float16, int8 scalar or binary (Hamming)")
+    parser.add_argument('--rescore-factor', type=int, default=4,
+                        help="Overfetch factor for the exact-rescoring columns of --compare")
+    parser.add_argument('--compare', action='store_true',
+                        help="Report size and recall of every quantization mode instead of writing an index")
+    parser.add_argument('--queries', type=Path, default=None,
+                        help="Query embeddings (.npy) for the recall report")
+    parser.add_argument('--query-texts', type=Path, default=None,
+                        help="Queries (one per line, or a JSON list) to encode for the recall report "
+                             "(default: sample of the corpus, reported as self-recall)")
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME,
+                        help="Model for --query-texts, when the embeddings have no generate_embeddings.py manifest")
+    parser.add_argument('--num-queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10, help="k for recall@k")
+    parser.add_argument('--ef-search', type=parse_values, default=[16, 32, 64, 128])
+    parser.add_argument('--nprobe', type=parse_values, default=[1, 4, 8, 16, 32])
+    parser.add_argument('--report', type=Path, default=None, help="Also write the recall report to this JSON file")
+    args = parser.parse_args()
+    
+    if not args.embeddings.exists():
+        print(f"Error: {args.embeddings} not found (run generate_embeddings.py first)")
+        return
+    
+    print(f"Loading embeddings from {args.embeddings}...")
+    embeddings = np.ascontiguousarray(np.load(args.embeddings), dtype=np.float32)
+    
+    queries, query_source = load_queries(args, embeddings)
+    
+    if args.compare:
+        report = compare_quantization(args, embeddings, queries)
+        print(f"\n{args.type} index by quantization, recall@{args.k} ({describe_queries(queries, query_source)}, "
+              f"float32 matrix {embeddings.nbytes / 1e6:.1f} MB):")
+        for row in report:
+            rescored = (f"  rescored x{args.rescore_factor}: recall={row['rescored_recall_at_k']:.4f} "
+                        f"latency={row['rescored_latency_ms']:.3f} ms") if 'rescored_recall_at_k' in row else ''
+            print(f"  {row['quantization']:<7} size={row['size_mb']:>7.2f} MB  recall={row['recall_at_k']:.4f}  "
+                  f"latency={row['latency_ms']:.3f} ms{rescored}")
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump({'type': args.type, 'k': args.k, 'queries': len(queries), 'query_source': query_source,
+                           'results': report}, f, indent=2)
+        return
+    
+    start = time.perf_counter()
+    index = build_index(embeddings, args.type, hnsw_m=args.hnsw_m, ef_construction=args.ef_construction,
+                        nlist=args.nlist, pq_m=args.pq_m, pq_bits=args.pq_bits, quantization=args.quantization)
+    print(f"Built {args.type}/{args.quantization} index with {index.ntotal} vectors in {time.perf_counter() - start:.2f}s")
+    
+    # Write to a temp file first so running workers never map a half-written index
+    tmp_path = args.output.with_suffix(args.output.suffix + '.tmp')
+    if is_binary_index(index):
+        faiss.write_index_binary(index, str(tmp_path))
+    else:
+        faiss.write_index(index, str(tmp_path))
+    tmp_path.replace(args.output)
+    print(f"Saved index to {args.output} ({args.output.stat().st_size / 1e6:.1f} MB)")
+    
+    report = report_recall(index, embeddings, queries, args.k, args.ef_search, args.nprobe)
+    print(f"\nRecall@{args.k} against exact search ({describe_queries(queries, query_source)}):")
+    for row in report:
+        setting = ', '.join(f"{key}={row[key]}" for key in ('ef_search', 'nprobe') if key in row)
+        print(f"  {row['index']:<24} {setting:<14} recall={row['recall_at_k']:.4f}  latency={row['latency_ms']:.3f} ms")
+    
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'type': args.type, 'quantization': args.quantization, 'k': args.k,
+                       'queries': len(queries), 'query_source': query_source, 'results': report}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
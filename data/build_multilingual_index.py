@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Script to build the cross-lingual verse embeddings (quran_embeddings_multilingual.npy).
+
+Every verse is embedded once per text field (verse_en and verse_ar by default)
+with a multilingual encoder, so the backend can search Arabic, French, Spanish
+and other non-English queries directly instead of translating them first.
+The vector of verse i in field f is row f * verses + i; the sidecar
+quran_embeddings_multilingual.json names the model and the fields, and
+quran_embeddings_multilingual.index holds a flat FAISS index over the rows,
+which the backend maps from disk instead of loading onto every worker's heap.
+
+Usage:
+    python build_multilingual_index.py --metadata quran_bilingual_metadata.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "src"))
+from services.verse_store import load_verses
+from services.multilingual_index import MULTILINGUAL_FIELDS, MULTILINGUAL_MODEL_NAME, index_path, manifest_path, prepare_text
+
+def build(args) -> dict:
+    """Encode every field of every verse into args.output; returns build statistics."""
+    from sentence_transformers import SentenceTransformer
+    
+    start = time.perf_counter()
+    verses = load_verses(str(args.metadata))
+    if len(verses) == 0:
+        raise ValueError(f"No verses found in {args.metadata}")
+    model = SentenceTransformer(args.model, device="cpu")
+    dim = model.get_sentence_embedding_dimension()
+    
+    partial = args.output.with_name(args.output.stem + ".partial.npy")
+    output = np.lib.format.open_memmap(partial, mode="w+", dtype=np.float32, shape=(len(verses) * len(args.fields), dim))
+    for position, field in enumerate(args.fields):
+        offset = position * len(verses)
+        for batch_start in range(0, len(verses), args.batch_size):
+            rows = range(batch_start, min(batch_start + args.batch_size, len(verses)))
+            texts = [prepare_text(verses[row][field]) for row in rows]
+            embeddings = model.encode(texts, batch_size=args.batch_size, normalize_embeddings=True)
+            output[offset + rows.start:offset + rows.stop] = np.asarray(embeddings, dtype=np.float32)
+        print(f"Encoded {field} ({len(verses)} verses)")
+    output.flush()
+    
+    index = faiss.IndexFlatIP(dim)
+    index.add(np.ascontiguousarray(output))
+    del output
+    partial_index = args.output.with_name(args.output.stem + ".partial.index")
+    faiss.write_index(index, str(partial_index))
+    
+    os.replace(partial, args.output)
+    os.replace(partial_index, index_path(str(args.output)))
+    with open(manifest_path(str(args.output)), "w", encoding="utf-8") as f:
+        json.dump({"model": args.model, "fields": list(args.fields), "verses": len(verses), "dimension": dim}, f, indent=2)
+    return {"verses": len(verses), "fields": list(args.fields), "vectors": len(verses) * len(args.fields),
+            "dimension": dim, "seconds": round(time.perf_counter() - start, 2)}
+
+def main():
+    """Main function to build the multilingual embeddings."""
+    script_dir = Path(__file__).parent
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--metadata', type=Path, default=script_dir / "quran_bilingual_metadata.json",
+                        help="Bilingual JSON metadata or columnar store (.bin)")
+    parser.add_argument('--output', type=Path, default=script_dir / "quran_embeddings_multilingual.npy")
+    parser.add_argument('--model', default=MULTILINGUAL_MODEL_NAME, help="Multilingual SentenceTransformer model")
+    parser.add_argument('--fields', nargs='+', default=list(MULTILINGUAL_FIELDS), help="Verse fields to embed")
+    parser.add_argument('--batch-size', type=int, default=64, help="Encoder batch size")
+    args = parser.parse_args()
+    
+    if not args.metadata.exists():
+        print(f"Error: {args.metadata} not found")
+        return
+    
+    stats = build(args)
+    print(f"Wrote {args.output}, {index_path(str(args.output))} and {manifest_path(str(args.output))}")
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Script to check that the ONNX encoder matches the torch SentenceTransformer encoder.
+Encodes the verse corpus with both, reports cosine similarity between the two
+embeddings of each verse, top-k agreement of searches over the corpus and
+encode throughput. Exits non-zero when any verse falls below --min-cosine.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "src"))
+from services.encoders import SentenceTransformerEncoder, OnnxEncoder
+
+def encode_timed(encoder, texts: list, batch_size: int):
+    """Encode texts in batches, returning embeddings and verses per second."""
+    encoder.load()
+    start = time.perf_counter()
+    embeddings = np.concatenate([encoder.encode(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+    return embeddings, len(texts) / (time.perf_counter() - start)
+
+def main():
+    script_dir = Path(__file__).parent
+    
+    parser = argparse.ArgumentParser(description="Check ONNX encoder parity against the torch encoder")
+    parser.add_argument('--onnx-dir', type=Path, default=script_dir / "onnx" / "multi-qa-mpnet-base-dot-v1")
+    parser.add_argument('--quantized', action='store_true', help="Check the int8 model")
+    parser.add_argument('--metadata', type=Path, default=script_dir / "quran_bilingual_metadata.json")
+    parser.add_argument('--limit', type=int, default=0, help="Only check the first N verses (0 = all)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=0, help="Intra-op threads for both encoders")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--min-cosine', type=float, default=None,
+                        help="Minimum per-verse cosine (default 0.999, or 0.98 with --quantized)")
+    args = parser.parse_args()
+    
+    min_cosine = args.min_cosine or (0.98 if args.quantized else 0.999)
+    with open(args.metadata, encoding='utf-8') as f:
+        texts = [verse['verse_en'] for verse in json.load(f)]
+    if args.limit:
+        texts = texts[:args.limit]
+    
+    onnx_encoder = OnnxEncoder(str(args.onnx_dir), quantized=args.quantized, num_threads=args.threads or None)
+    torch_encoder = SentenceTransformerEncoder(onnx_encoder.config['model_name'], num_threads=args.threads or None)
+    
+    print(f"Encoding {len(texts)} verses with {torch_encoder.name}...")
+    reference, torch_rate = encode_timed(torch_encoder, texts, args.batch_size)
+    print(f"Encoding {len(texts)} verses with {onnx_encoder.name}...")
+    candidate, onnx_rate = encode_timed(onnx_encoder, texts, args.batch_size)
+    
+    cosines = np.sum(reference * candidate, axis=1)
+    max_abs_diff = float(np.abs(reference - candidate).max())
+    
+    # Top-k agreement: each verse as a query against the torch-encoded corpus
+    k = min(args.k, len(texts))
+    expected = np.argsort(-(reference @ reference.T), axis=1)[:, :k]
+    found = np.argsort(-(candidate @ reference.T), axis=1)[:, :k]
+    agreement = np.mean([len(set(e) & set(f)) / k for e, f in zip(expected, found)])
+    
+    print(f"\nmin cosine:        {cosines.min():.6f}")
+    print(f"mean cosine:       {cosines.mean():.6f}")
+    print(f"max abs diff:      {max_abs_diff:.6f}")
+    print(f"top-{k} agreement:  {agreement:.4f}")
+    print(f"throughput:        torch {torch_rate:.1f} verses/s, onnx {onnx_rate:.1f} verses/s")
+    
+    failing = np.flatnonzero(cosines < min_cosine)
+    if len(failing):
+        print(f"\n❌ {len(failing)} verses below cosine {min_cosine}, e.g. row {failing[0]}: {texts[failing[0]][:80]}")
+        sys.exit(1)
+    print(f"\n✅ All verses within tolerance (cosine >= {min_cosine})")
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,18 @@
 """
 Script to create a bilingual metadata file combining English and Arabic Quran verses.
 This script reads the English metadata and Arabic surah files to create a unified dataset.
+It also writes the compact columnar verse store (.bin) the backend memory-maps at startup.
 """
 
 import json
 import os
 import re
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "src"))
+from services.verse_store import write_verse_store
+
 def parse_verse_id(verse_id: str) -> tuple:
     """Parse verse ID like '1:1' into (surah_number, verse_number)."""
     surah, verse = verse_id.split(':')
@@ -47,7 +52,7 @@ def load_arabic_surahs(surah_dir: Path) -> dict:
             
     return arabic_data
 
-def create_bilingual_metadata(english_metadata_path: Path, surah_dir: Path, output_path: Path):
+def create_bilingual_metadata(english_metadata_path: Path, surah_dir: Path, output_path: Path, store_path: Path = None):
     """Create bilingual metadata file."""
     
     # Load English metadata
@@ -101,6 +106,10 @@ def create_bilingual_metadata(english_metadata_path: Path, surah_dir: Path, outp
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(bilingual_verses, f, ensure_ascii=False, indent=2)
     
+    if store_path:
+        print(f"Saving columnar verse store to {store_path}...")
+        write_verse_store(bilingual_verses, str(store_path))
+    
     print(f"Created bilingual metadata with {len(bilingual_verses)} verses")
     
     # Print some statistics
@@ -115,6 +124,7 @@ def main():
     english_metadata_path = script_dir / "quran_metadata.json"
     surah_dir = script_dir / "surah"
     output_path = script_dir / "quran_bilingual_metadata.json"
+    store_path = script_dir / "quran_bilingual_metadata.bin"
     
     # Check if input files exist
     if not english_metadata_path.exists():
@@ -127,7 +137,7 @@ def main():
     
     # Create bilingual metadata
     try:
-        bilingual_verses = create_bilingual_metadata(english_metadata_path, surah_dir, output_path)
+        bilingual_verses = create_bilingual_metadata(english_metadata_path, surah_dir, output_path, store_path)
         print("✅ Successfully created bilingual metadata!")
         
         # Show a sample
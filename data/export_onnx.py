@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Script to export the query encoder to ONNX for the backend's ONNX Runtime encoder.
+Writes model.onnx, an int8 dynamically quantized model_int8.onnx, the fast
+tokenizer and encoder_config.json (pooling, max length, padding) to one
+directory. Point ENCODER_ONNX_PATH at it and set ENCODER_BACKEND=onnx.
+
+Verify the export with check_encoder_parity.py before deploying it.
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import torch
+from sentence_transformers import SentenceTransformer
+
+class TokenEmbeddings(torch.nn.Module):
+    """Wraps the transformer so the exported graph returns token embeddings only (pooling runs in numpy)."""
+    
+    def __init__(self, auto_model, input_names):
+        super().__init__()
+        self.auto_model = auto_model
+        self.input_names = input_names
+    
+    def forward(self, *inputs):
+        return self.auto_model(**dict(zip(self.input_names, inputs))).last_hidden_state
+
+def get_pooling_mode(pooling) -> str:
+    """Pooling mode of a sentence-transformers Pooling module ('cls', 'mean', ...), across library versions."""
+    config = pooling.get_config_dict()
+    if 'pooling_mode' in config:
+        return config['pooling_mode']
+    if config.get('pooling_mode_cls_token'):
+        return 'cls'
+    if config.get('pooling_mode_mean_tokens'):
+        return 'mean'
+    return 'unsupported'
+
+def export_onnx(model_name: str, output_dir: Path, opset: int = 17, quantize: bool = True):
+    """Export model_name's transformer, tokenizer and pooling settings to output_dir."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    print(f"Loading {model_name}...")
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer, pooling = model[0], model[1]
+    pooling_mode = get_pooling_mode(pooling)
+    if pooling_mode not in ('cls', 'mean'):
+        raise ValueError(f"Unsupported pooling mode '{pooling_mode}' (the ONNX encoder supports cls and mean)")
+    
+    tokenizer = transformer.tokenizer
+    input_names = [name for name in tokenizer.model_input_names
+                   if name in ('input_ids', 'attention_mask', 'token_type_ids')]
+    dummy = tokenizer(["I feel anxious about my future", "peace"], padding=True, return_tensors='pt')
+    
+    print("Exporting to ONNX...")
+    wrapper = TokenEmbeddings(transformer.auto_model.eval(), input_names)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['token_embeddings'] = {0: 'batch', 1: 'sequence'}
+    with torch.no_grad():
+        torch.onnx.export(wrapper, tuple(dummy[name] for name in input_names), str(output_dir / "model.onnx"),
+                          input_names=input_names, output_names=['token_embeddings'],
+                          dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+    
+    tokenizer.save_pretrained(str(output_dir))
+    config = {
+        'model_name': model_name,
+        'pooling': pooling_mode,
+        'max_seq_length': model.max_seq_length,
+        'pad_token': tokenizer.pad_token,
+        'pad_token_id': tokenizer.pad_token_id,
+        'input_names': input_names,
+        'dimension': model.get_sentence_embedding_dimension()
+    }
+    with open(output_dir / "encoder_config.json", 'w') as f:
+        json.dump(config, f, indent=2)
+    
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        
+        print("Quantizing to int8...")
+        quantize_dynamic(str(output_dir / "model.onnx"), str(output_dir / "model_int8.onnx"),
+                         weight_type=QuantType.QInt8)
+    
+    for path in sorted(output_dir.glob("*.onnx")):
+        print(f"  {path.name}: {path.stat().st_size / 1e6:.1f} MB")
+    print(f"Exported {model_name} ({pooling_mode} pooling) to {output_dir}")
+
+def main():
+    script_dir = Path(__file__).parent
+    
+    parser = argparse.ArgumentParser(description="Export the query encoder to ONNX")
+    parser.add_argument('--model', default="multi-qa-mpnet-base-dot-v1")
+    parser.add_argument('--output', type=Path, default=script_dir / "onnx" / "multi-qa-mpnet-base-dot-v1")
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--no-quantize', action='store_true', help="Skip the int8 model")
+    args = parser.parse_args()
+    
+    export_onnx(args.model, args.output, args.opset, quantize=not args.no_quantize)
+
+if __name__ == "__main__":
+    main()
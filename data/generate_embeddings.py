@@ -1,28 +1,281 @@
-from sentence_transformers import SentenceTransformer
-import numpy as np
+#!/usr/bin/env python3
+"""
+Script to build the verse embeddings (quran_embeddings.npy) and quran_metadata.json.
+
+The build is incremental: every verse is hashed together with the model name,
+and verses whose hash is found in the previous artifact reuse its vector, so
+only new or changed verses are encoded. The input is read in chunks; chunks
+that need encoding are spread over worker processes, each with its own copy
+of the model, which write their rows straight into a preallocated
+memory-mapped .npy. A checkpoint records the finished chunks, so an
+interrupted build resumes where it stopped. The artifacts replace the old
+ones only when the build is complete.
+
+Usage:
+    python generate_embeddings.py --workers 4
+"""
+
+import argparse
+import hashlib
 import json
+import os
+import textwrap
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_MODEL_NAME = "multi-qa-mpnet-base-dot-v1"
+# Bumped when the manifest or checkpoint layout changes
+MANIFEST_VERSION = 1
+
+# Model loaded once per worker process by _init_worker
+_model = None
+
+def read_verses(path: Path) -> Iterator[Tuple[str, str]]:
+    """Yield (id, text) for each 'surah|verse|text' line, skipping blank and malformed lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split("|", 2)
+            if len(parts) != 3:
+                continue
+            chapter, verse, text = parts
+            yield f"{chapter}:{verse}", text
+
+def read_chunks(path: Path, chunk_size: int) -> Iterator[List[Tuple[str, str]]]:
+    """Yield the verses of path in lists of at most chunk_size."""
+    chunk = []
+    for verse in read_verses(path):
+        chunk.append(verse)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def content_hash(model_name: str, text: str) -> str:
+    """Hash of what determines a verse's vector: the model and the verse text."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+def chunk_digest(hashes: List[str]) -> str:
+    """Identifies a chunk's content, so a checkpointed chunk is only skipped if its verses are unchanged."""
+    return hashlib.sha256("".join(hashes).encode("ascii")).hexdigest()
+
+def manifest_path(output: Path) -> Path:
+    return output.with_suffix(".manifest.json")
+
+def write_json(path: Path, data, **kwargs):
+    """Write JSON via a temp file, so readers never see a partial file."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+
+def load_previous(output: Path, metadata: Path, model_name: str) -> Tuple[Optional[np.ndarray], Dict[str, int]]:
+    """
+    Map the previous embeddings and index their rows by content hash.
+    
+    Uses the manifest written by this script. Artifacts from before manifests
+    existed are matched through the texts in quran_metadata.json, assuming they
+    were built with the same model.
+    
+    Returns:
+        (previous embeddings or None, content hash -> row)
+    """
+    if not output.exists():
+        return None, {}
+    embeddings = np.load(output, mmap_mode="r")
+    
+    if manifest_path(output).exists():
+        with open(manifest_path(output), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["model"] != model_name:
+            print(f"{output} was built with {manifest['model']}, re-encoding every verse")
+            return None, {}
+        hashes = manifest["hashes"]
+    elif metadata.exists():
+        print(f"No manifest for {output}, matching verses through {metadata} (assuming model {model_name})")
+        with open(metadata, "r", encoding="utf-8") as f:
+            hashes = [content_hash(model_name, verse["text"]) for verse in json.load(f)]
+    else:
+        return None, {}
+    
+    if len(hashes) != len(embeddings):
+        print(f"Previous artifact has {len(embeddings)} vectors but {len(hashes)} hashes, not reusing it")
+        return None, {}
+    return embeddings, {value: row for row, value in enumerate(hashes)}
+
+def _init_worker(model_name: str, threads: int):
+    """Load the model once per worker process."""
+    global _model
+    if threads:
+        try:
+            import torch
+            # Workers split the cores between them instead of each using all of them
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    from sentence_transformers import SentenceTransformer
+    _model = SentenceTransformer(model_name, device="cpu")
+
+def _dimension() -> int:
+    return _model.get_sentence_embedding_dimension()
+
+def _encode_rows(output_path: str, rows: List[int], texts: List[str], batch_size: int) -> int:
+    """Encode texts and write them to rows of the memory-mapped output."""
+    embeddings = _model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    output = np.load(output_path, mmap_mode="r+")
+    output[rows] = np.asarray(embeddings, dtype=np.float32)
+    output.flush()
+    return len(rows)
+
+def open_output(partial: Path, checkpoint_path: Path, shape: Tuple[int, int], model_name: str,
+                resume: bool) -> Tuple[np.ndarray, Dict[str, str]]:
+    """
+    Open the partial output array, resuming a checkpointed build when it matches.
+    
+    Returns:
+        (writable memory-mapped array, chunk index -> digest of the chunks already written)
+    """
+    if resume and partial.exists() and checkpoint_path.exists():
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if (checkpoint.get("version") == MANIFEST_VERSION and checkpoint["model"] == model_name
+                and tuple(checkpoint["shape"]) == shape):
+            print(f"Resuming from {checkpoint_path} ({len(checkpoint['chunks'])} chunks done)")
+            return np.load(partial, mmap_mode="r+"), checkpoint["chunks"]
+        print(f"Checkpoint {checkpoint_path} is for another build, starting over")
+    
+    output = np.lib.format.open_memmap(partial, mode="w+", dtype=np.float32, shape=shape)
+    return output, {}
+
+def write_metadata_entry(f, verse_id: str, text: str, first: bool):
+    """Append one verse to a streamed quran_metadata.json, formatted like json.dump(..., indent=2)."""
+    entry = json.dumps({"id": verse_id, "text": text}, ensure_ascii=False, indent=2)
+    f.write(("[\n" if first else ",\n") + textwrap.indent(entry, "  "))
+
+def build(args) -> dict:
+    """Build the embeddings and metadata; returns build statistics."""
+    start = time.perf_counter()
+    total = sum(1 for _ in read_verses(args.input))
+    if total == 0:
+        raise ValueError(f"No verses found in {args.input}")
+    previous, previous_rows = (None, {}) if args.full else load_previous(args.output, args.metadata, args.model)
+    
+    partial = args.output.with_name(args.output.stem + ".partial.npy")
+    checkpoint_path = args.output.with_name(args.output.stem + ".checkpoint.json")
+    metadata_tmp = args.metadata.with_name(args.metadata.name + ".tmp")
+    stats = {"verses": total, "reused": 0, "encoded": 0, "resumed": 0, "workers": args.workers}
+    
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    # spawn: forked copies of a process that has touched torch or BLAS thread pools can deadlock
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context("spawn"),
+                             initializer=_init_worker, initargs=(args.model, threads)) as pool:
+        dim = previous.shape[1] if previous is not None else pool.submit(_dimension).result()
+        output, done = open_output(partial, checkpoint_path, (total, dim), args.model, not args.no_resume)
+        
+        hashes = []
+        pending = {}
+        
+        def save_checkpoint():
+            write_json(checkpoint_path, {"version": MANIFEST_VERSION, "model": args.model,
+                                         "shape": [total, dim], "chunks": done})
+        
+        def collect(return_when):
+            finished, _ = wait(pending, return_when=return_when)
+            for future in finished:
+                chunk_index, digest = pending.pop(future)
+                stats["encoded"] += future.result()
+                done[str(chunk_index)] = digest
+            if finished:
+                save_checkpoint()
+        
+        with open(metadata_tmp, "w", encoding="utf-8") as metadata:
+            row = 0
+            for chunk_index, chunk in enumerate(read_chunks(args.input, args.chunk_size)):
+                chunk_hashes = [content_hash(args.model, text) for _, text in chunk]
+                hashes.extend(chunk_hashes)
+                for offset, (verse_id, text) in enumerate(chunk):
+                    write_metadata_entry(metadata, verse_id, text, row + offset == 0)
+                
+                digest = chunk_digest(chunk_hashes)
+                rows = range(row, row + len(chunk))
+                row += len(chunk)
+                if done.get(str(chunk_index)) == digest:
+                    stats["resumed"] += len(chunk)
+                    continue
+                
+                to_encode = []
+                for target, value, (_, text) in zip(rows, chunk_hashes, chunk):
+                    source = previous_rows.get(value)
+                    if source is not None:
+                        output[target] = previous[source]
+                        stats["reused"] += 1
+                    else:
+                        to_encode.append((target, text))
+                output.flush()
+                
+                if not to_encode:
+                    done[str(chunk_index)] = digest
+                    save_checkpoint()
+                    continue
+                
+                # Keep a bounded number of chunks in flight, so input is read no faster than it is encoded
+                if len(pending) >= 2 * args.workers:
+                    collect(FIRST_COMPLETED)
+                future = pool.submit(_encode_rows, str(partial), [target for target, _ in to_encode],
+                                     [text for _, text in to_encode], args.batch_size)
+                pending[future] = (chunk_index, digest)
+            
+            metadata.write("\n]" if row else "[]")
+        
+        if pending:
+            collect(ALL_COMPLETED)
+    
+    output.flush()
+    del output
+    os.replace(partial, args.output)
+    os.replace(metadata_tmp, args.metadata)
+    write_json(manifest_path(args.output), {"version": MANIFEST_VERSION, "model": args.model,
+                                            "shape": [total, dim], "hashes": hashes})
+    checkpoint_path.unlink(missing_ok=True)
+    
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    return stats
+
+def main():
+    """Main function to build the embeddings."""
+    script_dir = Path(__file__).parent
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', type=Path, default=script_dir / "en.quraan.txt",
+                        help="Verses as 'surah|verse|text' lines")
+    parser.add_argument('--output', type=Path, default=script_dir / "quran_embeddings.npy")
+    parser.add_argument('--metadata', type=Path, default=script_dir / "quran_metadata.json")
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--workers', type=int, default=max(1, min(4, (os.cpu_count() or 1) // 2)),
+                        help="Encoder processes (each loads its own copy of the model)")
+    parser.add_argument('--threads', type=int, default=0,
+                        help="Torch threads per worker (default: cores divided by workers)")
+    parser.add_argument('--chunk-size', type=int, default=256, help="Verses read, encoded and checkpointed together")
+    parser.add_argument('--batch-size', type=int, default=32, help="Encoder batch size")
+    parser.add_argument('--full', action='store_true', help="Re-encode every verse instead of reusing the previous artifact")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore the checkpoint of an interrupted build")
+    args = parser.parse_args()
+    
+    if not args.input.exists():
+        print(f"Error: {args.input} not found")
+        return
+    
+    stats = build(args)
+    print(f"Wrote {args.output} and {args.metadata}")
+    print(json.dumps(stats, indent=2))
 
-# Load model
-model = SentenceTransformer("multi-qa-mpnet-base-dot-v1")
-
-# Load verses from .txt file
-verses = []
-with open("en.quraan.txt", "r") as f:
-    for line in f:
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.split("|", 2)
-        if len(parts) != 3:
-            continue
-        chapter, verse, text = parts
-        verses.append({"id": f"{chapter}:{verse}", "text": text})
-
-# Encode all verses
-texts = [v["text"] for v in verses]
-embeddings = model.encode(texts, normalize_embeddings=True)
-
-# Save embeddings + metadata
-np.save("quran_embeddings.npy", embeddings)       # vector data
-with open("quran_metadata.json", "w") as f:
-    json.dump(verses, f, ensure_ascii=False, indent=2)
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,22 @@
 """
 Test script to verify the therapy search functionality.
 """
-import requests
 import json
 
+# Test data with both English and non-English issues: (issue, ISO 639-1 language)
+TEST_ISSUES = [
+    ("I feel anxious about my future", "en"),
+    ("I'm struggling with loneliness", "en"),
+    ("I need guidance and peace", "en"),
+    ("I feel lost and need direction", "en"),
+    ("أشعر بالقلق حول مستقبلي", "ar"),  # Arabic: I feel anxious about my future
+    ("Je me sens perdu et j'ai besoin de direction", "fr"),  # French: I feel lost and need direction
+    ("Me siento ansioso por mi futuro", "es")  # Spanish: I feel anxious about my future
+]
+
 def test_therapy_search():
     """Test the therapy search endpoint."""
-    
-    # Test data with both English and non-English issues
-    test_issues = [
-        "I feel anxious about my future",
-        "I'm struggling with loneliness",
-        "I need guidance and peace",
-        "I feel lost and need direction",
-        "أشعر بالقلق حول مستقبلي",  # Arabic: I feel anxious about my future
-        "Je me sens perdu et j'ai besoin de direction",  # French: I feel lost and need direction
-        "Me siento ansioso por mi futuro"  # Spanish: I feel anxious about my future
-    ]
+    import requests
     
     base_url = "http://localhost:5000/api"
     
@@ -37,7 +37,7 @@ def test_therapy_search():
         return False
     
     # Test therapy search
-    for issue in test_issues:
+    for issue, _ in TEST_ISSUES:
         print(f"\n🧠 Testing issue: '{issue}'")
         
         try: